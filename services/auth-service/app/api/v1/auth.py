@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.schemas.auth import LoginResponse, LoginRequest
+from app.schemas.auth import LoginResponse, LoginRequest, RefreshRequest, RefreshResponse, SessionInfo
 
 from app.services import auth_service as auth
+from app.services import session_service
 
 from app.db.base import get_db
+from app.db.routing import session_router
 
 from app.db import models
 
@@ -16,9 +19,15 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 @router.post("/login", response_model=LoginResponse)
 async def login_for_access_token(
     user_credentials: LoginRequest,
-    db: Session = Depends(get_db),
 ):
-    user = auth.login(user_credentials, db)
+    # Логин только читает: реплика, если пользователь недавно не менялся.
+    # Выбор реплики (отметка записи в Redis), bcrypt и запись сессии устройства —
+    # в пуле потоков, не в цикле событий
+    db = await run_in_threadpool(session_router.read_session, user_credentials.login)
+    try:
+        user = await run_in_threadpool(auth.login, user_credentials, db)
+    finally:
+        db.close()
     if user == 404:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -30,6 +39,53 @@ async def login_for_access_token(
 
     return user
 
+@router.post("/refresh", response_model=RefreshResponse)
+def refresh_access_token(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Новый access-токен без пароля. Refresh-токен одноразовый: в ответе следующий
+    токен той же сессии, повторное предъявление старого отзывает сессию.
+    Обработчик синхронный: блокировка строки токена (FOR UPDATE) и commit
+    ждут в пуле потоков, а не в цикле событий.
+    """
+    response = auth.refresh(request, db)
+    if response is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh-токен недействителен, требуется вход",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return response
+
+@router.get("/sessions", response_model=list[SessionInfo])
+def list_sessions(
+    payload: dict = Depends(auth.get_token_payload),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db),
+):
+    sessions = session_service.list_sessions(current_user.id, db)
+    for session in sessions:
+        session["current"] = session["session_id"] == payload.get("sid")
+    return sessions
+
+@router.delete("/sessions/{session_id}")
+def revoke_session(
+    session_id: str,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Завершает сессию устройства: её refresh-токен больше не обменивается,
+    а выданные ей access-токены отклоняются (sid в списке отзыва).
+    """
+    if not session_service.revoke_session(session_id, db, current_user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Сессия не найдена")
+    return {"message": "Сессия завершена"}
+
+@router.post("/logout")
+def logout(payload: dict = Depends(auth.get_token_payload)):
+    auth.logout(payload)
+    return {"message": "Токен отозван"}
+
 @router.get("/verify")
 async def verify_token(current_user: models.User = Depends(auth.get_current_user)):
     return {"user_id": current_user.id}
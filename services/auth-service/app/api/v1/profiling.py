@@ -0,0 +1,104 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.core.profiling import cpu_profiler, loop_monitor, memory_profiler
+from app.db import models
+from app.services import auth_service as auth
+
+
+def require_admin(current_user: models.User = Depends(auth.get_current_user)) -> models.User:
+    if current_user.login not in settings.ADMIN_LOGINS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return current_user
+
+
+router = APIRouter(prefix="/admin/profiling", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/cpu")
+async def start_cpu_profile(
+    seconds: Optional[float] = Query(None, gt=0),
+    requests: Optional[int] = Query(None, ge=1),
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+    include_idle: bool = False,
+):
+    """
+    Сэмплирует стеки следующие seconds секунд или следующие requests запросов
+    (но не дольше PROFILING_MAX_SECONDS). Результат — collapsed stacks для speedscope.
+    """
+    try:
+        path = cpu_profiler.start(seconds, requests, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"file": os.path.basename(path)}
+
+
+@router.get("/cpu")
+async def cpu_profile_status():
+    return {"active": cpu_profiler.active, "requests_left": cpu_profiler.requests_left, "last": cpu_profiler.last_result}
+
+
+@router.delete("/cpu")
+async def stop_cpu_profile():
+    cpu_profiler.stop()
+    return {"active": False}
+
+
+@router.post("/memory/start")
+async def start_memory_tracing(frames: int = Query(10, ge=1, le=100)):
+    memory_profiler.start(frames)
+    return {"tracing": True}
+
+
+@router.post("/memory/snapshot")
+def take_memory_snapshot(compare_to: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """Снимок tracemalloc; с compare_to — разница с ранее сохранённым снимком."""
+    try:
+        return memory_profiler.snapshot(compare_to, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Снимок не найден")
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing():
+    memory_profiler.stop()
+    return {"tracing": False}
+
+
+@router.post("/loop")
+async def start_loop_monitor(
+    seconds: float = Query(60.0, gt=0),
+    threshold_ms: float = Query(100.0, ge=10.0),
+):
+    """Следит за задержками цикла событий и снимает стек при каждой остановке дольше порога."""
+    try:
+        path = loop_monitor.start(seconds, threshold_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"file": os.path.basename(path)}
+
+
+@router.get("/loop")
+async def loop_monitor_status():
+    return loop_monitor.status()
+
+
+@router.get("/files")
+async def list_profiles():
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    return sorted(os.listdir(settings.PROFILING_DIR))
+
+
+@router.get("/files/{name}")
+async def download_profile(name: str):
+    path = os.path.join(settings.PROFILING_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл не найден")
+    return FileResponse(path, filename=os.path.basename(path))
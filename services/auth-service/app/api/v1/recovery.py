@@ -4,9 +4,12 @@ from sqlalchemy.orm import Session
 
 from app.db import models
 from app.db.base import get_db
+from app.db.routing import session_router
 from app.schemas import recovery
 
 from app.core import security
+from app.core.revocation import revocation_store
+from app.services import session_service
 
 
 router = APIRouter(prefix="/recovery", tags=["recovery"])
@@ -15,9 +18,9 @@ router = APIRouter(prefix="/recovery", tags=["recovery"])
 @router.post("/recover_account_by_access_key", response_model=recovery.RecoveryResponse)
 async def recover_account_by_access_key(
     recovery_data: recovery.RecoveryRequest,
-    db: Session = Depends(get_db),
 ):
-    user = db.query(models.User).filter(models.User.login == recovery_data.login).first()
+    with session_router.read_session(recovery_data.login) as db:
+        user = db.query(models.User).filter(models.User.login == recovery_data.login).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
     if not user.encryptedPrivateKeyByAccessKey:
@@ -36,5 +39,9 @@ async def update_password_and_keys(
     user.password = security.get_password_hash(update_data.newPassword)
     user.encryptedPrivateKeyByUser = update_data.newEncryptedPrivateKeyByUser
     user.salt = update_data.newSalt
+    session_service.revoke_user_sessions(user.id, db)
     db.commit()
+    session_router.mark_written(user.login)
+    # Все ранее выданные токены и сессии устройств пользователя становятся недействительными
+    revocation_store.revoke_user(user.login)
     return recovery.UpdatePasswordAndKeysResponse()
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 
 from app.db import models
 from app.db.base import get_db
+from app.db.routing import session_router
 from app.schemas import register
 
 from app.services import register_service as registerService
@@ -21,6 +22,7 @@ async def register_step1(
 
     if result == 400:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Данный логин уже занят")
+    session_router.mark_written(user_data.login)
 
     return result
 
@@ -33,5 +35,6 @@ async def register_step2(
     user = registerService.register_step2(user_data, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
+    session_router.mark_written(user_data.login)
 
     return user
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -7,11 +9,18 @@ from fastapi.staticfiles import StaticFiles
 from app.api.v1.auth import router as auth_router
 from app.api.v1.register import router as register_router
 from app.api.v1.recovery import router as recovery_router
+from app.api.v1.health import router as health_router
+from app.api.v1.profiling import router as profiling_router
 
-from app.db import models
 from app.db.base import engine
+from app.db.routing import session_router
 
 from app.core.config import settings
+from app.core.metrics import metrics_response
+from app.core.revocation import revocation_store
+from app.core.startup import warm_up
+from app.core.profiling import ProfilingMiddleware
+from app.core.tracing import TracingMiddleware, instrument_sqlalchemy, tracer
 
 # Logging setup
 logger = logging.getLogger(__name__)
@@ -29,12 +38,18 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 logger.setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO))
 
-# Create tables
-try:
-    models.Base.metadata.create_all(bind=engine)
-    logger.info("База данных успешно инициализирована")
-except Exception as e:
-    logger.error(f"Ошибка подключения к базе данных: {e}")
+# Схема БД создаётся отдельным шагом: python -m app.db.migrate
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев идёт в фоне: /healthz отвечает сразу, /readyz — после прогрева
+    tracer.start()
+    warm_task = asyncio.create_task(warm_up())
+    yield
+    warm_task.cancel()
+    revocation_store.stop()
+    tracer.stop()
+    session_router.stop()
+    engine.dispose()
 
 
 app = FastAPI(
@@ -44,6 +59,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url=None,
     root_path="/auth-service",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -55,19 +71,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(TracingMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+instrument_sqlalchemy(engine)
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+app.include_router(health_router)
 app.include_router(auth_router)
 app.include_router(register_router)
 app.include_router(recovery_router)
+if settings.PROFILING_ENABLED:
+    app.include_router(profiling_router)
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "app:app",
-        host=settings.APP_HOST,
-        port=settings.APP_PORT,
-        reload=settings.RELOAD,
-        log_level=settings.UVICORN_LOG_LEVEL,
-    )
\ No newline at end of file
+    # Один процесс uvicorn или воркеры gunicorn — см. app/serve.py
+    from app.serve import main
+    main()
\ No newline at end of file
@@ -25,10 +25,60 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(...)
     ALGORITHM: str = Field(...)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(...)
+    # Refresh-токены: время жизни (продлевается при каждом обновлении), ключ HMAC
+    # для хранения (по умолчанию SECRET_KEY), максимум активных сессий пользователя
+    # и сколько часов хранятся использованные токены для обнаружения повторов
+    REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=30)
+    REFRESH_TOKEN_SECRET: Optional[str] = Field(default=None)
+    REFRESH_SESSIONS_MAX: int = Field(default=20)
+    REFRESH_REUSE_DETECT_HOURS: int = Field(default=24)
 
     APP_HOST: str = Field(...)
     APP_PORT: int = Field(...)
     RELOAD: bool = Field(...)
     UVICORN_LOG_LEVEL: str = Field(...)
 
+    # Воркеры gunicorn: число ("auto" — по CPU), перезапуск по запросам и памяти
+    WORKERS: str = Field(default="auto")
+    WORKERS_MAX: int = Field(default=8)
+    WORKER_MAX_REQUESTS: int = Field(default=10_000)
+    WORKER_MAX_REQUESTS_JITTER: int = Field(default=1_000)
+    WORKER_MAX_RSS_MB: int = Field(default=512)
+    WORKER_RSS_CHECK_INTERVAL: float = Field(default=10.0)
+    WORKER_TIMEOUT: int = Field(default=60)
+    WORKER_GRACEFUL_TIMEOUT: int = Field(default=30)
+    # Каталог метрик prometheus_client для сбора значений со всех воркеров
+    PROMETHEUS_MULTIPROC_DIR: str = Field(default="/tmp/auth-service-metrics")
+
+    # Реплики для чтения: URL SQLAlchemy (JSON-список), допустимое отставание,
+    # период проверки и окно read-your-writes после записи
+    DB_REPLICA_URLS: list[str] = Field(default=[])
+    DB_REPLICA_MAX_LAG: float = Field(default=5.0)
+    DB_REPLICA_CHECK_INTERVAL: float = Field(default=2.0)
+    DB_STICKY_SECONDS: float = Field(default=10.0)
+
+    # Прогрев воркера при старте
+    DB_WARM_CONNECTIONS: int = Field(default=5)
+    STARTUP_TIMEOUT: float = Field(default=10.0)
+
+    # Redis для рассылки отзыва токенов между сервисами
+    REDIS_URL: Optional[str] = Field(default=None)
+    REVOCATION_CHANNEL: str = Field(default="auth:revocation")
+    REVOCATION_BLOOM_CAPACITY: int = Field(default=100_000)
+    REVOCATION_BLOOM_ERROR_RATE: float = Field(default=0.001)
+
+    # Трассировка запросов
+    TRACE_ENABLED: bool = Field(default=True)
+    TRACE_SERVICE_NAME: str = Field(default="auth-service")
+    TRACE_EXPORTER: str = Field(default="none")
+    TRACE_FILE: str = Field(default="traces/auth-service.jsonl")
+    TRACE_SAMPLE_RATE: float = Field(default=1.0)
+    TRACE_SERVER_TIMING: bool = Field(default=True)
+
+    # Профилирование по запросу администратора
+    PROFILING_ENABLED: bool = Field(default=False)
+    PROFILING_DIR: str = Field(default="profiles")
+    PROFILING_MAX_SECONDS: float = Field(default=300.0)
+    ADMIN_LOGINS: list[str] = Field(default=[])
+
 settings = Settings()
\ No newline at end of file
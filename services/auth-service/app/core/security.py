@@ -1,29 +1,48 @@
 import bcrypt
+import hashlib
+import hmac
+import secrets
+import time
+import uuid
 from jose import jwt
 from datetime import datetime, timedelta
 
 from app.core.config import settings
+from app.core.tracing import span
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     # hashed_password is stored as a string in DB; bcrypt expects bytes
     if hashed_password is None:
         return False
     hashed = hashed_password.encode("utf-8") if isinstance(hashed_password, str) else hashed_password
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed)
+    with span("bcrypt.verify"):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed)
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    with span("bcrypt.hash"):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti и iat нужны для отзыва отдельных токенов и всех токенов пользователя
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
 
     return jwt.encode(
         to_encode,
         settings.SECRET_KEY,
         algorithm=settings.ALGORITHM
     )
+
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    # 256 бит случайного токена не требуют медленного хеша: HMAC стоит микросекунды,
+    # а без ключа утечка таблицы не даёт подобрать токены
+    key = (settings.REFRESH_TOKEN_SECRET or settings.SECRET_KEY).encode("utf-8")
+    return hmac.new(key, token.encode("utf-8"), hashlib.sha256).hexdigest()
+
 def generate_access_key(length: int = 8) -> str:
     import secrets
     import string
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.revocation import revocation_store
+from app.db.base import engine
+from app.db.routing import session_router
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Состояние прогрева воркера для /healthz и /readyz.
+    Воркер считается готовым, только когда все прогревы завершились успешно.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready_at: float | None = None
+        self.checks: dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def startup_seconds(self) -> float | None:
+        return None if self.ready_at is None else round(self.ready_at - self.started_at, 3)
+
+
+readiness = Readiness()
+
+
+def _open_connection():
+    conn = engine.connect()
+    conn.execute(text("SELECT 1"))
+    return conn
+
+
+async def warm_db_pool() -> None:
+    """Открывает соединения пула параллельно, чтобы первые запросы не ждали connect."""
+    conns = await asyncio.gather(*(
+        asyncio.to_thread(_open_connection) for _ in range(settings.DB_WARM_CONNECTIONS)
+    ))
+    for conn in conns:
+        conn.close()
+
+
+async def warm_replicas() -> None:
+    """Первая проверка реплик: до неё чтение идёт в основной сервер, недоступная реплика не мешает готовности."""
+    await asyncio.to_thread(session_router.start)
+
+
+async def warm_revocation() -> None:
+    revocation_store.start()
+    await asyncio.to_thread(revocation_store.wait_loaded, settings.STARTUP_TIMEOUT)
+
+
+async def _run_check(name: str, check) -> None:
+    delay = 0.5
+    while True:
+        try:
+            await check()
+            readiness.checks[name] = "ok"
+            return
+        except Exception as e:
+            readiness.checks[name] = f"error: {type(e).__name__}"
+            logger.error(f"Прогрев {name} не удался: {e}, повтор через {delay:.1f}с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+
+async def warm_up() -> None:
+    """Параллельно прогревает пул БД и кэши и фиксирует время старта."""
+    await asyncio.gather(
+        _run_check("database", warm_db_pool),
+        _run_check("revocation", warm_revocation),
+        _run_check("replicas", warm_replicas),
+    )
+    readiness.ready_at = time.monotonic()
+    logger.info(f"Сервис готов к работе за {readiness.startup_seconds}с")
@@ -0,0 +1,80 @@
+"""
+Явный шаг миграции схемы БД.
+
+Запускается отдельно от воркеров (`python -m app.db.migrate`), чтобы старт
+и перезагрузка приложения не ждали DDL. Миграции применяются по порядку и
+отмечаются в таблице schema_migrations; параллельный запуск из нескольких
+сервисов сериализуется advisory-локом.
+"""
+import logging
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.db import models
+from app.db.base import engine
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех сервисов ключ advisory-лока миграций
+MIGRATIONS_LOCK_ID = 72_001
+
+
+def _initial(conn) -> None:
+    models.Base.metadata.create_all(bind=conn)
+
+
+# Версия профиля для дельта-синхронизации. DEFAULT now() не переписывает таблицу;
+# существующие строки получают время миграции, и клиенты profiles-service один раз получат их заново
+USERS_UPDATED_AT = """
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at);
+"""
+
+
+def _refresh_tokens(conn) -> None:
+    models.RefreshToken.__table__.create(bind=conn, checkfirst=True)
+
+
+# Порядок важен: новые миграции добавляются только в конец
+MIGRATIONS = [
+    ("auth_0001_initial", _initial),
+    # Та же миграция, что profiles_0003: таблица users общая, сервисы мигрируют независимо
+    ("auth_0002_users_updated_at", USERS_UPDATED_AT),
+    ("auth_0003_refresh_tokens", _refresh_tokens),
+]
+
+
+def run_migrations() -> list[str]:
+    applied: list[str] = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " name VARCHAR(255) PRIMARY KEY,"
+            " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        done = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+        for name, migration in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info(f"Применяется миграция {name}")
+            if isinstance(migration, str):
+                conn.execute(text(migration))
+            else:
+                migration(conn)
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+            applied.append(name)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    started = time.perf_counter()
+    try:
+        applied = run_migrations()
+    except Exception as e:
+        logger.error(f"Ошибка миграции базы данных: {e}")
+        sys.exit(1)
+    logger.info(f"Миграции применены: {applied or 'нет новых'} за {time.perf_counter() - started:.2f}с")
@@ -1,5 +1,5 @@
 from app.db.base import Base
-from sqlalchemy import Column, Integer, String, Date, Text
+from sqlalchemy import Column, ForeignKey, Integer, String, Date, DateTime, Text, func
 
 class User(Base):
     __tablename__ = "users"
@@ -13,6 +13,28 @@ class User(Base):
     salt = Column(String(255), nullable=True)  # Соль для деривации ключа
     avatar = Column(String(255), nullable=True)
     created_at = Column(Date, nullable=False)
+    # Версия публичного профиля: при регистрации — значение по умолчанию, дальше
+    # обновляется при смене имени и аватара (по нему клиенты синхронизируют кэши)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     
     def __repr__(self):
-        return f"<User(login='{self.login}', userName='{self.userName}', publicKey='{self.publicKey})>" 
\ No newline at end of file
+        return f"<User(login='{self.login}', userName='{self.userName}', publicKey='{self.publicKey})>"
+
+
+class RefreshToken(Base):
+    """
+    Refresh-токен сессии устройства. Хранится только HMAC токена; при каждом
+    обновлении выдаётся новый токен той же сессии (session_id), а старый
+    помечается used_at — повторное предъявление использованного токена отзывает всю сессию.
+    """
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)  # HMAC-SHA256 токена (hex)
+    session_id = Column(String(32), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    device = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
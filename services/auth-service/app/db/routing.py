@@ -0,0 +1,252 @@
+import itertools
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from fastapi import Request
+from jose import JWTError, jwt
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.tracing import instrument_sqlalchemy
+from app.db.base import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# Общий префикс с profiles-service: запись в одном сервисе видна чтению в другом
+STICKY_KEY = "db:sticky:{}"
+
+QUERY_SECONDS = Histogram(
+    "auth_db_query_seconds",
+    "Длительность запросов к БД по серверу",
+    ["target"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+REPLICA_LAG_SECONDS = Gauge(
+    "auth_db_replica_lag_seconds", "Отставание реплики по времени", ["replica"], multiprocess_mode="max"
+)
+REPLICA_LAG_BYTES = Gauge(
+    "auth_db_replica_lag_bytes", "Отставание реплики по WAL", ["replica"], multiprocess_mode="max"
+)
+REPLICA_HEALTHY = Gauge(
+    "auth_db_replica_healthy", "Реплика доступна для чтения", ["replica"], multiprocess_mode="min"
+)
+REPLICA_PROBE_SECONDS = Gauge(
+    "auth_db_replica_probe_seconds", "Время проверки состояния реплики", ["replica"], multiprocess_mode="max"
+)
+READ_SESSIONS = Counter("auth_db_read_sessions_total", "Сессии чтения по серверу и причине", ["target", "reason"])
+
+
+def parse_lsn(value: str | None) -> int | None:
+    """LSN PostgreSQL вида 16/B374D848 в число."""
+    if not value:
+        return None
+    high, low = value.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def instrument_engine(target_engine, target: str) -> None:
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._routing_started = time.perf_counter()
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        QUERY_SECONDS.labels(target=target).observe(time.perf_counter() - context._routing_started)
+
+
+class Replica:
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        # Имя для метрик и логов — без учётных данных
+        self.name = f"{parts.hostname}:{parts.port or 5432}{parts.path}"
+        self.engine = create_engine(url, pool_size=10, max_overflow=20, pool_pre_ping=True)
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = False
+        self.replay_lsn: int | None = None
+        self.lag_seconds = 0.0
+        instrument_engine(self.engine, self.name)
+        instrument_sqlalchemy(self.engine)
+
+        @event.listens_for(self.engine, "handle_error")
+        def _on_error(context):
+            # Разрыв соединения выводит реплику из ротации до следующей успешной проверки
+            if context.is_disconnect and self.healthy:
+                logger.warning(f"Реплика {self.name} недоступна: {context.original_exception}")
+                self.set_healthy(False)
+
+    def set_healthy(self, healthy: bool) -> None:
+        self.healthy = healthy
+        REPLICA_HEALTHY.labels(replica=self.name).set(1 if healthy else 0)
+
+
+class SessionRouter:
+    """
+    Маршрутизация сессий между основным сервером и репликами (DB_REPLICA_URLS).
+    Запись идёт в основной сервер через get_db. Сессии чтения получают
+    исправную реплику по кругу; без исправных реплик — основной сервер.
+
+    Read-your-writes: после записи mark_written(key) запоминает LSN основного
+    сервера на DB_STICKY_SECONDS (в Redis, если он есть, — для всех воркеров и
+    сервисов). Пока окно не истекло, чтение по этому ключу уходит только на
+    реплики, которые уже применили этот LSN, иначе — в основной сервер.
+    """
+
+    def __init__(self):
+        self.replicas = [Replica(url) for url in settings.DB_REPLICA_URLS]
+        self._cycle = itertools.cycle(self.replicas)
+        self._sticky: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        instrument_engine(engine, "primary")
+
+    # ---------- Проверка реплик ----------
+
+    def start(self) -> None:
+        if not self.replicas or self._thread is not None:
+            return
+        self._stop.clear()
+        # Первая проверка синхронно: до неё реплики вне ротации
+        self.check()
+        self._thread = threading.Thread(target=self._run, name="db-replica-check", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.DB_REPLICA_CHECK_INTERVAL):
+            self.check()
+
+    def check(self) -> None:
+        try:
+            with engine.connect() as conn:
+                primary_lsn = parse_lsn(conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar())
+        except Exception as e:
+            logger.warning(f"Не удалось получить LSN основного сервера: {e}")
+            primary_lsn = None
+        for replica in self.replicas:
+            self._check_replica(replica, primary_lsn)
+
+    def _check_replica(self, replica: Replica, primary_lsn: int | None) -> None:
+        started = time.perf_counter()
+        try:
+            with replica.engine.connect() as conn:
+                row = conn.execute(text(
+                    "SELECT pg_last_wal_replay_lsn()::text, "
+                    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).one()
+        except Exception as e:
+            if replica.healthy:
+                logger.warning(f"Реплика {replica.name} не прошла проверку: {e}")
+            replica.set_healthy(False)
+            return
+        REPLICA_PROBE_SECONDS.labels(replica=replica.name).set(time.perf_counter() - started)
+
+        # Не в режиме восстановления (отдельный сервер без репликации) LSN неизвестен
+        replica.replay_lsn = parse_lsn(row[0])
+        replica.lag_seconds = float(row[1] or 0)
+        REPLICA_LAG_SECONDS.labels(replica=replica.name).set(replica.lag_seconds)
+        if primary_lsn is not None and replica.replay_lsn is not None:
+            REPLICA_LAG_BYTES.labels(replica=replica.name).set(max(0, primary_lsn - replica.replay_lsn))
+
+        healthy = replica.lag_seconds <= settings.DB_REPLICA_MAX_LAG
+        if healthy != replica.healthy:
+            logger.info(f"Реплика {replica.name}: {'в ротации' if healthy else 'выведена из ротации'}, отставание {replica.lag_seconds:.1f}с")
+        replica.set_healthy(healthy)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    # ---------- Read-your-writes ----------
+
+    def mark_written(self, key: str) -> None:
+        """Вызывается после commit: чтение по key не должно увидеть состояние до записи."""
+        if not self.replicas:
+            return
+        try:
+            with engine.connect() as conn:
+                lsn = parse_lsn(conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()) or 0
+        except Exception as e:
+            logger.warning(f"Не удалось получить LSN после записи: {e}")
+            lsn = 0
+        with self._lock:
+            self._sticky[key] = (lsn, time.monotonic() + settings.DB_STICKY_SECONDS)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(STICKY_KEY.format(key), lsn, ex=max(1, int(settings.DB_STICKY_SECONDS)))
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить отметку записи в Redis: {e}")
+
+    def _sticky_lsn(self, key: str) -> int | None:
+        """LSN последней записи по ключу или None; 0 — LSN неизвестен, читать с основного."""
+        now = time.monotonic()
+        with self._lock:
+            local = self._sticky.get(key)
+            if local is not None and local[1] <= now:
+                del self._sticky[key]
+                local = None
+        if local is not None:
+            return local[0]
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            value = client.get(STICKY_KEY.format(key))
+        except Exception as e:
+            # Без отметки нельзя гарантировать read-your-writes
+            logger.warning(f"Redis недоступен для отметок записи: {e}")
+            return 0
+        return int(value) if value is not None else None
+
+    # ---------- Сессии ----------
+
+    def _pick(self, key: str | None) -> tuple[sessionmaker, str, str]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return SessionLocal, "primary", "no_replica" if self.replicas else "primary_only"
+        sticky = self._sticky_lsn(key) if key else None
+        if sticky is not None:
+            healthy = [r for r in healthy if sticky and r.replay_lsn is not None and r.replay_lsn >= sticky]
+            if not healthy:
+                return SessionLocal, "primary", "sticky"
+        for replica in self._cycle:
+            if replica in healthy:
+                return replica.sessionmaker, replica.name, "replica"
+
+    def read_session(self, key: str | None = None) -> Session:
+        """Сессия только для чтения; key — логин пользователя для read-your-writes."""
+        factory, target, reason = self._pick(key)
+        READ_SESSIONS.labels(target=target, reason=reason).inc()
+        return factory()
+
+
+session_router = SessionRouter()
+
+
+def sticky_key(request: Request) -> str | None:
+    """Логин из токена запроса. Подпись проверяет get_current_user — здесь нужен только ключ маршрутизации."""
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.get_unverified_claims(authorization[7:].strip()).get("sub")
+    except JWTError:
+        return None
+
+
+def get_read_db(request: Request):
+    db = session_router.read_session(sticky_key(request))
+    try:
+        yield db
+    finally:
+        db.close()
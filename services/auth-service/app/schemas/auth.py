@@ -1,10 +1,11 @@
 from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 
 class LoginRequest(BaseModel):
     login: str
     password: str  # Обычный пароль
+    device: Optional[str] = Field(default=None, max_length=100)  # Имя устройства для списка сессий
 
 class LoginResponse(BaseModel):
     access_token: str
@@ -12,4 +13,23 @@ class LoginResponse(BaseModel):
     encryptedPrivateKeyByUser: str
     salt: str
     publicKey: str
-    user_id: int
\ No newline at end of file
+    user_id: int
+    refresh_token: Optional[str] = None
+    session_id: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class RefreshResponse(BaseModel):
+    access_token: str
+    token_type: str
+    refresh_token: str
+    session_id: str
+    user_id: int
+
+class SessionInfo(BaseModel):
+    session_id: str
+    device: Optional[str] = None
+    last_used_at: datetime
+    expires_at: datetime
+    current: bool = False
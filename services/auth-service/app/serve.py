@@ -0,0 +1,147 @@
+"""
+Запуск сервиса: python -m app.serve
+
+С RELOAD=true — один процесс uvicorn с перезагрузкой по изменению кода.
+Иначе — мастер gunicorn с воркерами uvicorn: число воркеров WORKERS
+("auto" — по доступным CPU), воркер плавно перезапускается после
+WORKER_MAX_REQUESTS запросов или когда его RSS превышает WORKER_MAX_RSS_MB.
+"""
+import logging
+import os
+import resource
+import signal
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPU, доступные процессу: маска affinity и квота cgroup v2 (cpu.max) контейнера."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count() -> int:
+    if settings.WORKERS.strip().lower() == "auto":
+        count = min(available_cpus(), settings.WORKERS_MAX)
+    else:
+        count = max(1, int(settings.WORKERS))
+    # Список отзыва токенов синхронизируется между процессами только через Redis
+    if count > 1 and (not settings.REDIS_URL or settings.REDIS_URL.startswith("memory://")):
+        logger.warning(f"REDIS_URL не задан или memory://, вместо {count} воркеров запускается один")
+        return 1
+    return count
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса; без /proc — пиковый из getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def prepare_metrics_dir() -> None:
+    """
+    Метрики prometheus_client в режиме multiprocess: каждый воркер пишет значения
+    в файлы каталога, /metrics суммирует их. Переменная окружения должна быть
+    задана до импорта prometheus_client — воркеры наследуют её от мастера.
+    """
+    path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+    os.makedirs(path, exist_ok=True)
+    # Файлы прошлого запуска исказили бы счётчики
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+
+
+def child_exit(server, worker) -> None:
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def run_single() -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "app.app:app",
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
+        reload=settings.RELOAD,
+        log_level=settings.UVICORN_LOG_LEVEL,
+    )
+
+
+def run_workers(workers: int) -> None:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn_worker import UvicornWorker
+
+    class Worker(UvicornWorker):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # uvicorn вызывает callback_notify раз в timeout/2 — там же проверяем память
+            self.config.timeout_notify = min(self.config.timeout_notify, settings.WORKER_RSS_CHECK_INTERVAL)
+
+        async def callback_notify(self) -> None:
+            await super().callback_notify()
+            limit = settings.WORKER_MAX_RSS_MB * 1024 * 1024
+            if limit and self.alive and rss_bytes() > limit:
+                # SIGTERM: uvicorn дообслуживает текущие запросы, мастер запускает замену
+                logger.warning(f"RSS воркера {os.getpid()} превысил {settings.WORKER_MAX_RSS_MB} МБ, перезапуск")
+                self.alive = False
+                os.kill(os.getpid(), signal.SIGTERM)
+
+    class Application(BaseApplication):
+        def load_config(self) -> None:
+            options = {
+                "bind": f"{settings.APP_HOST}:{settings.APP_PORT}",
+                "workers": workers,
+                "worker_class": Worker,
+                "reuse_port": True,
+                "max_requests": settings.WORKER_MAX_REQUESTS,
+                "max_requests_jitter": settings.WORKER_MAX_REQUESTS_JITTER,
+                "timeout": settings.WORKER_TIMEOUT,
+                "graceful_timeout": settings.WORKER_GRACEFUL_TIMEOUT,
+                "loglevel": settings.UVICORN_LOG_LEVEL,
+                "accesslog": "-",
+                # Приложение импортируется в каждом воркере: пулы соединений
+                # с БД и Redis не должны переживать fork
+                "preload_app": False,
+                "child_exit": child_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.app import app
+
+            return app
+
+    prepare_metrics_dir()
+    logger.info(f"Запуск {workers} воркеров на {settings.APP_HOST}:{settings.APP_PORT}")
+    Application().run()
+
+
+def main() -> None:
+    if settings.RELOAD:
+        run_single()
+    else:
+        run_workers(worker_count())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    main()
@@ -5,12 +5,16 @@ from jose import jwt, JWTError
 import logging
 
 from app.db import models
-from app.db.base import get_db
+from app.db.base import SessionLocal
+from app.db.routing import get_read_db
 from app.db.models import User
 
 from app.schemas import auth
 from app.core.config import settings
+from app.core.tracing import span
 from app.core import security
+from app.core.revocation import revocation_store
+from app.services import session_service
 # Настройка логгера
 logger = logging.getLogger(__name__)
 
@@ -28,7 +32,10 @@ def login(user_credentials: auth.LoginRequest, db: Session) -> auth.LoginRespons
     if not security.verify_password(user_credentials.password, user.password):
         return 401
 
-    access_token = security.create_access_token(data={"sub": user.login})
+    # db может быть репликой — сессия устройства пишется в основной сервер
+    with SessionLocal() as write_db:
+        session_id, refresh_token = session_service.start_session(user.id, user_credentials.device, write_db)
+    access_token = security.create_access_token(data={"sub": user.login, "sid": session_id})
     return auth.LoginResponse(
         access_token=access_token,
         token_type="bearer",
@@ -36,11 +43,31 @@ def login(user_credentials: auth.LoginRequest, db: Session) -> auth.LoginRespons
         salt=user.salt,
         publicKey=user.publicKey,
         user_id=user.id,
+        refresh_token=refresh_token,
+        session_id=session_id,
     )
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User | None:
+def refresh(request: auth.RefreshRequest, db: Session) -> auth.RefreshResponse | None:
     """
-    Возвращает текущего пользователя по JWT токену из заголовка Authorization.
+    Новая пара токенов по refresh-токену — без пароля и bcrypt.
+    None, если токен не принят (неизвестен, истёк, отозван или использован повторно).
+    """
+    try:
+        user_id, login, session_id, refresh_token = session_service.refresh(request.refresh_token, db)
+    except session_service.RefreshRejected as e:
+        logger.warning(f"Refresh-токен отклонён: {e}")
+        return None
+    return auth.RefreshResponse(
+        access_token=security.create_access_token(data={"sub": login, "sid": session_id}),
+        token_type="bearer",
+        refresh_token=refresh_token,
+        session_id=session_id,
+        user_id=user_id,
+    )
+
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Декодирует JWT токен и проверяет, что он не отозван.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,11 +76,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
 
     try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM],
-        )
+        with span("jwt.decode"):
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.ALGORITHM],
+            )
         username: str | None = payload.get("sub")
         if username is None:
             logger.warning("JWT токен не содержит sub")
@@ -62,9 +90,42 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         logger.error(f"Ошибка декодирования JWT: {e}")
         raise credentials_exception
 
+    if revocation_store.is_revoked(payload):
+        logger.warning(f"Отозванный токен пользователя {username}")
+        raise credentials_exception
+
+    return payload
+
+async def get_current_user(payload: dict = Depends(get_token_payload), db: Session = Depends(get_read_db)) -> models.User | None:
+    """
+    Возвращает текущего пользователя по JWT токену из заголовка Authorization.
+    Чтение идёт в реплику: объект не предназначен для изменения.
+    """
+    username = payload["sub"]
     user = db.query(models.User).filter(models.User.login == username).first()
     if user is None:
         logger.warning(f"Пользователь {username} не найден по токену")
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return user
 
-    return user
\ No newline at end of file
+def logout(payload: dict) -> None:
+    """
+    Отзывает текущий токен: jti попадает в список отзыва до истечения exp.
+    Сессия устройства (sid), к которой относится токен, закрывается вместе с ним,
+    и остальные её access-токены тоже перестают приниматься.
+    """
+    sid = payload.get("sid")
+    if sid:
+        with SessionLocal() as db:
+            session_service.revoke_session(sid, db)
+    jti = payload.get("jti")
+    if jti:
+        revocation_store.revoke_token(jti, float(payload["exp"]))
+    else:
+        # Старые токены без jti можно отозвать только целиком по пользователю
+        revocation_store.revoke_user(payload["sub"])
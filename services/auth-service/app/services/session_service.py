@@ -0,0 +1,155 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from prometheus_client import Counter
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.core.config import settings
+from app.core.revocation import revocation_store
+from app.core.tracing import span
+from app.db import models
+from app.db.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REFRESH_RESULTS = Counter("auth_refresh_total", "Обновления access-токена по refresh-токену", ["result"])
+
+
+class RefreshRejected(Exception):
+    """Refresh-токен неизвестен, истёк, отозван или уже использован."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _issue(user_id: int, session_id: str, device: str | None, db: Session) -> str:
+    token = security.generate_refresh_token()
+    db.add(RefreshToken(
+        token_hash=security.hash_refresh_token(token),
+        session_id=session_id,
+        user_id=user_id,
+        device=device,
+        expires_at=_now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+def _revoke(condition, db: Session) -> int:
+    return db.query(RefreshToken).filter(condition, RefreshToken.revoked_at.is_(None)).update(
+        {RefreshToken.revoked_at: _now()}, synchronize_session=False
+    )
+
+
+def start_session(user_id: int, device: str | None, db: Session) -> tuple[str, str]:
+    """
+    Новая сессия устройства после входа по паролю: (session_id, refresh-токен).
+    Сессии сверх REFRESH_SESSIONS_MAX, дольше всех не обновлявшиеся, отзываются.
+    """
+    now = _now()
+    # Истёкшие и отозванные записи пользователя не нужны даже для обнаружения повторов
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        or_(RefreshToken.expires_at < now, RefreshToken.revoked_at.isnot(None)),
+    ).delete(synchronize_session=False)
+    session_id = uuid.uuid4().hex
+    token = _issue(user_id, session_id, device, db)
+    db.flush()
+
+    current = db.query(RefreshToken.session_id).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.used_at.is_(None),
+        RefreshToken.revoked_at.is_(None),
+    ).order_by(RefreshToken.created_at.desc(), RefreshToken.id.desc()).all()
+    stale = [row.session_id for row in current[settings.REFRESH_SESSIONS_MAX:]]
+    if stale:
+        _revoke(RefreshToken.session_id.in_(stale), db)
+    db.commit()
+    for sid in stale:
+        revocation_store.revoke_session(sid)
+    return session_id, token
+
+
+def refresh(token: str, db: Session) -> tuple[int, str, str, str]:
+    """
+    Обменивает refresh-токен на новый той же сессии: (user_id, логин, session_id, новый токен).
+    Проверка — HMAC и поиск по уникальному индексу, без bcrypt. Строка токена
+    блокируется (FOR UPDATE), поэтому из двух одновременных обменов одного токена
+    успешен только первый; второй считается повтором.
+    """
+    token_hash = security.hash_refresh_token(token)
+    now = _now()
+    with span("refresh.rotate"):
+        row = db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).with_for_update().first()
+        if row is None:
+            REFRESH_RESULTS.labels(result="invalid").inc()
+            raise RefreshRejected("unknown token")
+        if row.revoked_at is not None or row.expires_at <= now:
+            REFRESH_RESULTS.labels(result="expired" if row.revoked_at is None else "revoked").inc()
+            raise RefreshRejected("token expired or revoked")
+        if row.used_at is not None:
+            # Уже обменянный токен предъявлен снова: копия украдена или клиент потерял
+            # ответ — в обоих случаях доверять сессии нельзя, устройство войдёт заново
+            user_id, session_id = row.user_id, row.session_id
+            _revoke(RefreshToken.session_id == session_id, db)
+            db.commit()
+            revocation_store.revoke_session(session_id)
+            logger.warning(f"Повторное использование refresh-токена, сессия {session_id} пользователя {user_id} отозвана")
+            REFRESH_RESULTS.labels(result="reuse").inc()
+            raise RefreshRejected("token reuse")
+
+        login = db.query(models.User.login).filter(models.User.id == row.user_id).scalar()
+        if login is None:
+            REFRESH_RESULTS.labels(result="invalid").inc()
+            raise RefreshRejected("user not found")
+        user_id, session_id = row.user_id, row.session_id
+        row.used_at = now
+        # Старые использованные токены сессии нужны только для обнаружения повторов
+        db.query(RefreshToken).filter(
+            RefreshToken.session_id == session_id,
+            RefreshToken.used_at < now - timedelta(hours=settings.REFRESH_REUSE_DETECT_HOURS),
+        ).delete(synchronize_session=False)
+        new_token = _issue(user_id, session_id, row.device, db)
+        db.commit()
+    REFRESH_RESULTS.labels(result="rotated").inc()
+    return user_id, login, session_id, new_token
+
+
+def list_sessions(user_id: int, db: Session) -> list[dict]:
+    """Активные сессии пользователя: одна строка на устройство, последние обновлённые первыми."""
+    rows = db.query(
+        RefreshToken.session_id,
+        func.max(RefreshToken.device).label("device"),
+        func.max(RefreshToken.created_at).label("last_used_at"),
+        func.max(RefreshToken.expires_at).label("expires_at"),
+    ).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None),
+    ).group_by(RefreshToken.session_id).having(
+        func.bool_or(RefreshToken.used_at.is_(None)),
+    ).having(func.max(RefreshToken.expires_at) > _now()).order_by(func.max(RefreshToken.created_at).desc()).all()
+    return [row._asdict() for row in rows]
+
+
+def revoke_session(session_id: str, db: Session, user_id: int | None = None) -> bool:
+    """
+    Закрывает сессию; с user_id — только если она принадлежит этому пользователю.
+    Refresh-токены сессии помечаются отозванными, а её sid публикуется в список
+    отзыва — выданные ей access-токены перестают приниматься всеми сервисами.
+    """
+    condition = RefreshToken.session_id == session_id
+    if user_id is not None:
+        condition = condition & (RefreshToken.user_id == user_id)
+    revoked = _revoke(condition, db)
+    db.commit()
+    if revoked:
+        revocation_store.revoke_session(session_id)
+    return revoked > 0
+
+
+def revoke_user_sessions(user_id: int, db: Session) -> None:
+    """Все сессии пользователя; вызывающий коммитит вместе со своими изменениями."""
+    _revoke(RefreshToken.user_id == user_id, db)
@@ -1,11 +1,27 @@
+import asyncio
 import logging
 import os
 import time
-from fastapi import FastAPI, Request, Response
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from .core.admission import AdmissionMiddleware
+from .core.auth import close_http_client
+from .core.compression import CompressionMiddleware
 from .core.config import settings
+from .core.metrics import metrics_response
+from .core.profiling import ProfilingMiddleware
+from .core.storage import group_commit
+from .core.tracing import TracingMiddleware, tracer
+from .core.usage import usage_ledger
+from .core.startup import warm_up
+from .routers.archive import router as archive_router
+from .routers.health import router as health_router
 from .routers.media import router as media_router
+from .routers.profiling import router as profiling_router
+from .routers.transfer import router as transfer_router
+from .routers.usage import router as usage_router
 
 # Logging setup
 logger = logging.getLogger(__name__)
@@ -23,6 +39,21 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 logger.setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO))
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев идёт в фоне: /healthz отвечает сразу, /readyz — после прогрева
+    tracer.start()
+    group_commit.start()
+    usage_ledger.start()
+    warm_task = asyncio.create_task(warm_up())
+    yield
+    warm_task.cancel()
+    await close_http_client()
+    await asyncio.to_thread(usage_ledger.stop)
+    group_commit.stop()
+    tracer.stop()
+
+
 app = FastAPI(
     title="Media Service",
     description="Chunked encrypted file storage for chats",
@@ -30,6 +61,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url=None,
     root_path="/media-service",
+    lifespan=lifespan,
 )
 
 # CORS: Explicit origins are required when allow_credentials=True
@@ -43,13 +75,11 @@ allowed_origins = [
     "http://localhost:4173",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TracingMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 # Middleware для логирования запросов
 @app.middleware("http")
@@ -65,15 +95,33 @@ async def log_requests(request: Request, call_next):
         process_time = time.time() - start_time
         raise
 
+# add_middleware оборачивает уже добавленные: CORS добавляется последним и
+# становится внешним, поэтому ответы 429/503/413 AdmissionMiddleware тоже несут
+# Access-Control-Allow-Origin, и браузер видит статус и Retry-After
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=allowed_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
+)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+app.include_router(health_router)
 app.include_router(media_router)
+app.include_router(transfer_router)
+app.include_router(archive_router)
+app.include_router(usage_router)
+if settings.PROFILING_ENABLED:
+    app.include_router(profiling_router)
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "app:app",
-        host=settings.APP_HOST,
-        port=settings.APP_PORT,
-        reload=os.getenv('RELOAD', 'false').lower() == 'true',
-        log_level=os.getenv('UVICORN_LOG_LEVEL', 'info')
-    )
+    # Один процесс uvicorn или воркеры gunicorn — см. app/serve.py
+    from .serve import main
+    main()
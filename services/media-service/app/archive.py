@@ -0,0 +1,106 @@
+"""
+Экспорт и импорт файлов чата на сервере с прямым доступом к томам:
+
+    python -m app.archive export 42 -o chat_42.tar [--resume]
+    python -m app.archive import 42 chat_42.tar [--offset N]
+
+export пишет тот же архив tar, что и GET /chats/{chat_id}/export; содержимое
+файлов копируется ядром (sendfile) в файл или в конвейер ("-o -" — stdout).
+--resume дописывает оборванный архив, если опись чата не изменилась (ETag
+хранится рядом в <файл>.etag). import читает архив из файла или stdin ("-"),
+уже сохранённые чанки пропускает и печатает смещение для продолжения.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from .core.archive import READ_BLOCK, ChatExport, write_archive
+from .core.usage import usage_ledger
+from .routers.archive import import_archive
+
+
+def export_main(args) -> None:
+    export = ChatExport.scan(args.chat_id)
+    if not export.members:
+        sys.exit(f"chat {args.chat_id} has no files")
+    if args.output == "-":
+        write_archive(export, sys.stdout.fileno())
+        return
+
+    etag_path = f"{args.output}.etag"
+    offset = 0
+    if args.resume and os.path.exists(args.output):
+        try:
+            with open(etag_path) as f:
+                same = f.read().strip() == export.etag
+        except FileNotFoundError:
+            same = False
+        offset = os.path.getsize(args.output) if same else 0
+        if not same:
+            print("chat files changed since the archive was started, exporting from scratch", file=sys.stderr)
+    with open(etag_path, "w") as f:
+        f.write(export.etag)
+
+    fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | (os.O_APPEND if offset else os.O_TRUNC), 0o644)
+    try:
+        written = write_archive(export, fd, min(offset, export.size))
+    finally:
+        os.close(fd)
+    os.remove(etag_path)
+    print(f"{args.output}: {len(export.members)} files, {export.size} bytes ({written} written)", file=sys.stderr)
+
+
+async def _read_file(f):
+    while True:
+        data = await asyncio.to_thread(f.read, READ_BLOCK)
+        if not data:
+            return
+        yield data
+
+
+async def _import(args) -> dict:
+    if args.input == "-":
+        return await import_archive(args.chat_id, _read_file(sys.stdin.buffer), args.user_id, base_offset=args.offset)
+    with open(args.input, "rb") as f:
+        f.seek(args.offset)
+        return await import_archive(args.chat_id, _read_file(f), args.user_id, base_offset=args.offset)
+
+
+def import_main(args) -> None:
+    result = asyncio.run(_import(args))
+    # Фонового потока учёта места в CLI нет — изменения записываются сразу
+    usage_ledger.flush()
+    print(json.dumps(result))
+    if result["status"] != "ok":
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Экспорт и импорт файлов чата архивом tar")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="выгрузить файлы чата")
+    export.add_argument("chat_id", type=int)
+    export.add_argument("-o", "--output", help='файл архива или "-" (stdout); по умолчанию chat_<id>.tar')
+    export.add_argument("--resume", action="store_true", help="дописать оборванный архив")
+    export.set_defaults(func=export_main)
+
+    restore = commands.add_parser("import", help="восстановить файлы чата из архива")
+    restore.add_argument("chat_id", type=int)
+    restore.add_argument("input", nargs="?", default="-", help='файл архива или "-" (stdin)')
+    restore.add_argument("--user-id", type=int, default=0, help="на кого учитывать место (по умолчанию 0 — неизвестный)")
+    restore.add_argument("--offset", type=int, default=0, help="продолжить с байта архива (offset из прошлого запуска)")
+    restore.set_defaults(func=import_main)
+
+    args = parser.parse_args()
+    if args.command == "export" and args.output is None:
+        args.output = f"chat_{args.chat_id}.tar"
+    args.func(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", stream=sys.stderr)
+    main()
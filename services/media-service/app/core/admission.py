@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict, deque
+
+from prometheus_client import Counter, Gauge
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+from .volumes import volume_set
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_ACTIVE = Gauge("media_uploads_active", "Загрузки, допущенные к обработке", multiprocess_mode="livesum")
+UPLOADS_QUEUED = Gauge("media_uploads_queued", "Загрузки в очереди на допуск", multiprocess_mode="livesum")
+UPLOAD_BYTES_IN_FLIGHT = Gauge(
+    "media_upload_bytes_in_flight", "Объявленный объём тел допущенных загрузок", multiprocess_mode="livesum"
+)
+UPLOADS_REJECTED = Counter("media_uploads_rejected_total", "Отклонённые загрузки", ["reason"])
+
+UPLOAD_PATHS = ("/upload_chunk/", "/upload_metadata/")
+
+# Число воркеров gunicorn: мастер (app.serve) задаёт переменную до запуска воркеров
+WORKER_COUNT_ENV = "MEDIA_WORKER_COUNT"
+
+
+def worker_share(total: int) -> int:
+    """Доля одного воркера в общем на сервис лимите (с округлением вверх, не меньше 1)."""
+    try:
+        workers = max(1, int(os.environ.get(WORKER_COUNT_ENV, "1")))
+    except ValueError:
+        workers = 1
+    return max(1, -(-total // workers))
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str):
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+
+
+class UploadAdmission:
+    """
+    Допуск загрузок: общий лимит и лимит на пользователя по числу одновременных
+    загрузок и общий бюджет байт в обработке. Сверх лимита запросы ждут в
+    очереди с обходом пользователей по кругу, так что один крупный загрузчик
+    не занимает все места. Работает в одном цикле событий, блокировки не нужны.
+
+    Состояние — в памяти воркера, поэтому общие лимиты (UPLOAD_MAX_CONCURRENT,
+    UPLOAD_MAX_BYTES_IN_FLIGHT, UPLOAD_MAX_QUEUED) делятся между воркерами поровну.
+    Лимиты на пользователя действуют в каждом воркере отдельно: запросы одного
+    пользователя приходят в разные воркеры, и делить их значило бы ограничить
+    пользователя одной загрузкой на воркер.
+    """
+
+    def __init__(self):
+        self.max_concurrent = worker_share(settings.UPLOAD_MAX_CONCURRENT)
+        self.max_bytes = worker_share(settings.UPLOAD_MAX_BYTES_IN_FLIGHT)
+        self.max_queued = worker_share(settings.UPLOAD_MAX_QUEUED)
+        self.active = 0
+        self.bytes = 0
+        self.per_user: dict[str, int] = {}
+        # Пользователь -> очередь (future, размер); порядок ключей — порядок обхода
+        self.waiters: OrderedDict[str, deque] = OrderedDict()
+
+    def _fits(self, user: str, size: int) -> bool:
+        return (
+            self.active < self.max_concurrent
+            and self.per_user.get(user, 0) < settings.UPLOAD_MAX_PER_USER
+            # Одна загрузка допускается всегда, даже если она больше бюджета
+            and (self.bytes + size <= self.max_bytes or self.active == 0)
+        )
+
+    def _grant(self, user: str, size: int) -> None:
+        self.active += 1
+        self.bytes += size
+        self.per_user[user] = self.per_user.get(user, 0) + 1
+        UPLOADS_ACTIVE.set(self.active)
+        UPLOAD_BYTES_IN_FLIGHT.set(self.bytes)
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+    async def acquire(self, user: str, size: int) -> None:
+        if not self.waiters and self._fits(user, size):
+            self._grant(user, size)
+            return
+        queue = self.waiters.get(user)
+        if queue is not None and len(queue) >= settings.UPLOAD_MAX_QUEUED_PER_USER:
+            raise Rejected(429, "user_queue_full", "Слишком много одновременных загрузок")
+        if self._queued() >= self.max_queued:
+            raise Rejected(429, "queue_full", "Сервер перегружен загрузками")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, size)
+        self.waiters.setdefault(user, deque()).append(waiter)
+        UPLOADS_QUEUED.set(self._queued())
+        granted = lambda: future.done() and not future.cancelled()
+        try:
+            await asyncio.wait_for(future, settings.UPLOAD_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Место могло освободиться в том же шаге цикла, что и таймаут
+            if not granted():
+                raise Rejected(429, "queue_timeout", "Сервер перегружен загрузками")
+        except BaseException:
+            # Клиент отключился: уже выданное место нужно вернуть
+            if granted():
+                self.release(user, size)
+            raise
+        finally:
+            queue = self.waiters.get(user)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self.waiters[user]
+            UPLOADS_QUEUED.set(self._queued())
+
+    def release(self, user: str, size: int) -> None:
+        self.active -= 1
+        self.bytes -= size
+        self.per_user[user] -= 1
+        if not self.per_user[user]:
+            del self.per_user[user]
+        UPLOADS_ACTIVE.set(self.active)
+        UPLOAD_BYTES_IN_FLIGHT.set(self.bytes)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Раздаёт освободившиеся места: по одному ожидающему на пользователя за круг."""
+        granted = True
+        while granted and self.waiters:
+            granted = False
+            for user in list(self.waiters):
+                queue = self.waiters[user]
+                while queue and queue[0][0].done():
+                    queue.popleft()
+                if not queue:
+                    del self.waiters[user]
+                    continue
+                future, size = queue[0]
+                if self._fits(user, size):
+                    queue.popleft()
+                    self._grant(user, size)
+                    future.set_result(None)
+                    granted = True
+                    # Обслуженный пользователь уходит в конец круга
+                    if queue:
+                        self.waiters.move_to_end(user)
+                    else:
+                        del self.waiters[user]
+
+
+class DiskWatermark:
+    """Свободное место на томах хранилища; значение обновляется не чаще раза в секунду."""
+
+    def __init__(self):
+        self._low = False
+
+    def low(self) -> bool:
+        # Чанк уходит на следующий по рангу том с местом — отказ, только когда заполнены все
+        low = volume_set.all_low()
+        if low and not self._low:
+            logger.error("Free disk space below watermark on all storage volumes, uploads are rejected")
+        self._low = low
+        return low
+
+
+admission = UploadAdmission()
+disk_watermark = DiskWatermark()
+
+
+def token_key(authorization: str) -> str:
+    return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+
+def client_key(scope: Scope, headers: Headers) -> str:
+    """Ключ честной очереди: отпечаток токена (до проверки токена в auth-service) или IP."""
+    authorization = headers.get("authorization")
+    if authorization:
+        return token_key(authorization)
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+class AdmissionMiddleware:
+    """
+    Допуск запросов загрузки (upload_chunk, upload_metadata) до чтения тела.
+    Скачивания проходят без ожидания — загрузки не вытесняют интерактивное чтение.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or not any(p in scope["path"] for p in UPLOAD_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        try:
+            size = int(headers.get("content-length", settings.UPLOAD_ASSUMED_BYTES))
+        except ValueError:
+            size = settings.UPLOAD_ASSUMED_BYTES
+        user = client_key(scope, headers)
+        try:
+            if size > settings.UPLOAD_MAX_REQUEST_BYTES:
+                raise Rejected(413, "too_large", "Слишком большой запрос")
+            if disk_watermark.low():
+                raise Rejected(503, "disk_low", "Недостаточно места в хранилище")
+            await admission.acquire(user, size)
+        except Rejected as e:
+            UPLOADS_REJECTED.labels(reason=e.reason).inc()
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(settings.UPLOAD_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(user, size)
@@ -0,0 +1,285 @@
+import errno
+import hashlib
+import os
+import re
+import tarfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator
+
+from prometheus_client import Counter
+
+from .volumes import volume_set
+
+BLOCK = 512
+END = bytes(2 * BLOCK)
+# Размер блока чтения файлов и отправки тела ответа
+READ_BLOCK = 256 * 1024
+
+CHUNK_RE = re.compile(r"^(\d+)\.chenc$")
+# Имя члена архива: chat_<id>/<file_id>/metadata.json или chat_<id>/<file_id>/<n>.chenc
+MEMBER_RE = re.compile(r"^(?:chat_\d+/)?(\d+)/(metadata\.json|\d+\.chenc)$")
+
+ARCHIVE_BYTES = Counter("media_archive_bytes_total", "Байт экспорта и импорта чатов", ["direction"])
+ARCHIVE_MEMBERS = Counter("media_archive_members_total", "Файлы экспорта и импорта чатов", ["direction", "result"])
+
+
+class ArchiveChanged(Exception):
+    """Файл изменился или удалён после составления описи экспорта."""
+
+
+class ArchiveError(ValueError):
+    """Поток импорта не является архивом tar."""
+
+
+@dataclass(slots=True)
+class Member:
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+    def header(self) -> bytes:
+        info = tarfile.TarInfo(self.name)
+        info.size = self.size
+        info.mtime = self.mtime_ns // 1_000_000_000
+        info.mode = 0o644
+        return info.tobuf(format=tarfile.USTAR_FORMAT)
+
+
+@dataclass(slots=True)
+class FileRange:
+    member: Member
+    start: int
+    count: int
+
+
+class ChatExport:
+    """
+    Опись экспорта чата: все файлы чата со всех томов в детерминированном порядке
+    (file_id по возрастанию, чанки по номеру, metadata.json последним). Размер
+    архива известен заранее, поэтому любой байт архива можно отдать с любого
+    смещения без повторного чтения предыдущих файлов.
+    """
+
+    def __init__(self, chat_id: int, members: list[Member]):
+        self.chat_id = chat_id
+        self.members = members
+        self.size = sum(BLOCK + m.size + -m.size % BLOCK for m in members) + len(END)
+        digest = hashlib.blake2b(digest_size=12)
+        for m in members:
+            digest.update(f"{m.name}:{m.size}:{m.mtime_ns}\n".encode("utf-8"))
+        self.etag = f'"{digest.hexdigest()}"'
+
+    @classmethod
+    def scan(cls, chat_id: int) -> "ChatExport":
+        files: dict[int, dict[int, str]] = {}
+        for volume in volume_set.volumes:
+            chat_dir = os.path.join(volume.path, "chats", f"chat_{chat_id}")
+            try:
+                file_names = os.listdir(chat_dir)
+            except FileNotFoundError:
+                continue
+            for file_name in file_names:
+                if not file_name.isdigit():
+                    continue
+                try:
+                    entries = os.listdir(os.path.join(chat_dir, file_name))
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                chunks = files.setdefault(int(file_name), {})
+                for entry in entries:
+                    match = CHUNK_RE.match(entry)
+                    if match:
+                        # Во время перебалансировки копии чанка на двух томах одинаковы
+                        chunks.setdefault(int(match.group(1)), os.path.join(chat_dir, file_name, entry))
+
+        members = []
+        for file_id in sorted(files):
+            paths = [(f"{index}.chenc", path) for index, path in sorted(files[file_id].items())]
+            meta_path = volume_set.find_metadata(chat_id, file_id)
+            if meta_path is not None:
+                # Последним: при импорте файл становится видимым, когда его чанки уже на месте
+                paths.append(("metadata.json", meta_path))
+            for name, path in paths:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                members.append(Member(f"chat_{chat_id}/{file_id}/{name}", path, st.st_size, st.st_mtime_ns))
+        return cls(chat_id, members)
+
+    def _layout(self) -> Iterator[bytes | FileRange]:
+        for member in self.members:
+            yield member.header()
+            yield FileRange(member, 0, member.size)
+            if member.size % BLOCK:
+                yield bytes(-member.size % BLOCK)
+        yield END
+
+    def segments(self, offset: int = 0, length: int | None = None) -> Iterator[bytes | FileRange]:
+        """Части архива в диапазоне [offset, offset + length): байты заголовков или диапазоны файлов."""
+        stop = self.size if length is None else min(self.size, offset + length)
+        position = 0
+        for part in self._layout():
+            size = part.count if isinstance(part, FileRange) else len(part)
+            start, end = position, position + size
+            position = end
+            if end <= offset:
+                continue
+            if start >= stop:
+                break
+            skip, take = max(0, offset - start), min(end, stop) - max(start, offset)
+            if isinstance(part, FileRange):
+                yield FileRange(part.member, part.start + skip, take)
+            else:
+                yield part[skip:skip + take]
+
+
+def open_member(member: Member):
+    """Открывает файл описи; если он изменился с момента scan — ArchiveChanged."""
+    try:
+        f = open(member.path, "rb")
+    except FileNotFoundError:
+        raise ArchiveChanged(f"{member.name} was removed")
+    st = os.fstat(f.fileno())
+    if st.st_size != member.size or st.st_mtime_ns != member.mtime_ns:
+        f.close()
+        raise ArchiveChanged(f"{member.name} was modified")
+    return f
+
+
+def iter_archive(export: ChatExport, offset: int = 0, length: int | None = None) -> Iterator[bytes]:
+    """
+    Тело архива блоками не больше READ_BLOCK: память не зависит от размера чата.
+    Заголовки и выравнивание склеиваются с данными, чтобы не отправлять кусочки по 512 байт.
+    """
+    pending = bytearray()
+    for part in export.segments(offset, length):
+        if not isinstance(part, FileRange):
+            pending += part
+            continue
+        with open_member(part.member) as f:
+            f.seek(part.start)
+            remaining = part.count
+            while remaining:
+                data = f.read(min(READ_BLOCK - len(pending), remaining))
+                if not data:
+                    raise ArchiveChanged(f"{part.member.name} was truncated")
+                remaining -= len(data)
+                pending += data
+                if len(pending) >= READ_BLOCK:
+                    ARCHIVE_BYTES.labels(direction="export").inc(len(pending))
+                    yield bytes(pending)
+                    pending.clear()
+            volume_set.record_io(part.member.path, "read", part.count)
+        ARCHIVE_MEMBERS.labels(direction="export", result="sent").inc()
+    if pending:
+        ARCHIVE_BYTES.labels(direction="export").inc(len(pending))
+        yield bytes(pending)
+
+
+def write_archive(export: ChatExport, fd: int, offset: int = 0) -> int:
+    """Пишет архив в дескриптор: файлы копируются ядром через sendfile, без копии в памяти процесса."""
+    written = 0
+    for part in export.segments(offset):
+        if not isinstance(part, FileRange):
+            view = memoryview(part)
+            while view:
+                n = os.write(fd, view)
+                view = view[n:]
+            written += len(part)
+            continue
+        with open_member(part.member) as f:
+            position, remaining = part.start, part.count
+            while remaining:
+                try:
+                    n = os.sendfile(fd, f.fileno(), position, min(remaining, 1 << 30))
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.ENOSYS):
+                        raise
+                    # Дескриптор не поддерживает sendfile — обычное копирование блоками
+                    f.seek(position)
+                    n = os.write(fd, f.read(min(remaining, READ_BLOCK)))
+                if n == 0:
+                    raise ArchiveChanged(f"{part.member.name} was truncated")
+                position += n
+                remaining -= n
+            volume_set.record_io(part.member.path, "read", part.count)
+        written += part.count
+        ARCHIVE_MEMBERS.labels(direction="export", result="sent").inc()
+    ARCHIVE_BYTES.labels(direction="export").inc(written)
+    return written
+
+
+class ArchiveReader:
+    """
+    Потоковый разбор tar из асинхронного источника байт (тело запроса, файл).
+    В памяти — только текущий член архива; всё, что не нужно импорту, пропускается без буферизации.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes]):
+        self._stream = stream.__aiter__()
+        self._buffer = bytearray()
+        self._eof = False
+        # Байт потока, разобранных до конца последнего члена архива
+        self.offset = 0
+
+    async def _fill(self, size: int) -> None:
+        while len(self._buffer) < size and not self._eof:
+            try:
+                self._buffer += await self._stream.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+
+    async def read(self, size: int) -> bytes:
+        await self._fill(size)
+        if len(self._buffer) < size:
+            raise ArchiveError("Unexpected end of archive")
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def skip(self, size: int) -> None:
+        while size:
+            await self._fill(min(size, READ_BLOCK))
+            if not self._buffer:
+                raise ArchiveError("Unexpected end of archive")
+            n = min(size, len(self._buffer))
+            del self._buffer[:n]
+            size -= n
+
+    async def members(self, max_size: int) -> AsyncIterator[tuple[tarfile.TarInfo, bytes | None]]:
+        """
+        (заголовок, содержимое) по порядку; содержимое None — член пропущен
+        (не обычный файл или больше max_size). Поток может начинаться с любого
+        заголовка: продолжение экспорта с Range — тоже корректный вход.
+        """
+        while True:
+            await self._fill(BLOCK)
+            if not self._buffer:
+                # Архив без завершающих нулевых блоков (обрезан по границе члена)
+                return
+            header = await self.read(BLOCK)
+            if header == bytes(BLOCK):
+                return
+            try:
+                info = tarfile.TarInfo.frombuf(header, "utf-8", "surrogateescape")
+            except tarfile.HeaderError as e:
+                raise ArchiveError(f"Bad tar header: {e}")
+            padded = info.size + -info.size % BLOCK
+            if info.isreg() and info.size <= max_size:
+                data = await self.read(info.size)
+                await self.skip(padded - info.size)
+            else:
+                data = None
+                await self.skip(padded)
+            yield info, data
+            self.offset += BLOCK + padded
+
+
+def member_target(name: str) -> tuple[int, str] | None:
+    """(file_id, имя файла) для члена архива или None для посторонних путей."""
+    match = MEMBER_RE.match(name)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2)
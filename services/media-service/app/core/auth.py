@@ -1,20 +1,41 @@
-import os
 import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from .config import settings
+from .tracing import inject, span
 
 security = HTTPBearer(auto_error=True)
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    token = credentials.credentials
-    url = settings.AUTH_HOST.rstrip('/') + '/auth-service/auth/verify'
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, headers={
+# Общий клиент с пулом keep-alive соединений до auth-service (создаётся в lifespan)
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.AUTH_HOST.rstrip('/'),
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def verify_bearer(token: str) -> int:
+    """Проверяет токен в auth-service и возвращает user_id; HTTPException 401/502 при отказе."""
+    with span("auth.verify"):
+        resp = await get_http_client().get('/auth-service/auth/verify', headers=inject({
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
-        })
+        }))
     if resp.status_code == 401:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     if resp.status_code != 200:
@@ -24,3 +45,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     return int(user_id)
+
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    return await verify_bearer(credentials.credentials)
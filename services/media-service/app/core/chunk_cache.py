@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from prometheus_client import Counter, Gauge
+
+from .config import settings
+from .responses import loads
+from .volumes import volume_set
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = Counter(
+    "media_chunk_cache_requests_total",
+    "Обращения к кэшу чанков и метаданных",
+    ["kind", "result"],
+)
+# livesum: при нескольких воркерах — сумма по живым процессам
+CACHE_BYTES = Gauge("media_chunk_cache_bytes", "Байт в кэше чанков", multiprocess_mode="livesum")
+CACHE_ENTRIES = Gauge("media_chunk_cache_entries", "Записей в кэше чанков", multiprocess_mode="livesum")
+CACHE_EVICTIONS = Counter("media_chunk_cache_evictions_total", "Вытеснения из кэша чанков")
+PREFETCHED = Counter("media_chunk_prefetch_total", "Чанки, прочитанные упреждающе")
+INLINE_FILES = Counter("media_inline_files_total", "Файлы, встроенные в список файлов сообщения", ["result"])
+
+
+class ByteLRU:
+    """Потокобезопасный LRU, ограниченный суммарным размером значений в байтах."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            return item[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def set(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                CACHE_EVICTIONS.inc()
+            CACHE_BYTES.set(self.bytes)
+            CACHE_ENTRIES.set(len(self._data))
+
+    def pop_matching(self, predicate) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self.bytes -= self._data.pop(key)[1]
+            CACHE_BYTES.set(self.bytes)
+            CACHE_ENTRIES.set(len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ChunkCache:
+    """
+    Кэш горячих чанков и разобранных метаданных файлов.
+    Чанки неизменяемы (повторная загрузка отвечает "exists") и удаляются только
+    вместе с файлом. Метаданные дописываются при загрузке чанков, поэтому запись
+    проверяется по mtime и размеру metadata.json — это работает и между воркерами.
+    """
+
+    def __init__(self):
+        self._lru = ByteLRU(settings.CHUNK_CACHE_BYTES)
+        self._inflight: set[tuple] = set()
+        self._inflight_lock = threading.Lock()
+
+    # ---------- Метаданные ----------
+
+    def get_metadata(self, chat_id: int, file_id: int) -> tuple[bytes, dict] | None:
+        """Сырые байты и разобранный metadata.json или None, если файла нет."""
+        path = volume_set.find_metadata(chat_id, file_id)
+        try:
+            if path is None:
+                raise FileNotFoundError
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.drop_file(chat_id, file_id)
+            return None
+        key = ("meta", chat_id, file_id)
+        version = (st.st_mtime_ns, st.st_size)
+        cached = self._lru.get(key)
+        if cached is not None and cached[0] == version:
+            CACHE_REQUESTS.labels(kind="meta", result="hit").inc()
+            return cached[1], cached[2]
+        CACHE_REQUESTS.labels(kind="meta", result="miss").inc()
+        with open(path, "rb") as f:
+            raw = f.read()
+        volume_set.record_io(path, "read", len(raw))
+        parsed = loads(raw)
+        # Разобранный JSON занимает в памяти в несколько раз больше исходного текста
+        self._lru.set(key, (version, raw, parsed), len(raw) * 4)
+        return raw, parsed
+
+    # ---------- Чанки ----------
+
+    def _read_chunk(self, chat_id: int, file_id: int, index: int, cacheable: bool) -> bytes | None:
+        path = volume_set.find_chunk(chat_id, file_id, index)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        volume_set.record_io(path, "read", len(data))
+        if cacheable:
+            self._lru.set(("chunk", chat_id, file_id, index), data, len(data))
+        return data
+
+    def get_chunk(self, chat_id: int, file_id: int, index: int, cacheable: bool = True) -> bytes | None:
+        """
+        Чанк из кэша или с диска. cacheable=False — загрузка чанка ещё не
+        завершена (нет nonce в метаданных), такой чанк не кэшируется.
+        """
+        data = self._lru.get(("chunk", chat_id, file_id, index))
+        if data is not None:
+            CACHE_REQUESTS.labels(kind="chunk", result="hit").inc()
+            return data
+        CACHE_REQUESTS.labels(kind="chunk", result="miss").inc()
+        return self._read_chunk(chat_id, file_id, index, cacheable)
+
+    def _prefetch(self, chat_id: int, file_id: int, indexes: list[int]) -> None:
+        try:
+            for index in indexes:
+                if self._read_chunk(chat_id, file_id, index, True) is None:
+                    break
+                PREFETCHED.inc()
+        except Exception as e:
+            logger.warning(f"Read-ahead failed for file {file_id}: {e}")
+        finally:
+            with self._inflight_lock:
+                self._inflight.difference_update((chat_id, file_id, i) for i in indexes)
+
+    def read_ahead(self, chat_id: int, file_id: int, index: int, nonces: list) -> None:
+        """
+        Фоном читает чанки index+1..index+CHUNK_READ_AHEAD, которых ещё нет в кэше.
+        Берутся только чанки с nonce в метаданных — их загрузка уже завершена.
+        """
+        last = min(index + settings.CHUNK_READ_AHEAD, len(nonces) - 1)
+        with self._inflight_lock:
+            indexes = [
+                i for i in range(index + 1, last + 1)
+                if nonces[i]
+                and ("chunk", chat_id, file_id, i) not in self._lru
+                and (chat_id, file_id, i) not in self._inflight
+            ]
+            self._inflight.update((chat_id, file_id, i) for i in indexes)
+        if indexes:
+            asyncio.get_running_loop().run_in_executor(None, self._prefetch, chat_id, file_id, indexes)
+
+    def small_file(self, chat_id: int, file_id: int, max_bytes: int) -> tuple[dict, bytes, str] | None:
+        """
+        Метаданные, единственный чанк и его nonce файла не больше max_bytes — одно
+        чтение metadata.json и одно чтение чанка (оба через кэш). None — файл
+        не встраивается: многочанковый, крупный, ещё загружается или не найден.
+        """
+        cached_meta = self.get_metadata(chat_id, file_id)
+        if cached_meta is None:
+            INLINE_FILES.labels(result="missing").inc()
+            return None
+        meta = cached_meta[1]
+        nonces = meta.get("nonces") or []
+        if meta.get("chunk_count", len(nonces)) != 1 or len(nonces) != 1 or not nonces[0]:
+            INLINE_FILES.labels(result="not_single_chunk").inc()
+            return None
+        # size в метаданных — размер открытого текста: крупный файл отсекается до чтения чанка
+        if not isinstance(meta.get("size"), int) or meta["size"] > max_bytes:
+            INLINE_FILES.labels(result="too_large").inc()
+            return None
+        data = self.get_chunk(chat_id, file_id, 0)
+        if data is None or len(data) > max_bytes:
+            INLINE_FILES.labels(result="missing" if data is None else "too_large").inc()
+            return None
+        return meta, data, nonces[0]
+
+    def drop_file(self, chat_id: int, file_id: int) -> None:
+        self._lru.pop_matching(lambda key: key[1] == chat_id and key[2] == file_id)
+
+
+chunk_cache = ChunkCache()
@@ -0,0 +1,173 @@
+import gzip
+import logging
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard необязателен
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Порядок предпочтения сервера при равных q в Accept-Encoding
+PREFERENCE = ("zstd", "br", "gzip")
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+SAMPLE_SIZE = 16 * 1024
+# Тела крупнее сжимаются в пуле потоков, чтобы не задерживать event loop
+THREAD_THRESHOLD = 256 * 1024
+
+
+def available_encodings() -> set[str]:
+    encodings = {"gzip"}
+    if brotli is not None:
+        encodings.add("br")
+    if zstandard is not None:
+        encodings.add("zstd")
+    return encodings
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encoding: str, allowed: dict[str, int]) -> str | None:
+    """
+    Выбирает кодировку по Accept-Encoding с учётом q-значений.
+    allowed — кодировки, разрешённые для маршрута, с уровнями сжатия.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        if encoding not in allowed:
+            continue
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def looks_incompressible(body: bytes) -> bool:
+    """
+    Быстрая проба: сжимает начало тела zlib уровня 1. base64 от шифротекста
+    сжимается только до ~0.76 (выигрыш лишь на 6-битном алфавите) — такие тела
+    не стоят CPU на полное сжатие.
+    """
+    sample = body[:SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) > len(sample) * settings.COMPRESSION_SKIP_RATIO
+
+
+def compression(enabled: bool = True, **levels: int):
+    """
+    Настройка сжатия для маршрута: @compression(gzip=9, br=6) или @compression(enabled=False).
+    Ставится под декоратором роутера.
+    """
+
+    def decorator(endpoint):
+        endpoint.compression = {"enabled": enabled, **levels}
+        return endpoint
+
+    return decorator
+
+
+def _route_levels(scope: Scope) -> dict[str, int] | None:
+    """Уровни сжатия для маршрута или None, если сжатие для него выключено."""
+    levels = {
+        "gzip": settings.COMPRESSION_GZIP_LEVEL,
+        "br": settings.COMPRESSION_BROTLI_QUALITY,
+        "zstd": settings.COMPRESSION_ZSTD_LEVEL,
+    }
+    endpoint = scope.get("endpoint")
+    overrides = dict(getattr(endpoint, "compression", {}))
+    if endpoint is not None:
+        # Переопределения из окружения важнее настроек в коде
+        overrides.update(settings.COMPRESSION_ROUTE_LEVELS.get(endpoint.__name__, {}))
+    if not overrides.pop("enabled", True):
+        return None
+    levels.update(overrides)
+    return {name: level for name, level in levels.items() if name in available_encodings() and level > 0}
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware: сжимает ответы application/json и text/* (zstd, br, gzip)
+    по Accept-Encoding, если тело не меньше COMPRESSION_MIN_SIZE и проба
+    показывает, что оно сжимаемо. Потоковые ответы не трогает.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        accept = Headers(scope=scope).get("accept-encoding", "") if scope["type"] == "http" else ""
+        if not accept or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            initial, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=initial["headers"])
+            content_type = headers.get("content-type", "")
+            compressible = content_type.startswith(COMPRESSIBLE_TYPES) and "content-encoding" not in headers
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            encoding = None
+            if (
+                compressible
+                and not message.get("more_body", False)
+                and initial["status"] == 200
+                and len(body) >= settings.COMPRESSION_MIN_SIZE
+            ):
+                levels = _route_levels(scope)
+                if levels:
+                    encoding = negotiate(accept, levels)
+                if encoding and looks_incompressible(body):
+                    encoding = None
+            if encoding:
+                if len(body) >= THREAD_THRESHOLD:
+                    body = await anyio.to_thread.run_sync(compress, body, encoding, levels[encoding])
+                else:
+                    body = compress(body, encoding, levels[encoding])
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(initial)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,3 +1,4 @@
+import json
 import os
 from pydantic import BaseModel
 
@@ -16,6 +17,99 @@ class Settings(BaseModel):
     POSTGRES_SSLMODE: str = os.getenv("POSTGRES_SSLMODE", "disable")
 
     STORAGE_ROOT: str = os.getenv("STORAGE_ROOT", "storage")
+    # Тома для чанков: "path[:weight],..."; пусто — только STORAGE_ROOT
+    STORAGE_ROOTS: str = os.getenv("STORAGE_ROOTS", "")
+    # Ограничение скорости перебалансировки, байт/с (0 — без ограничения)
+    REBALANCE_MAX_BYTES_PER_SEC: int = int(os.getenv("REBALANCE_MAX_BYTES_PER_SEC", str(64 * 1024 * 1024)))
+
+    # Надёжность записи чанков и metadata.json: none | batched | strict
+    STORAGE_DURABILITY: str = os.getenv("STORAGE_DURABILITY", "none").lower()
+    STORAGE_FSYNC_INTERVAL_MS: float = float(os.getenv("STORAGE_FSYNC_INTERVAL_MS", "20"))
+    STORAGE_FSYNC_BATCH_BYTES: int = int(os.getenv("STORAGE_FSYNC_BATCH_BYTES", str(16 * 1024 * 1024)))
+
+    RELOAD: bool = os.getenv("RELOAD", "false").lower() == "true"
+    UVICORN_LOG_LEVEL: str = os.getenv("UVICORN_LOG_LEVEL", "info")
+
+    # Воркеры gunicorn: число ("auto" — по CPU), перезапуск по запросам и памяти.
+    # Кэш чанков и лимиты допуска загрузок действуют в каждом воркере отдельно
+    WORKERS: str = os.getenv("WORKERS", "auto")
+    WORKERS_MAX: int = int(os.getenv("WORKERS_MAX", "8"))
+    WORKER_MAX_REQUESTS: int = int(os.getenv("WORKER_MAX_REQUESTS", "10000"))
+    WORKER_MAX_REQUESTS_JITTER: int = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "1000"))
+    WORKER_MAX_RSS_MB: int = int(os.getenv("WORKER_MAX_RSS_MB", "1024"))
+    WORKER_RSS_CHECK_INTERVAL: float = float(os.getenv("WORKER_RSS_CHECK_INTERVAL", "10"))
+    WORKER_TIMEOUT: int = int(os.getenv("WORKER_TIMEOUT", "60"))
+    WORKER_GRACEFUL_TIMEOUT: int = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30"))
+    # Протокол воркеров: http1 (uvicorn) или h2c (hypercorn, HTTP/1.1 и HTTP/2 без TLS на одном порту)
+    HTTP_PROTOCOL: str = os.getenv("HTTP_PROTOCOL", "http1").lower()
+    H2_MAX_CONCURRENT_STREAMS: int = int(os.getenv("H2_MAX_CONCURRENT_STREAMS", "256"))
+    H2_STREAM_WINDOW: int = int(os.getenv("H2_STREAM_WINDOW", str(1024 * 1024)))
+    H2_CONNECTION_WINDOW: int = int(os.getenv("H2_CONNECTION_WINDOW", str(16 * 1024 * 1024)))
+    H2_MAX_INBOUND_FRAME_SIZE: int = int(os.getenv("H2_MAX_INBOUND_FRAME_SIZE", str(64 * 1024)))
+    H2_KEEP_ALIVE_TIMEOUT: float = float(os.getenv("H2_KEEP_ALIVE_TIMEOUT", "75"))
+    # Каталог метрик prometheus_client для сбора значений со всех воркеров
+    PROMETHEUS_MULTIPROC_DIR: str = os.getenv("PROMETHEUS_MULTIPROC_DIR", "/tmp/media-service-metrics")
+
+    # Кэш горячих чанков и метаданных, окно упреждающего чтения
+    CHUNK_CACHE_BYTES: int = int(os.getenv("CHUNK_CACHE_BYTES", str(256 * 1024 * 1024)))
+    CHUNK_READ_AHEAD: int = int(os.getenv("CHUNK_READ_AHEAD", "4"))
+    # Встраивание мелких файлов в messages/.../files?inline=true: порог размера файла
+    # (зашифрованный чанк) и предел суммы встроенных байт на ответ
+    INLINE_MAX_FILE_BYTES: int = int(os.getenv("INLINE_MAX_FILE_BYTES", str(64 * 1024)))
+    INLINE_MAX_RESPONSE_BYTES: int = int(os.getenv("INLINE_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+
+    # WebSocket-канал передачи чанков: кредиты на соединение, размер кадра,
+    # ожидание авторизации и период повторной проверки токена
+    WS_CREDITS: int = int(os.getenv("WS_CREDITS", "16"))
+    WS_MAX_FRAME_BYTES: int = int(os.getenv("WS_MAX_FRAME_BYTES", str(16 * 1024 * 1024)))
+    WS_AUTH_TIMEOUT: float = float(os.getenv("WS_AUTH_TIMEOUT", "10"))
+    WS_AUTH_TTL: float = float(os.getenv("WS_AUTH_TTL", "300"))
+
+    # Допуск загрузок: лимиты одновременных загрузок, бюджет байт, очередь и свободное место
+    UPLOAD_MAX_CONCURRENT: int = int(os.getenv("UPLOAD_MAX_CONCURRENT", "32"))
+    UPLOAD_MAX_PER_USER: int = int(os.getenv("UPLOAD_MAX_PER_USER", "4"))
+    UPLOAD_MAX_BYTES_IN_FLIGHT: int = int(os.getenv("UPLOAD_MAX_BYTES_IN_FLIGHT", str(256 * 1024 * 1024)))
+    UPLOAD_MAX_REQUEST_BYTES: int = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(64 * 1024 * 1024)))
+    UPLOAD_ASSUMED_BYTES: int = int(os.getenv("UPLOAD_ASSUMED_BYTES", str(8 * 1024 * 1024)))
+    UPLOAD_MAX_QUEUED: int = int(os.getenv("UPLOAD_MAX_QUEUED", "256"))
+    UPLOAD_MAX_QUEUED_PER_USER: int = int(os.getenv("UPLOAD_MAX_QUEUED_PER_USER", "8"))
+    UPLOAD_QUEUE_TIMEOUT: float = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "10"))
+    UPLOAD_RETRY_AFTER: int = int(os.getenv("UPLOAD_RETRY_AFTER", "2"))
+    DISK_MIN_FREE_BYTES: int = int(os.getenv("DISK_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+    DISK_MIN_FREE_RATIO: float = float(os.getenv("DISK_MIN_FREE_RATIO", "0.05"))
+
+    # Учёт места по чатам и пользователям: период записи изменений в БД, сверка с диском,
+    # квоты (0 — без квоты) и время жизни прочитанных итогов для проверки квот
+    USAGE_FLUSH_INTERVAL: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "1"))
+    USAGE_RECONCILE_INTERVAL: float = float(os.getenv("USAGE_RECONCILE_INTERVAL", "21600"))
+    USAGE_RECONCILE_GRACE: float = float(os.getenv("USAGE_RECONCILE_GRACE", "300"))
+    USAGE_QUOTA_USER_BYTES: int = int(os.getenv("USAGE_QUOTA_USER_BYTES", "0"))
+    USAGE_QUOTA_CHAT_BYTES: int = int(os.getenv("USAGE_QUOTA_CHAT_BYTES", "0"))
+    USAGE_CACHE_SECONDS: float = float(os.getenv("USAGE_CACHE_SECONDS", "5"))
+
+    # Сжатие ответов: порог размера, доля для пропуска несжимаемых тел и уровни
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_SKIP_RATIO: float = float(os.getenv("COMPRESSION_SKIP_RATIO", "0.75"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    COMPRESSION_ZSTD_LEVEL: int = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+    # JSON: {"get_message_files": {"gzip": 9}, "get_video_metadata": {"enabled": false}}
+    COMPRESSION_ROUTE_LEVELS: dict = json.loads(os.getenv("COMPRESSION_ROUTE_LEVELS", "{}"))
+
+    # Трассировка запросов
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "media-service")
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces/media-service.jsonl")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    TRACE_SERVER_TIMING: bool = os.getenv("TRACE_SERVER_TIMING", "true").lower() == "true"
+
+    # Профилирование по запросу администратора
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_SECONDS: float = float(os.getenv("PROFILING_MAX_SECONDS", "300"))
+    ADMIN_USER_IDS: list[int] = [int(v) for v in os.getenv("ADMIN_USER_IDS", "").split(",") if v.strip()]
 
     @property
     def DATABASE_URL(self) -> str:
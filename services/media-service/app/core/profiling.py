@@ -0,0 +1,249 @@
+import asyncio
+import linecache
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Вершины стеков, в которых поток просто ждёт работу (пул потоков, select цикла событий)
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+    ("thread.py", "_worker"), ("threading.py", "_wait_for_tstate_lock"),
+}
+
+
+def output_path(prefix: str, ext: str) -> str:
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(settings.PROFILING_DIR, f"{prefix}-{os.getpid()}-{stamp}.{ext}")
+
+
+def format_stack(frame) -> list[str]:
+    """Стек от корня к вершине в виде 'функция (файл:строка)'."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class CpuProfiler:
+    """
+    Сэмплирующий профилировщик: фоновый поток снимает стеки всех потоков
+    через sys._current_frames() и пишет их в формате collapsed stacks
+    (speedscope, flamegraph.pl). Пока сессия не запущена, накладных расходов нет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.requests_left: int | None = None
+        self.last_result: dict | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float | None, requests: int | None, interval: float, include_idle: bool) -> str:
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Профилирование CPU уже запущено")
+            seconds = min(seconds or settings.PROFILING_MAX_SECONDS, settings.PROFILING_MAX_SECONDS)
+            path = output_path("cpu", "folded")
+            self.requests_left = requests
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(path, time.monotonic() + seconds, interval, include_idle),
+                name="cpu-profiler", daemon=True,
+            )
+            self._thread.start()
+            return path
+
+    def request_finished(self) -> None:
+        # Вызывается middleware только во время сессии с лимитом по запросам
+        with self._lock:
+            if self.requests_left is not None:
+                self.requests_left -= 1
+                if self.requests_left <= 0:
+                    self._stop.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, path: str, deadline: float, interval: float, include_idle: bool) -> None:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        samples = 0
+        started = time.monotonic()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not include_idle and _is_idle(frame)):
+                    continue
+                stack = [names.get(ident, str(ident))] + format_stack(frame)
+                counts[";".join(stack)] += 1
+            samples += 1
+            self._stop.wait(interval)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        self.requests_left = None
+        self.last_result = {
+            "file": os.path.basename(path),
+            "samples": samples,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        logger.info(f"CPU profile written to {path}: {samples} samples")
+
+
+class MemoryProfiler:
+    """Снимки tracemalloc и их сравнение; трассировка аллокаций включается по запросу."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snapshots: dict[str, str] = {}
+
+    def start(self, frames: int) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def snapshot(self, compare_to: str | None, limit: int) -> dict:
+        """
+        Сохраняет снимок (формат tracemalloc.Snapshot.dump) и текстовый отчёт:
+        топ аллокаций или разницу с ранее сохранённым снимком.
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc не запущен")
+        with self._lock:
+            base = None
+            if compare_to is not None:
+                base_path = self.snapshots.get(compare_to)
+                if base_path is None:
+                    raise KeyError(compare_to)
+                base = tracemalloc.Snapshot.load(base_path)
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+            ))
+            path = output_path("mem", "snapshot")
+            snapshot.dump(path)
+            name = os.path.basename(path)
+            self.snapshots[name] = path
+            stats = snapshot.compare_to(base, "lineno") if base is not None else snapshot.statistics("lineno")
+            lines = [str(stat) for stat in stats[:limit]]
+            with open(path[: -len(".snapshot")] + ".txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        current, peak = tracemalloc.get_traced_memory()
+        return {"snapshot": name, "compare_to": compare_to, "current_bytes": current, "peak_bytes": peak, "top": lines}
+
+
+class LoopMonitor:
+    """
+    Сторож цикла событий: корутина отмечает «пульс», фоновый поток проверяет,
+    как давно он был. Если цикл занят дольше порога, поток снимает стек
+    потока цикла — видно, какой колбэк его блокирует.
+    """
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+        self._task: asyncio.Task | None = None
+        self._beat = 0.0
+        self._loop_thread: int | None = None
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.path: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def _heartbeat(self, interval: float) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def start(self, seconds: float, threshold: float, interval: float = 0.01) -> str:
+        """Вызывается из цикла событий, который нужно наблюдать."""
+        if self.active:
+            raise RuntimeError("Мониторинг цикла событий уже запущен")
+        seconds = min(seconds, settings.PROFILING_MAX_SECONDS)
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self.max_lag, self.stalls = 0.0, 0
+        self.path = output_path("loop", "txt")
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(interval))
+        self._thread = threading.Thread(
+            target=self._watch, args=(time.monotonic() + seconds, threshold, interval),
+            name="loop-monitor", daemon=True,
+        )
+        self._thread.start()
+        return self.path
+
+    def _watch(self, deadline: float, threshold: float, interval: float) -> None:
+        reported_beat = None
+        with open(self.path, "w", encoding="utf-8") as f:
+            while time.monotonic() < deadline:
+                time.sleep(interval)
+                beat = self._beat
+                lag = time.monotonic() - beat - interval
+                self.max_lag = max(self.max_lag, lag)
+                # Один стек на каждую остановку цикла
+                if lag > threshold and beat != reported_beat:
+                    reported_beat = beat
+                    self.stalls += 1
+                    frame = sys._current_frames().get(self._loop_thread)
+                    f.write(f"# {datetime.now().isoformat()} lag {lag * 1000:.1f} ms\n")
+                    f.write("\n".join(format_stack(frame)) + "\n\n" if frame else "стек недоступен\n\n")
+                    f.flush()
+        self._task.get_loop().call_soon_threadsafe(self._task.cancel)
+        logger.info(f"Event loop monitoring finished: {self.stalls} stalls, max lag {self.max_lag * 1000:.1f} ms")
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "file": os.path.basename(self.path) if self.path else None,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
+
+cpu_profiler = CpuProfiler()
+memory_profiler = MemoryProfiler()
+loop_monitor = LoopMonitor()
+
+
+class ProfilingMiddleware:
+    """Считает запросы для сессии CPU-профилирования с лимитом по числу запросов."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if cpu_profiler.requests_left is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cpu_profiler.request_finished()
@@ -0,0 +1,105 @@
+import base64
+import json
+import re
+from decimal import Decimal
+from typing import Any, BinaryIO, Iterator
+
+from fastapi import HTTPException, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+RANGE_RE = re.compile(r"^bytes=(\d+)-(\d*)$")
+# Multiple of 3: base64 of consecutive blocks concatenates into base64 of the whole file
+BASE64_BLOCK = 3 * 64 * 1024
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serializes content to compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Opt-in JSON response. Returning it from an endpoint bypasses
+    jsonable_encoder, and the body is rendered with orjson (stdlib json as fallback).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def raw_json_response(body: bytes, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Returns an already serialized JSON body as is."""
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def base64_field_body(field: str, data: bytes, extra: dict) -> bytes:
+    """
+    Builds {"<field>": "<base64>", ...extra} without materializing the base64
+    payload as a Python str and without escaping it (the base64 alphabet
+    needs no JSON escaping).
+    """
+    tail = dumps(extra)
+    separator = b"," if len(tail) > 2 else b""
+    return b'{"' + field.encode("ascii") + b'":"' + base64.b64encode(data) + b'"' + separator + tail[1:]
+
+
+def base64_field_stream(field: str, f: BinaryIO, size: int, extra: dict) -> tuple[int, Iterator[bytes]]:
+    """
+    Streaming variant of base64_field_body for files: returns the exact body
+    length (for Content-Length) and an iterator that encodes size bytes of f
+    block by block. Memory per request is one block regardless of the file
+    size. The iterator owns f and closes it.
+    """
+    tail = dumps(extra)
+    separator = b"," if len(tail) > 2 else b""
+    head = b'{"' + field.encode("ascii") + b'":"'
+    end = b'"' + separator + tail[1:]
+
+    def body() -> Iterator[bytes]:
+        try:
+            yield head
+            remaining = size
+            while remaining:
+                data = f.read(min(BASE64_BLOCK, remaining))
+                if not data:
+                    raise OSError(f"{f.name} was truncated while streaming")
+                remaining -= len(data)
+                yield base64.b64encode(data)
+            yield end
+        finally:
+            f.close()
+
+    return len(head) + (size + 2) // 3 * 4 + len(end), body()
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """A single "bytes=N-" or "bytes=N-M" range -> (offset, length); None means the whole body."""
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start = int(match.group(1))
+    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Range Not Satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end - start + 1
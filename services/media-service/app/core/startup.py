@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+
+from .auth import get_http_client
+from .usage import usage_ledger
+from ..db import get_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Состояние прогрева воркера для /healthz и /readyz.
+    Воркер считается готовым, только когда все прогревы завершились успешно.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready_at: float | None = None
+        self.checks: dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def startup_seconds(self) -> float | None:
+        return None if self.ready_at is None else round(self.ready_at - self.started_at, 3)
+
+
+readiness = Readiness()
+
+
+def _check_db() -> None:
+    with get_cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+async def warm_db() -> None:
+    await asyncio.to_thread(_check_db)
+
+
+async def warm_usage_ledger() -> None:
+    """Таблицы учёта места должны существовать до первой записи изменений (их создаёт миграция)."""
+    await asyncio.to_thread(usage_ledger.check_schema)
+
+
+async def warm_auth_client() -> None:
+    """Открывает keep-alive соединение до auth-service заранее."""
+    resp = await get_http_client().get('/auth-service/healthz')
+    resp.raise_for_status()
+
+
+async def _run_check(name: str, check) -> None:
+    delay = 0.5
+    while True:
+        try:
+            await check()
+            readiness.checks[name] = "ok"
+            return
+        except Exception as e:
+            readiness.checks[name] = f"error: {type(e).__name__}"
+            logger.error(f"Warm-up {name} failed: {e}, retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+
+async def warm_up() -> None:
+    """Параллельно прогревает БД и HTTP-клиент и фиксирует время старта."""
+    await asyncio.gather(
+        _run_check("database", warm_db),
+        _run_check("usage_ledger", warm_usage_ledger),
+        _run_check("auth_service", warm_auth_client),
+    )
+    readiness.ready_at = time.monotonic()
+    logger.info(f"Service ready in {readiness.startup_seconds}s")
@@ -0,0 +1,188 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Histogram
+
+from .config import settings
+from .tracing import span
+from .volumes import volume_set
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("none", "batched", "strict")
+
+FSYNC_SECONDS = Histogram(
+    "media_storage_fsync_seconds",
+    "Длительность fsync записей хранилища",
+    ["mode"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+FSYNC_BATCH_FILES = Histogram(
+    "media_storage_fsync_batch_files",
+    "Файлов в одном групповом fsync",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+FSYNC_BATCH_BYTES = Histogram(
+    "media_storage_fsync_batch_bytes",
+    "Байт в одном групповом fsync",
+    buckets=tuple(2 ** p for p in range(12, 28, 2)),
+)
+
+
+def _durability() -> str:
+    mode = settings.STORAGE_DURABILITY
+    if mode not in DURABILITY_MODES:
+        # Опечатка в конфигурации не должна незаметно отключить fsync
+        logger.warning(f"Unknown STORAGE_DURABILITY={mode!r}, using strict")
+        return "strict"
+    return mode
+
+
+DURABILITY = _durability()
+
+
+def fsync_path(path: str, directory: bool = False) -> None:
+    fd = os.open(path, os.O_RDONLY | (os.O_DIRECTORY if directory else 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommit:
+    """
+    Групповой fsync для режима batched: записи подтверждаются сразу после
+    rename, а фоновый поток раз в STORAGE_FSYNC_INTERVAL_MS (или по накоплении
+    STORAGE_FSYNC_BATCH_BYTES) сбрасывает на диск все изменённые файлы и
+    их каталоги одним проходом. При сбое теряется не больше одного окна.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._files: set[str] = set()
+        self._bytes = 0
+        self._first_at: float | None = None
+        self._stop = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None or DURABILITY != "batched":
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, size: int) -> None:
+        if self._thread is None:
+            # Поток не запущен (скрипты, тесты без lifespan) — синхронизируем сразу
+            self._sync({path}, size)
+            return
+        with self._cond:
+            self._files.add(path)
+            self._bytes += size
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            elif self._bytes >= settings.STORAGE_FSYNC_BATCH_BYTES:
+                self._cond.notify()
+
+    def _run(self) -> None:
+        interval = settings.STORAGE_FSYNC_INTERVAL_MS / 1000
+        while True:
+            with self._cond:
+                while not self._files and not self._stop:
+                    self._cond.wait()
+                if not self._files:
+                    return
+                deadline = self._first_at + interval
+                while not self._stop and self._bytes < settings.STORAGE_FSYNC_BATCH_BYTES:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                files, size = self._files, self._bytes
+                self._files, self._bytes, self._first_at = set(), 0, None
+            self._sync(files, size)
+
+    @staticmethod
+    def _sync(files: set[str], size: int) -> None:
+        started = time.perf_counter()
+        directories = {os.path.dirname(path) for path in files}
+        for path, directory in [(p, False) for p in files] + [(d, True) for d in directories]:
+            try:
+                fsync_path(path, directory)
+            except FileNotFoundError:
+                # Файл уже удалён или заменён следующей записью, которая попадёт в свою пачку
+                pass
+            except OSError as e:
+                logger.error(f"fsync failed for {path}: {e}")
+        FSYNC_SECONDS.labels(mode="batched").observe(time.perf_counter() - started)
+        FSYNC_BATCH_FILES.observe(len(files))
+        FSYNC_BATCH_BYTES.observe(size)
+
+    def stop(self) -> None:
+        """Останавливает поток, дописав накопленную пачку."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join(timeout=10.0)
+        self._thread = None
+
+
+group_commit = GroupCommit()
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Эксклюзивная блокировка flock на файле-замке. Действует между процессами,
+    поэтому чтение-изменение-запись metadata.json корректно при нескольких воркерах.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Закрытие дескриптора снимает блокировку
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Запись через временный файл и os.replace: читатели видят либо старое,
+    либо новое содержимое. Имя временного файла уникально для процесса и потока.
+
+    STORAGE_DURABILITY: none — без fsync (данные в page cache), batched —
+    групповой fsync в фоне, strict — fsync файла и каталога до возврата.
+    """
+    mode = DURABILITY
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if mode == "strict":
+                f.flush()
+                started = time.perf_counter()
+                with span("file.fsync", bytes=len(data)):
+                    os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        volume_set.record_io(path, "write", len(data))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if mode == "strict":
+        # Без fsync каталога после сбоя может не оказаться самой записи о переименовании
+        with span("file.fsync"):
+            fsync_path(os.path.dirname(path) or ".", directory=True)
+        FSYNC_SECONDS.labels(mode="strict").observe(time.perf_counter() - started)
+    elif mode == "batched":
+        group_commit.submit(path, len(data))
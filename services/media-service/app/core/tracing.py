@@ -0,0 +1,272 @@
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "attributes", "start", "end", "_t0", "duration")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, sampled: bool, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.end: float | None = None
+        self.duration = 0.0
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+        self.end = self.start + self.duration
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "service": settings.TRACE_SERVICE_NAME,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+# Текущий спан и все спаны запроса (для Server-Timing); в пул потоков
+# контекст копируется, поэтому спаны из run_in_threadpool тоже попадают в запрос
+_current: ContextVar[Span | None] = ContextVar("trace_current_span", default=None)
+_request_spans: ContextVar[list[Span] | None] = ContextVar("trace_request_spans", default=None)
+
+
+# ---------- Экспорт ----------
+
+class SpanExporter:
+    """Базовый экспортёр: получает пачку завершённых спанов из фонового потока."""
+
+    def export(self, spans: list[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class LogExporter(SpanExporter):
+    def export(self, spans: list[Span]) -> None:
+        for span in spans:
+            logger.info(f"span {json.dumps(span.to_dict(), ensure_ascii=False)}")
+
+
+class FileExporter(SpanExporter):
+    """Пишет спаны в локальный файл JSON Lines — для разбора без коллектора."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or settings.TRACE_FILE
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, spans: list[Span]) -> None:
+        self._file.write("".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in spans))
+        self._file.flush()
+
+    def shutdown(self) -> None:
+        self._file.close()
+
+
+EXPORTERS = {"log": LogExporter, "file": FileExporter}
+
+
+def load_exporter(name: str) -> SpanExporter | None:
+    """'none', 'log', 'file' или путь 'package.module:Class' к своему экспортёру."""
+    if not name or name == "none":
+        return None
+    if name in EXPORTERS:
+        return EXPORTERS[name]()
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Tracer:
+    """
+    Собирает завершённые спаны в очередь и отдаёт их экспортёру пачками
+    из фонового потока, чтобы экспорт не задерживал запросы.
+    """
+
+    def __init__(self):
+        self.exporter: SpanExporter | None = None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        try:
+            self.exporter = load_exporter(settings.TRACE_EXPORTER)
+        except Exception as e:
+            logger.error(f"Не удалось создать экспортёр трасс {settings.TRACE_EXPORTER}: {e}")
+            return
+        if self.exporter is None:
+            return
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        if self._thread is not None and span.sampled:
+            self._queue.put(span)
+
+    def _run(self) -> None:
+        while True:
+            span = self._queue.get()
+            if span is None:
+                break
+            batch = [span]
+            while len(batch) < 512:
+                try:
+                    span = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._queue.put(None)
+                    break
+                batch.append(span)
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.error(f"Ошибка экспорта трасс: {e}")
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+            self._thread = None
+            self.exporter.shutdown()
+
+
+tracer = Tracer()
+
+
+# ---------- Спаны ----------
+
+def start_span(name: str, parent: Span | None = None, **attributes) -> Span:
+    parent = parent if parent is not None else _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    sampled = random.random() < settings.TRACE_SAMPLE_RATE
+    return Span(name, f"{random.getrandbits(128):032x}", None, sampled, attributes)
+
+
+def end_span(span: Span) -> None:
+    span.finish()
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append(span)
+    tracer.submit(span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Фаза обработки запроса: with span("bcrypt.verify"): ..."""
+    current = start_span(name, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        end_span(current)
+
+
+def inject(headers: dict) -> dict:
+    """Добавляет traceparent текущего спана в заголовки исходящего запроса."""
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent
+    return headers
+
+
+def parse_traceparent(value: str | None) -> Span | None:
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    remote = Span("remote", match.group(1), None, int(match.group(3), 16) & 1 == 1, {})
+    remote.span_id = match.group(2)
+    return remote
+
+
+def server_timing(spans: list[Span], total: Span) -> str:
+    """Сводка по фазам: суммарная длительность и число спанов каждого имени."""
+    phases: dict[str, list[float]] = {}
+    for item in spans:
+        if item is not total:
+            phase = phases.setdefault(item.name, [0.0, 0])
+            phase[0] += item.duration
+            phase[1] += 1
+    parts = [f'{name};dur={dur * 1000:.2f};desc="x{count}"' for name, (dur, count) in phases.items()]
+    parts.append(f"total;dur={(time.perf_counter() - total._t0) * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class TracingMiddleware:
+    """
+    Корневой спан на HTTP-запрос: продолжает трассу из входящего traceparent
+    (W3C Trace Context) и добавляет в ответ Server-Timing по фазам.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.TRACE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        root = start_span(f"{scope['method']} {scope['path']}", parent=parent, method=scope["method"])
+        spans: list[Span] = []
+        span_token = _current.set(root)
+        spans_token = _request_spans.set(spans)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                if route is not None:
+                    root.name = f"{scope['method']} {route.path}"
+                root.attributes["status"] = message["status"]
+                if settings.TRACE_SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(spans, root))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(span_token)
+            _request_spans.reset(spans_token)
+            root.finish()
+            tracer.submit(root)
@@ -0,0 +1,74 @@
+import struct
+from dataclasses import dataclass
+
+from prometheus_client import Counter, Gauge
+
+WS_CONNECTIONS = Gauge("media_ws_connections", "Открытые WebSocket-соединения передачи чанков", multiprocess_mode="livesum")
+WS_FRAMES = Counter("media_ws_frames_total", "Кадры WebSocket-канала передачи чанков", ["op", "status"])
+
+# Двоичный кадр: op, flags, длина nonce, seq, chat_id, message_id, file_id, chunk_index,
+# затем nonce (ASCII) и содержимое чанка без base64
+HEADER = struct.Struct("!BBHIqqqI")
+
+OP_PUT = 1   # клиент -> сервер: загрузка чанка
+OP_GET = 2   # клиент -> сервер: запрос чанка (без nonce и содержимого)
+OP_DATA = 3  # сервер -> клиент: чанк в ответ на OP_GET
+
+OP_NAMES = {OP_PUT: "put", OP_GET: "get", OP_DATA: "data"}
+
+# Коды закрытия соединения (4000-4999 — коды приложения)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_PROTOCOL = 1002
+CLOSE_POLICY = 1008
+CLOSE_TOO_BIG = 1009
+
+
+class FrameError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class Frame:
+    op: int
+    seq: int
+    chat_id: int
+    message_id: int
+    file_id: int
+    chunk_index: int
+    nonce: str = ""
+    payload: bytes = b""
+
+    def ref(self) -> dict:
+        """Поля кадра для ответного JSON-сообщения."""
+        return {
+            "seq": self.seq,
+            "chat_id": self.chat_id,
+            "message_id": self.message_id,
+            "file_id": self.file_id,
+            "chunk_index": self.chunk_index,
+        }
+
+
+def decode_frame(data: bytes) -> Frame:
+    if len(data) < HEADER.size:
+        raise FrameError("Кадр короче заголовка")
+    op, _flags, nonce_len, seq, chat_id, message_id, file_id, chunk_index = HEADER.unpack_from(data)
+    if op not in (OP_PUT, OP_GET):
+        raise FrameError(f"Неизвестная операция {op}")
+    body_start = HEADER.size + nonce_len
+    if len(data) < body_start:
+        raise FrameError("Длина nonce больше кадра")
+    try:
+        nonce = data[HEADER.size:body_start].decode("ascii")
+    except UnicodeDecodeError:
+        raise FrameError("nonce должен быть ASCII (base64)")
+    # memoryview не копирует содержимое чанка до записи на диск
+    payload = memoryview(data)[body_start:]
+    return Frame(op, seq, chat_id, message_id, file_id, chunk_index, nonce, payload)
+
+
+def encode_frame(op: int, seq: int, chat_id: int, message_id: int, file_id: int, chunk_index: int,
+                 nonce: str = "", payload: bytes = b"") -> bytes:
+    raw_nonce = nonce.encode("ascii")
+    header = HEADER.pack(op, 0, len(raw_nonce), seq, chat_id, message_id, file_id, chunk_index)
+    return b"".join((header, raw_nonce, payload))
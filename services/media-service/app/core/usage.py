@@ -0,0 +1,377 @@
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from psycopg2.extras import execute_values
+
+from ..db import get_cursor
+from .admission import Rejected
+from .archive import CHUNK_RE
+from .config import settings
+from .volumes import volume_set
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_SECONDS = Histogram(
+    "media_usage_flush_seconds",
+    "Запись накопленных изменений учёта места в БД",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+USAGE_PENDING = Gauge("media_usage_pending_files", "Файлы с незаписанными изменениями учёта места", multiprocess_mode="livesum")
+USAGE_DRIFT = Counter("media_usage_drift_total", "Расхождения учёта с диском, исправленные сверкой", ["field"])
+
+# Ключи pg_advisory_lock: сверка (одна на все воркеры),
+# итоги (запись изменений — shared, пересчёт сверкой — exclusive)
+RECONCILE_LOCK = 0x6D656469_61000002
+TOTALS_LOCK = 0x6D656469_61000003
+
+FIELDS = ("bytes", "chunks", "files")
+
+# user_id для файлов, найденных сверкой без записи в учёте
+UNKNOWN_USER = 0
+
+
+def _add(target: dict, key, delta) -> None:
+    current = target.get(key)
+    target[key] = delta if current is None else tuple(a + b for a, b in zip(current, delta))
+
+
+def scan_chat(chat_id: int, grace: float) -> tuple[dict[int, tuple[int, int, int]], set[int]]:
+    """
+    Фактическое место файлов чата на всех томах: {file_id: (bytes, chunks, files)}
+    и file_id, которые менялись последние grace секунд (идёт загрузка — не сверяются).
+    """
+    usage: dict[int, tuple[int, int, int]] = {}
+    active: set[int] = set()
+    seen: set[tuple[int, int]] = set()
+    now = time.time()
+    for volume in volume_set.volumes:
+        chat_dir = os.path.join(volume.path, "chats", f"chat_{chat_id}")
+        try:
+            file_names = os.listdir(chat_dir)
+        except FileNotFoundError:
+            continue
+        for file_name in file_names:
+            if not file_name.isdigit():
+                continue
+            file_id = int(file_name)
+            try:
+                entries = list(os.scandir(os.path.join(chat_dir, file_name)))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            total = usage.get(file_id, (0, 0, 0))
+            for entry in entries:
+                match = CHUNK_RE.match(entry.name)
+                if match is None or (file_id, int(match.group(1))) in seen:
+                    continue
+                seen.add((file_id, int(match.group(1))))
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if now - st.st_mtime < grace:
+                    active.add(file_id)
+                total = (total[0] + st.st_size, total[1] + 1, total[2])
+            usage[file_id] = total
+    for file_id, total in list(usage.items()):
+        # Во время перебалансировки копия metadata.json может лежать на двух томах — учитывается одна
+        meta_path = volume_set.find_metadata(chat_id, file_id)
+        try:
+            st = os.stat(meta_path) if meta_path is not None else None
+        except FileNotFoundError:
+            st = None
+        if st is not None:
+            if now - st.st_mtime < grace:
+                active.add(file_id)
+            usage[file_id] = (total[0] + st.st_size, total[1], 1)
+    return usage, active
+
+
+class UsageLedger:
+    """
+    Учёт места по чатам и пользователям без обхода диска. Загрузки и удаления
+    сообщают изменения (байты, чанки, файлы) в record; фоновый поток раз в
+    USAGE_FLUSH_INTERVAL записывает накопленное одной транзакцией:
+    media_usage_files — вклад пользователя в файл, media_usage — итоги чата и
+    пользователя, поэтому запрос итогов — чтение одной строки по ключу.
+
+    Изменения, не записанные до падения воркера, и гонки параллельных загрузок
+    одного чанка исправляет сверка с диском (reconcile) раз в USAGE_RECONCILE_INTERVAL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (chat_id, file_id, user_id) -> (bytes, chunks, files)
+        self._pending: dict[tuple[int, int, int], tuple[int, int, int]] = {}
+        # (scope, id) -> (итоги из БД, время чтения) для проверки квот
+        self._totals: dict[tuple[str, int], tuple[tuple[int, int, int], float]] = {}
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    # ---------- Схема и фоновые потоки ----------
+
+    @staticmethod
+    def check_schema() -> None:
+        """Таблицы создаёт миграция (python -m app.migrate); воркер только проверяет, что они есть."""
+        with get_cursor() as cur:
+            cur.execute("SELECT to_regclass('media_usage') AS usage, to_regclass('media_usage_files') AS files")
+            row = cur.fetchone()
+        if row["usage"] is None or row["files"] is None:
+            raise RuntimeError("usage tables are missing, run python -m app.migrate")
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads.append(threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True))
+        if settings.USAGE_RECONCILE_INTERVAL > 0:
+            self._threads.append(threading.Thread(target=self._reconcile_loop, name="usage-reconcile", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Останавливает потоки, дописав накопленные изменения."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=10.0)
+        self._threads = []
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(settings.USAGE_FLUSH_INTERVAL):
+            self.flush()
+
+    def _reconcile_loop(self) -> None:
+        while not self._stop.wait(settings.USAGE_RECONCILE_INTERVAL):
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Usage reconcile failed: {e}", exc_info=True)
+
+    # ---------- Изменения ----------
+
+    def record(self, chat_id: int, file_id: int, user_id: int, bytes: int = 0, chunks: int = 0, files: int = 0) -> None:
+        if not (bytes or chunks or files):
+            return
+        with self._lock:
+            _add(self._pending, (chat_id, file_id, user_id), (bytes, chunks, files))
+            USAGE_PENDING.set(len(self._pending))
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            USAGE_PENDING.set(0)
+        if not pending:
+            return
+        started = time.perf_counter()
+        chats: dict[int, tuple[int, int, int]] = {}
+        users: dict[int, tuple[int, int, int]] = {}
+        for (chat_id, _, user_id), delta in pending.items():
+            _add(chats, chat_id, delta)
+            _add(users, user_id, delta)
+        totals = [("chat", k, *v) for k, v in chats.items()] + [("user", k, *v) for k, v in users.items()]
+        try:
+            with get_cursor(commit=True) as cur:
+                cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (TOTALS_LOCK,))
+                execute_values(cur, """
+                    INSERT INTO media_usage_files (chat_id, file_id, user_id, bytes, chunks, files) VALUES %s
+                    ON CONFLICT (chat_id, file_id, user_id) DO UPDATE SET
+                        bytes = media_usage_files.bytes + EXCLUDED.bytes,
+                        chunks = media_usage_files.chunks + EXCLUDED.chunks,
+                        files = media_usage_files.files + EXCLUDED.files
+                """, [(*key, *delta) for key, delta in sorted(pending.items())])
+                execute_values(cur, """
+                    INSERT INTO media_usage (scope, id, bytes, chunks, files) VALUES %s
+                    ON CONFLICT (scope, id) DO UPDATE SET
+                        bytes = media_usage.bytes + EXCLUDED.bytes,
+                        chunks = media_usage.chunks + EXCLUDED.chunks,
+                        files = media_usage.files + EXCLUDED.files,
+                        updated_at = now()
+                """, sorted(totals))
+        except Exception as e:
+            # Изменения возвращаются в очередь и уйдут следующей пачкой
+            logger.warning(f"Usage flush failed, {len(pending)} files postponed: {e}")
+            with self._lock:
+                for key, delta in pending.items():
+                    _add(self._pending, key, delta)
+                USAGE_PENDING.set(len(self._pending))
+            return
+        USAGE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    def forget_file(self, chat_id: int, file_id: int) -> None:
+        """Файл удалён: его вклад вычитается из итогов чата и всех загружавших пользователей."""
+        self.flush()
+        with get_cursor(commit=True) as cur:
+            cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (TOTALS_LOCK,))
+            cur.execute(
+                "DELETE FROM media_usage_files WHERE chat_id = %s AND file_id = %s "
+                "RETURNING user_id, bytes, chunks, files",
+                (chat_id, file_id),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return
+            removed = [("user", row["user_id"], -row["bytes"], -row["chunks"], -row["files"]) for row in rows]
+            removed.append((
+                "chat", chat_id,
+                -sum(row["bytes"] for row in rows), -sum(row["chunks"] for row in rows), -sum(row["files"] for row in rows),
+            ))
+            execute_values(cur, """
+                UPDATE media_usage SET
+                    bytes = media_usage.bytes + v.bytes,
+                    chunks = media_usage.chunks + v.chunks,
+                    files = media_usage.files + v.files,
+                    updated_at = now()
+                FROM (VALUES %s) AS v (scope, id, bytes, chunks, files)
+                WHERE media_usage.scope = v.scope AND media_usage.id = v.id
+            """, sorted(removed))
+
+    # ---------- Итоги и квоты ----------
+
+    @staticmethod
+    def totals(scope: str, id: int) -> dict | None:
+        with get_cursor() as cur:
+            cur.execute(
+                "SELECT bytes, chunks, files, updated_at, reconciled_at FROM media_usage WHERE scope = %s AND id = %s",
+                (scope, id),
+            )
+            return cur.fetchone()
+
+    def _used(self, scope: str, id: int) -> int:
+        """Байты из БД (кэш на USAGE_CACHE_SECONDS) плюс ещё не записанные изменения этого воркера."""
+        now = time.monotonic()
+        cached = self._totals.get((scope, id))
+        if cached is None or now - cached[1] > settings.USAGE_CACHE_SECONDS:
+            row = self.totals(scope, id)
+            cached = ((row["bytes"], row["chunks"], row["files"]) if row else (0, 0, 0), now)
+            self._totals[(scope, id)] = cached
+        with self._lock:
+            position = 0 if scope == "chat" else 2
+            pending = sum(delta[0] for key, delta in self._pending.items() if key[position] == id)
+        return cached[0][0] + pending
+
+    @property
+    def quotas_enabled(self) -> bool:
+        return settings.USAGE_QUOTA_USER_BYTES > 0 or settings.USAGE_QUOTA_CHAT_BYTES > 0
+
+    def check_quota(self, chat_id: int, user_id: int, size: int) -> None:
+        """Rejected(507), если загрузка size байт превысит USAGE_QUOTA_USER_BYTES или USAGE_QUOTA_CHAT_BYTES."""
+        if settings.USAGE_QUOTA_USER_BYTES > 0 and self._used("user", user_id) + size > settings.USAGE_QUOTA_USER_BYTES:
+            raise Rejected(507, "quota_user", "Превышена квота хранилища пользователя")
+        if settings.USAGE_QUOTA_CHAT_BYTES > 0 and self._used("chat", chat_id) + size > settings.USAGE_QUOTA_CHAT_BYTES:
+            raise Rejected(507, "quota_chat", "Превышена квота хранилища чата")
+
+    # ---------- Сверка с диском ----------
+
+    def reconcile(self, chat_ids: list[int] | None = None) -> dict | None:
+        """
+        Сравнивает учёт с файлами на томах и исправляет расхождения: строки
+        удалённых файлов удаляются, разница по существующим относится на
+        крупнейший вклад (или на UNKNOWN_USER), затем итоги затронутых чатов и
+        пользователей пересчитываются из media_usage_files. Файлы, менявшиеся
+        последние USAGE_RECONCILE_GRACE секунд, не трогаются. None — сверку
+        уже выполняет другой процесс.
+        """
+        self.flush()
+        with get_cursor(commit=True) as lock_cur:
+            # Блокировка сессии держится до конца сверки, пока открыто это соединение
+            lock_cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (RECONCILE_LOCK,))
+            if not lock_cur.fetchone()["locked"]:
+                return None
+            try:
+                return self._reconcile(chat_ids)
+            finally:
+                lock_cur.execute("SELECT pg_advisory_unlock(%s)", (RECONCILE_LOCK,))
+
+    def _reconcile(self, chat_ids: list[int] | None) -> dict:
+        if chat_ids is None:
+            found = set()
+            for volume in volume_set.volumes:
+                try:
+                    names = os.listdir(os.path.join(volume.path, "chats"))
+                except FileNotFoundError:
+                    continue
+                found.update(int(name[5:]) for name in names if name.startswith("chat_") and name[5:].isdigit())
+            with get_cursor() as cur:
+                cur.execute("SELECT DISTINCT chat_id FROM media_usage_files")
+                found.update(row["chat_id"] for row in cur.fetchall())
+            chat_ids = sorted(found)
+
+        stats = {"chats": 0, "files": 0, "fixed": 0}
+        for chat_id in chat_ids:
+            stats["fixed"] += self._reconcile_chat(chat_id, stats)
+            stats["chats"] += 1
+        logger.info(f"Usage reconcile finished: {stats}")
+        return stats
+
+    def _reconcile_chat(self, chat_id: int, stats: dict) -> int:
+        fixed = 0
+        with get_cursor(commit=True) as cur:
+            # Запись изменений воркерами ждёт конца транзакции: диск и учёт сравниваются в одной точке.
+            # Изменения, ещё не записанные воркерами, относятся к файлам в окне USAGE_RECONCILE_GRACE
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (TOTALS_LOCK,))
+            disk, active = scan_chat(chat_id, settings.USAGE_RECONCILE_GRACE)
+            cur.execute(
+                "SELECT file_id, user_id, bytes, chunks, files FROM media_usage_files WHERE chat_id = %s",
+                (chat_id,),
+            )
+            rows: dict[int, list[dict]] = {}
+            for row in cur.fetchall():
+                rows.setdefault(row["file_id"], []).append(row)
+            users = {row["user_id"] for file_rows in rows.values() for row in file_rows}
+
+            for file_id in sorted(set(disk) | set(rows)):
+                if file_id in active:
+                    continue
+                stats["files"] += 1
+                actual = disk.get(file_id, (0, 0, 0))
+                file_rows = rows.get(file_id, [])
+                recorded = tuple(sum(row[field] for row in file_rows) for field in FIELDS)
+                if actual == recorded:
+                    continue
+                fixed += 1
+                for field, a, r in zip(FIELDS, actual, recorded):
+                    if a != r:
+                        USAGE_DRIFT.labels(field=field).inc()
+                logger.info(f"Usage drift in chat {chat_id} file {file_id}: recorded {recorded}, on disk {actual}")
+                if actual == (0, 0, 0):
+                    cur.execute("DELETE FROM media_usage_files WHERE chat_id = %s AND file_id = %s", (chat_id, file_id))
+                    continue
+                owner = max(file_rows, key=lambda row: row["bytes"])["user_id"] if file_rows else UNKNOWN_USER
+                users.add(owner)
+                diff = [a - r for a, r in zip(actual, recorded)]
+                cur.execute("""
+                    INSERT INTO media_usage_files (chat_id, file_id, user_id, bytes, chunks, files)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (chat_id, file_id, user_id) DO UPDATE SET
+                        bytes = media_usage_files.bytes + EXCLUDED.bytes,
+                        chunks = media_usage_files.chunks + EXCLUDED.chunks,
+                        files = media_usage_files.files + EXCLUDED.files
+                """, (chat_id, file_id, owner, *diff))
+
+            # Итоги пересчитываются из построчного учёта
+            cur.execute("""
+                INSERT INTO media_usage (scope, id, bytes, chunks, files, reconciled_at)
+                SELECT 'chat', %(chat_id)s, COALESCE(SUM(bytes), 0), COALESCE(SUM(chunks), 0), COALESCE(SUM(files), 0), now()
+                FROM media_usage_files WHERE chat_id = %(chat_id)s
+                ON CONFLICT (scope, id) DO UPDATE SET
+                    bytes = EXCLUDED.bytes, chunks = EXCLUDED.chunks, files = EXCLUDED.files,
+                    updated_at = now(), reconciled_at = now()
+            """, {"chat_id": chat_id})
+            if users:
+                cur.execute("""
+                    INSERT INTO media_usage (scope, id, bytes, chunks, files, reconciled_at)
+                    SELECT 'user', u.id, COALESCE(SUM(f.bytes), 0), COALESCE(SUM(f.chunks), 0), COALESCE(SUM(f.files), 0), now()
+                    FROM unnest(%s::bigint[]) AS u (id)
+                    LEFT JOIN media_usage_files f ON f.user_id = u.id
+                    GROUP BY u.id
+                    ON CONFLICT (scope, id) DO UPDATE SET
+                        bytes = EXCLUDED.bytes, chunks = EXCLUDED.chunks, files = EXCLUDED.files,
+                        updated_at = now(), reconciled_at = now()
+                """, (sorted(users),))
+        return fixed
+
+
+usage_ledger = UsageLedger()
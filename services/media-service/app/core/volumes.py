@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import math
+import os
+import shutil
+import time
+
+from prometheus_client import Counter, Gauge
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+VOLUME_FREE_BYTES = Gauge(
+    "media_storage_volume_free_bytes", "Свободное место тома хранилища", ["volume"], multiprocess_mode="max"
+)
+VOLUME_TOTAL_BYTES = Gauge(
+    "media_storage_volume_total_bytes", "Размер тома хранилища", ["volume"], multiprocess_mode="max"
+)
+VOLUME_IO_BYTES = Counter("media_storage_volume_bytes_total", "Байт прочитано и записано по томам", ["volume", "op"])
+
+
+class Volume:
+    def __init__(self, path: str, weight: float):
+        self.path = os.path.normpath(path)
+        self.weight = weight
+        # Идентичность тома для хеширования — путь: порядок в STORAGE_ROOTS не влияет на размещение
+        self._seed = self.path.encode("utf-8")
+        self.low = False
+        self.free = 0
+        self.total = 0
+
+    def score(self, key: bytes) -> float:
+        """Вес rendezvous-хеширования: у тома с большим весом пропорционально больше ключей."""
+        digest = hashlib.blake2b(self._seed + b"\0" + key, digest_size=8).digest()
+        uniform = (int.from_bytes(digest, "big") + 1) / 2.0 ** 64
+        return -self.weight / math.log(uniform)
+
+    def refresh_usage(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        usage = shutil.disk_usage(self.path)
+        self.free, self.total = usage.free, usage.total
+        low = usage.free < settings.DISK_MIN_FREE_BYTES or usage.free < usage.total * settings.DISK_MIN_FREE_RATIO
+        if low and not self.low:
+            logger.error(f"Free disk space on {self.path} below watermark: {usage.free} bytes left")
+        self.low = low
+        VOLUME_FREE_BYTES.labels(volume=self.path).set(usage.free)
+        VOLUME_TOTAL_BYTES.labels(volume=self.path).set(usage.total)
+
+    def file_dir(self, chat_id: int, file_id: int) -> str:
+        return os.path.join(self.path, "chats", f"chat_{chat_id}", f"{file_id}")
+
+
+def parse_roots(value: str) -> list[tuple[str, float]]:
+    """STORAGE_ROOTS: "path[:weight],..."; пусто — один том STORAGE_ROOT."""
+    roots = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, weight = item.rpartition(":")
+        try:
+            roots.append((path, float(weight)) if path else (item, 1.0))
+        except ValueError:
+            roots.append((item, 1.0))
+    return roots or [(settings.STORAGE_ROOT, 1.0)]
+
+
+class VolumeSet:
+    """
+    Тома хранилища (STORAGE_ROOTS). Чанки раскладываются по томам rendezvous-хешированием
+    ключа (chat_id, file_id, chunk_index) — чанки одного файла читаются с разных дисков.
+    metadata.json и его замок живут на «домашнем» томе файла (ключ chat_id, file_id).
+
+    При добавлении тома переезжает только доля ключей, пропорциональная его весу.
+    Пока перебалансировка (python -m app.rebalance) не закончилась, данные ищутся
+    сначала на расчётном томе, затем на остальных.
+    """
+
+    def __init__(self, roots: list[tuple[str, float]]):
+        self.volumes = [Volume(path, weight) for path, weight in roots]
+        self._checked_at = 0.0
+
+    def ranked(self, key: str) -> list[Volume]:
+        raw = key.encode("utf-8")
+        if len(self.volumes) == 1:
+            return self.volumes
+        return sorted(self.volumes, key=lambda volume: volume.score(raw), reverse=True)
+
+    # ---------- Размещение ----------
+
+    def home(self, chat_id: int, file_id: int) -> Volume:
+        return self.ranked(f"{chat_id}/{file_id}")[0]
+
+    def chunk_target(self, chat_id: int, file_id: int, index: int) -> Volume:
+        """Том для записи чанка: первый по рангу, на котором есть место."""
+        ranked = self.ranked(f"{chat_id}/{file_id}/{index}")
+        self.refresh_usage()
+        return next((volume for volume in ranked if not volume.low), ranked[0])
+
+    def metadata_path(self, chat_id: int, file_id: int) -> str:
+        return os.path.join(self.home(chat_id, file_id).file_dir(chat_id, file_id), "metadata.json")
+
+    def chunk_write_path(self, chat_id: int, file_id: int, index: int) -> str:
+        file_dir = self.chunk_target(chat_id, file_id, index).file_dir(chat_id, file_id)
+        os.makedirs(file_dir, exist_ok=True)
+        return os.path.join(file_dir, f"{index}.chenc")
+
+    # ---------- Поиск ----------
+
+    def _find(self, ranked: list[Volume], chat_id: int, file_id: int, name: str) -> str | None:
+        for volume in ranked:
+            path = os.path.join(volume.file_dir(chat_id, file_id), name)
+            if os.path.exists(path):
+                return path
+        if len(ranked) > 1:
+            # Перебалансировка могла перенести файл между проверками: расчётный том ещё раз
+            path = os.path.join(ranked[0].file_dir(chat_id, file_id), name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def find_metadata(self, chat_id: int, file_id: int) -> str | None:
+        return self._find(self.ranked(f"{chat_id}/{file_id}"), chat_id, file_id, "metadata.json")
+
+    def find_chunk(self, chat_id: int, file_id: int, index: int) -> str | None:
+        return self._find(self.ranked(f"{chat_id}/{file_id}/{index}"), chat_id, file_id, f"{index}.chenc")
+
+    def file_dirs(self, chat_id: int, file_id: int) -> list[str]:
+        """Каталоги файла на всех томах, где они есть."""
+        return [d for d in (v.file_dir(chat_id, file_id) for v in self.volumes) if os.path.isdir(d)]
+
+    def resolve(self, file_path: str) -> str | None:
+        """
+        Путь из запроса /file ("chats/..." или с префиксом корня "storage/chats/...")
+        -> путь обычного файла внутри одного из томов (или STORAGE_ROOT) либо None.
+        Абсолютные пути и ".." отклоняются (ValueError); сравнение realpath с корнем
+        отсекает и символические ссылки, ведущие за пределы тома.
+        """
+        if "\0" in file_path or file_path.startswith(("/", "\\")):
+            raise ValueError("absolute path")
+        parts = [part for part in file_path.replace("\\", "/").split("/") if part not in ("", ".")]
+        if ".." in parts:
+            raise ValueError("parent directory reference")
+        roots = [volume.path for volume in self.volumes]
+        if os.path.normpath(settings.STORAGE_ROOT) not in roots:
+            roots.append(os.path.normpath(settings.STORAGE_ROOT))
+        for root in roots:
+            prefix = [part for part in root.split(os.sep) if part not in ("", ".")]
+            if parts[:len(prefix)] == prefix:
+                parts = parts[len(prefix):]
+                break
+        if not parts:
+            return None
+        for root in roots:
+            real_root = os.path.realpath(root)
+            candidate = os.path.realpath(os.path.join(real_root, *parts))
+            if os.path.commonpath([real_root, candidate]) == real_root and os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def volume_of(self, path: str) -> Volume | None:
+        path = os.path.normpath(path)
+        for volume in self.volumes:
+            if path == volume.path or path.startswith(volume.path + os.sep):
+                return volume
+        return None
+
+    # ---------- Статистика ----------
+
+    def record_io(self, path: str, op: str, size: int) -> None:
+        volume = self.volume_of(path)
+        if volume is not None:
+            VOLUME_IO_BYTES.labels(volume=volume.path, op=op).inc(size)
+
+    def refresh_usage(self, force: bool = False) -> None:
+        """Свободное место томов; обновляется не чаще раза в секунду."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < 1.0:
+            return
+        self._checked_at = now
+        for volume in self.volumes:
+            try:
+                volume.refresh_usage()
+            except OSError as e:
+                logger.warning(f"Disk usage check failed for {volume.path}: {e}")
+
+    def all_low(self) -> bool:
+        self.refresh_usage()
+        return all(volume.low for volume in self.volumes)
+
+
+volume_set = VolumeSet(parse_roots(settings.STORAGE_ROOTS))
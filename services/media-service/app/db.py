@@ -2,10 +2,20 @@ from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from .core.config import settings
+from .core.tracing import span
+
+
+class TracedCursor(RealDictCursor):
+    """RealDictCursor со спаном db.query на каждый execute."""
+
+    def execute(self, query, vars=None):
+        with span("db.query", statement=str(query).split(None, 1)[0].upper() if query else ""):
+            return super().execute(query, vars)
 
 @contextmanager
 def get_conn():
-    conn = psycopg2.connect(settings.DATABASE_URL)
+    with span("db.connect"):
+        conn = psycopg2.connect(settings.DATABASE_URL)
     try:
         yield conn
     finally:
@@ -14,7 +24,7 @@ def get_conn():
 @contextmanager
 def get_cursor(commit: bool = False):
     with get_conn() as conn:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(cursor_factory=TracedCursor)
         try:
             yield cur
             if commit:
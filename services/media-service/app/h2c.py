@@ -0,0 +1,116 @@
+"""
+Воркер gunicorn с hypercorn вместо uvicorn (HTTP_PROTOCOL=h2c): тот же порт
+принимает HTTP/1.1 и HTTP/2 без TLS (prior knowledge и Upgrade: h2c), так что
+сотни запросов file_chunk идут параллельными потоками одного соединения.
+Перезапуск по WORKER_MAX_REQUESTS и WORKER_MAX_RSS_MB работает так же, как у
+воркера uvicorn.
+"""
+import asyncio
+import logging
+import os
+
+import h2.settings
+from gunicorn.workers.base import Worker
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from hypercorn.protocol.h2 import H2Protocol
+
+from .core.config import settings
+from .serve import rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# Окно HTTP/2 по умолчанию из RFC 9113
+DEFAULT_WINDOW = 65_535
+
+
+def tune_flow_control(stream_window: int, connection_window: int) -> None:
+    """
+    hypercorn не настраивает окна управления потоком: объявляем своё
+    INITIAL_WINDOW_SIZE для потоков и расширяем окно соединения сразу после
+    преамбулы. Окна определяют, сколько тела загрузки клиент шлёт без
+    подтверждений; для ответов действует окно, объявленное клиентом.
+    """
+    if getattr(H2Protocol, "_windows_tuned", False):
+        return
+    original_init = H2Protocol.__init__
+    original_initiate = H2Protocol.initiate
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        local = self.connection.local_settings
+        self.connection.local_settings = h2.settings.Settings(
+            client=False,
+            initial_values={
+                h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: local.max_concurrent_streams,
+                h2.settings.SettingCodes.MAX_HEADER_LIST_SIZE: local.max_header_list_size,
+                h2.settings.SettingCodes.ENABLE_CONNECT_PROTOCOL: local.enable_connect_protocol,
+                h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: stream_window,
+            },
+        )
+
+    async def initiate(self, *args, **kwargs):
+        await original_initiate(self, *args, **kwargs)
+        if connection_window > DEFAULT_WINDOW:
+            self.connection.increment_flow_control_window(connection_window - DEFAULT_WINDOW)
+            await self._flush()
+
+    H2Protocol.__init__ = __init__
+    H2Protocol.initiate = initiate
+    H2Protocol._windows_tuned = True
+
+
+class H2cWorker(Worker):
+    """Воркер gunicorn: hypercorn обслуживает сокеты, полученные от мастера."""
+
+    def hypercorn_config(self) -> Config:
+        config = Config()
+        config.bind = [f"fd://{sock.fileno()}" for sock in self.sockets]
+        config.h2_max_concurrent_streams = settings.H2_MAX_CONCURRENT_STREAMS
+        config.h2_max_inbound_frame_size = settings.H2_MAX_INBOUND_FRAME_SIZE
+        config.keep_alive_timeout = settings.H2_KEEP_ALIVE_TIMEOUT
+        config.websocket_max_message_size = settings.WS_MAX_FRAME_BYTES
+        config.graceful_timeout = self.cfg.graceful_timeout
+        config.accesslog = "-"
+        config.errorlog = "-"
+        return config
+
+    def run(self) -> None:
+        tune_flow_control(settings.H2_STREAM_WINDOW, settings.H2_CONNECTION_WINDOW)
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        app = self.wsgi
+        shutdown = asyncio.Event()
+        requests = 0
+
+        async def counted(scope, receive, send):
+            nonlocal requests
+            if scope["type"] == "http":
+                requests += 1
+                if self.max_requests and requests >= self.max_requests and self.alive:
+                    logger.info(f"Worker {os.getpid()} reached {requests} requests, restarting")
+                    self.alive = False
+            await app(scope, receive, send)
+
+        async def supervise():
+            # Пульс для мастера, проверка памяти и сигналов (SIGTERM сбрасывает self.alive)
+            limit = settings.WORKER_MAX_RSS_MB * 1024 * 1024
+            next_rss_check = 0.0
+            loop = asyncio.get_running_loop()
+            while self.alive:
+                self.notify()
+                if limit and loop.time() >= next_rss_check:
+                    next_rss_check = loop.time() + settings.WORKER_RSS_CHECK_INTERVAL
+                    if rss_bytes() > limit:
+                        logger.warning(f"Worker {os.getpid()} RSS exceeded {settings.WORKER_MAX_RSS_MB} MB, restarting")
+                        self.alive = False
+                        break
+                await asyncio.sleep(1.0)
+            shutdown.set()
+
+        supervisor = asyncio.create_task(supervise())
+        try:
+            await serve(counted, self.hypercorn_config(), shutdown_trigger=shutdown.wait, mode="asgi")
+        finally:
+            supervisor.cancel()
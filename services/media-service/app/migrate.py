@@ -0,0 +1,78 @@
+"""
+Явный шаг миграции схемы БД media-service.
+
+Запускается отдельно от воркеров (`python -m app.migrate`), как
+`app.db.migrate` в auth-service и profiles-service: старт воркеров не ждёт DDL
+и не гоняется за него. Миграции применяются по порядку и отмечаются в общей
+таблице schema_migrations под тем же advisory-локом.
+"""
+import logging
+import sys
+import time
+
+from .db import get_cursor
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех сервисов ключ advisory-лока миграций
+MIGRATIONS_LOCK_ID = 72_001
+
+USAGE_TABLES = """
+CREATE TABLE IF NOT EXISTS media_usage_files (
+    chat_id BIGINT NOT NULL,
+    file_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    chunks BIGINT NOT NULL DEFAULT 0,
+    files BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, file_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS media_usage_files_user_idx ON media_usage_files (user_id);
+CREATE TABLE IF NOT EXISTS media_usage (
+    scope TEXT NOT NULL,
+    id BIGINT NOT NULL,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    chunks BIGINT NOT NULL DEFAULT 0,
+    files BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    reconciled_at TIMESTAMPTZ,
+    PRIMARY KEY (scope, id)
+);
+"""
+
+# Порядок важен: новые миграции добавляются только в конец
+MIGRATIONS = [
+    ("media_0001_usage", USAGE_TABLES),
+]
+
+
+def run_migrations() -> list[str]:
+    applied: list[str] = []
+    with get_cursor(commit=True) as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " name VARCHAR(255) PRIMARY KEY,"
+            " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        )
+        cur.execute("SELECT name FROM schema_migrations")
+        done = {row["name"] for row in cur.fetchall()}
+        for name, migration in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info(f"Применяется миграция {name}")
+            cur.execute(migration)
+            cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            applied.append(name)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    started = time.perf_counter()
+    try:
+        applied = run_migrations()
+    except Exception as e:
+        logger.error(f"Ошибка миграции базы данных: {e}")
+        sys.exit(1)
+    logger.info(f"Миграции применены: {applied or 'нет новых'} за {time.perf_counter() - started:.2f}с")
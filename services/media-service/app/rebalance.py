@@ -0,0 +1,177 @@
+"""
+Перебалансировка томов хранилища: python -m app.rebalance
+
+Запускается после изменения STORAGE_ROOTS (добавлен том или изменён вес) на
+работающем сервисе. Чанки, чей расчётный том изменился, копируются на новый том
+(атомарно, с fsync) и только потом удаляются со старого; metadata.json переезжает
+на домашний том файла под тем же замком metadata.lock, что и загрузки. Пока
+перенос идёт, сервис находит данные на любом томе.
+
+--dry-run — только посчитать, что и куда переедет; --stats — свободное место томов.
+"""
+import argparse
+import logging
+import os
+import re
+import time
+
+from .core.config import settings
+from .core.storage import atomic_write, file_lock, fsync_path
+from .core.volumes import Volume, volume_set
+
+CHUNK_RE = re.compile(r"^(\d+)\.chenc$")
+
+
+class Throttle:
+    """Ограничивает скорость переноса, чтобы не отнимать полосу у чтения клиентов."""
+
+    def __init__(self, bytes_per_sec: int):
+        self.bytes_per_sec = bytes_per_sec
+        self.started = time.monotonic()
+        self.bytes = 0
+
+    def consume(self, size: int) -> None:
+        self.bytes += size
+        if self.bytes_per_sec <= 0:
+            return
+        ahead = self.bytes / self.bytes_per_sec - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class Rebalancer:
+    def __init__(self, dry_run: bool, bytes_per_sec: int):
+        self.dry_run = dry_run
+        self.throttle = Throttle(bytes_per_sec)
+        # (с тома, на том) -> [файлов, байт]
+        self.moves: dict[tuple[str, str], list[int]] = {}
+
+    def _record(self, source: Volume, target: Volume, size: int) -> None:
+        entry = self.moves.setdefault((source.path, target.path), [0, 0])
+        entry[0] += 1
+        entry[1] += size
+
+    def _move_chunk(self, source: Volume, chat_id: int, file_id: int, name: str, index: int) -> None:
+        target = volume_set.chunk_target(chat_id, file_id, index)
+        if target is source:
+            return
+        source_path = os.path.join(source.file_dir(chat_id, file_id), name)
+        size = os.path.getsize(source_path)
+        self._record(source, target, size)
+        if self.dry_run:
+            return
+        target_path = volume_set.chunk_write_path(chat_id, file_id, index)
+        # Чанки неизменяемы: копия на целевом томе уже равна исходной
+        if not os.path.exists(target_path):
+            with open(source_path, "rb") as f:
+                data = f.read()
+            atomic_write(target_path, data)
+            # Источник удаляется только после того, как копия на диске при любом STORAGE_DURABILITY
+            fsync_path(target_path)
+            fsync_path(os.path.dirname(target_path), directory=True)
+            self.throttle.consume(size)
+        os.remove(source_path)
+
+    def _move_metadata(self, source: Volume, chat_id: int, file_id: int) -> None:
+        home = volume_set.home(chat_id, file_id)
+        if home is source:
+            return
+        source_path = os.path.join(source.file_dir(chat_id, file_id), "metadata.json")
+        self._record(source, home, os.path.getsize(source_path))
+        if self.dry_run:
+            return
+        home_dir = home.file_dir(chat_id, file_id)
+        os.makedirs(home_dir, exist_ok=True)
+        home_path = os.path.join(home_dir, "metadata.json")
+        with file_lock(os.path.join(home_dir, "metadata.lock")):
+            if not os.path.exists(source_path):
+                # Загрузка чанка уже перенесла метаданные
+                return
+            if not os.path.exists(home_path):
+                with open(source_path, "rb") as f:
+                    data = f.read()
+                atomic_write(home_path, data)
+                fsync_path(home_path)
+                fsync_path(home_dir, directory=True)
+            # Если на домашнем томе уже есть metadata.json, он новее (записан после смены томов)
+            os.remove(source_path)
+
+    def rebalance_file(self, source: Volume, chat_id: int, file_id: int) -> None:
+        file_dir = source.file_dir(chat_id, file_id)
+        for name in sorted(os.listdir(file_dir)):
+            try:
+                match = CHUNK_RE.match(name)
+                if match:
+                    self._move_chunk(source, chat_id, file_id, name, int(match.group(1)))
+                elif name == "metadata.json":
+                    self._move_metadata(source, chat_id, file_id)
+            except FileNotFoundError:
+                # Файл удалён или перенесён параллельно
+                continue
+        if not self.dry_run and volume_set.home(chat_id, file_id) is not source:
+            leftovers = set(os.listdir(file_dir)) - {"metadata.lock"}
+            if not leftovers:
+                try:
+                    os.remove(os.path.join(file_dir, "metadata.lock"))
+                except FileNotFoundError:
+                    pass
+                try:
+                    os.rmdir(file_dir)
+                except OSError:
+                    pass
+
+    def run(self) -> None:
+        for volume in volume_set.volumes:
+            chats_dir = os.path.join(volume.path, "chats")
+            if not os.path.isdir(chats_dir):
+                continue
+            for chat_name in sorted(os.listdir(chats_dir)):
+                if not chat_name.startswith("chat_") or not chat_name[5:].isdigit():
+                    continue
+                chat_id = int(chat_name[5:])
+                chat_dir = os.path.join(chats_dir, chat_name)
+                for file_name in sorted(os.listdir(chat_dir)):
+                    if file_name.isdigit() and os.path.isdir(os.path.join(chat_dir, file_name)):
+                        self.rebalance_file(volume, chat_id, int(file_name))
+                if not self.dry_run:
+                    try:
+                        os.rmdir(chat_dir)
+                    except OSError:
+                        pass
+
+
+def print_stats() -> None:
+    volume_set.refresh_usage(force=True)
+    for volume in volume_set.volumes:
+        share = volume.weight / sum(v.weight for v in volume_set.volumes)
+        print(
+            f"{volume.path}: weight {volume.weight:g} ({share:.0%}), "
+            f"free {volume.free / 2 ** 30:.1f} GiB of {volume.total / 2 ** 30:.1f} GiB"
+            f"{' (below watermark)' if volume.low else ''}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Перенос чанков после изменения STORAGE_ROOTS")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать переносы")
+    parser.add_argument("--stats", action="store_true", help="показать свободное место томов и выйти")
+    parser.add_argument("--max-bytes-per-sec", type=int, default=settings.REBALANCE_MAX_BYTES_PER_SEC)
+    args = parser.parse_args()
+
+    print_stats()
+    if args.stats:
+        return
+    rebalancer = Rebalancer(args.dry_run, args.max_bytes_per_sec)
+    started = time.monotonic()
+    rebalancer.run()
+    elapsed = time.monotonic() - started
+    for (source, target), (files, size) in sorted(rebalancer.moves.items()):
+        print(f"{source} -> {target}: {files} files, {size / 2 ** 20:.1f} MiB")
+    total = sum(size for _, size in rebalancer.moves.values())
+    action = "would move" if args.dry_run else "moved"
+    print(f"{action} {total / 2 ** 20:.1f} MiB in {elapsed:.1f}s ({total / 2 ** 20 / max(elapsed, 1e-3):.1f} MiB/s)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    main()
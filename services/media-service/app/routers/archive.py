@@ -0,0 +1,169 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from ..core.admission import UPLOADS_REJECTED, Rejected, admission, disk_watermark, token_key
+from ..core.archive import (
+    ARCHIVE_BYTES,
+    ARCHIVE_MEMBERS,
+    ArchiveError,
+    ArchiveReader,
+    ChatExport,
+    iter_archive,
+    member_target,
+)
+from ..core.auth import verify_token
+from ..core.chunk_cache import chunk_cache
+from ..core.config import settings
+from ..core.responses import FastJSONResponse, loads, parse_range
+from ..core.storage import atomic_write
+from ..core.tracing import span
+from ..core.usage import usage_ledger
+from ..core.volumes import volume_set
+from ..db import get_cursor
+from .media import store_metadata
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def check_chat_member(chat_id: int, user_id: int) -> None:
+    """Экспорт и импорт отдают и заменяют все файлы чата — только участникам чата."""
+    with get_cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM chats WHERE id = %s AND (user1_id = %s OR user2_id = %s)",
+            (chat_id, user_id, user_id),
+        )
+        if cur.fetchone() is None:
+            raise HTTPException(status_code=403, detail="Нет доступа к чату")
+
+
+@router.get("/chats/{chat_id}/export")
+async def export_chat(
+    request: Request,
+    chat_id: int,
+    user_id: int = Depends(verify_token),
+):
+    """
+    Все файлы чата (чанки и metadata.json со всех томов) одним архивом tar.
+    Тело отдаётся потоком, Content-Length и ETag известны заранее: оборванную
+    выгрузку можно продолжить с байта N заголовками Range и If-Range.
+    """
+    logger.info(f"Exporting chat - chat_id: {chat_id}, user_id: {user_id}")
+    await run_in_threadpool(check_chat_member, chat_id, user_id)
+    with span("archive.scan"):
+        export = await run_in_threadpool(ChatExport.scan, chat_id)
+    if not export.members:
+        raise HTTPException(status_code=404, detail="В чате нет файлов")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="chat_{chat_id}.tar"',
+        "Accept-Ranges": "bytes",
+        "ETag": export.etag,
+    }
+    # If-Range с другим ETag: опись изменилась, продолжение собрало бы несовместимый архив
+    if_range = request.headers.get("if-range")
+    requested = parse_range(request.headers.get("range"), export.size) if if_range in (None, export.etag) else None
+    if requested is None:
+        offset, length, status_code = 0, export.size, 200
+    else:
+        offset, length = requested
+        status_code = 206
+        headers["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{export.size}"
+    headers["Content-Length"] = str(length)
+    logger.info(f"Streaming chat {chat_id} archive: {len(export.members)} files, bytes {offset}+{length} of {export.size}")
+    # Синхронный итератор StreamingResponse читает файлы в пуле потоков
+    return StreamingResponse(
+        iter_archive(export, offset, length),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/x-tar",
+    )
+
+
+def store_member(chat_id: int, file_id: int, name: str, data: bytes, user_id: int) -> str:
+    if name == "metadata.json":
+        # Архив — источник истины: метаданные перезаписываются, как при upload_metadata
+        if not isinstance(loads(data), dict):
+            raise ValueError("metadata.json is not an object")
+        store_metadata(chat_id, file_id, data, user_id)
+        chunk_cache.drop_file(chat_id, file_id)
+        return "stored"
+    index = int(name.split(".", 1)[0])
+    # Чанки неизменяемы: уже сохранённые пропускаются, повторный импорт ничего не перезаписывает
+    if volume_set.find_chunk(chat_id, file_id, index) is not None:
+        return "exists"
+    atomic_write(volume_set.chunk_write_path(chat_id, file_id, index), data)
+    usage_ledger.record(chat_id, file_id, user_id, bytes=len(data), chunks=1)
+    return "stored"
+
+
+async def import_archive(chat_id: int, stream, user_id: int, key: str | None = None, base_offset: int = 0) -> dict:
+    """
+    Восстанавливает файлы чата из потока tar. В памяти — один член архива (чанк
+    не больше UPLOAD_MAX_REQUEST_BYTES). key — ключ допуска загрузок: импорт
+    через HTTP делит места и бюджет байт с обычными загрузками и проверяет квоты;
+    место учитывается на user_id. offset в ответе —
+    байт архива после последнего обработанного члена: с него продолжается
+    прерванный импорт (например, GET export с Range: bytes=<offset>-).
+    """
+    reader = ArchiveReader(stream)
+    counts = {"stored": 0, "exists": 0, "skipped": 0}
+    try:
+        async for info, data in reader.members(settings.UPLOAD_MAX_REQUEST_BYTES):
+            target = member_target(info.name)
+            if target is None or data is None:
+                logger.warning(f"Skipping archive member {info.name} ({info.size} bytes)")
+                result = "skipped"
+            else:
+                file_id, name = target
+                if key is not None:
+                    if disk_watermark.low():
+                        raise Rejected(503, "disk_low", "Недостаточно места в хранилище")
+                    if usage_ledger.quotas_enabled:
+                        await run_in_threadpool(usage_ledger.check_quota, chat_id, user_id, len(data))
+                    await admission.acquire(key, len(data))
+                try:
+                    with span("archive.store", file_id=file_id, bytes=len(data)):
+                        result = await run_in_threadpool(store_member, chat_id, file_id, name, data, user_id)
+                finally:
+                    if key is not None:
+                        admission.release(key, len(data))
+                ARCHIVE_BYTES.labels(direction="import").inc(len(data))
+            counts[result] += 1
+            ARCHIVE_MEMBERS.labels(direction="import", result=result).inc()
+    except (ArchiveError, ValueError) as e:
+        return {"status": "error", "detail": str(e), "offset": base_offset + reader.offset, **counts}
+    except Rejected as e:
+        UPLOADS_REJECTED.labels(reason=e.reason).inc()
+        return {"status": "rejected", "reason": e.reason, "detail": e.detail, "offset": base_offset + reader.offset, **counts}
+    return {"status": "ok", "offset": base_offset + reader.offset, **counts}
+
+
+@router.post("/chats/{chat_id}/import", response_class=FastJSONResponse)
+async def import_chat(
+    request: Request,
+    chat_id: int,
+    offset: int = 0,
+    user_id: int = Depends(verify_token),
+):
+    """
+    Импорт архива export_chat в чат chat_id этого экземпляра. Тело читается
+    потоком; offset — смещение начала тела в исходном архиве при продолжении.
+    """
+    logger.info(f"Importing chat - chat_id: {chat_id}, user_id: {user_id}, offset: {offset}")
+    await run_in_threadpool(check_chat_member, chat_id, user_id)
+    result = await import_archive(
+        chat_id, request.stream(), user_id, token_key(request.headers.get("authorization", "")), offset
+    )
+    logger.info(f"Chat {chat_id} import finished: {result}")
+    if result["status"] == "rejected" and result["reason"].startswith("quota"):
+        return FastJSONResponse(result, status_code=507)
+    if result["status"] == "rejected":
+        return FastJSONResponse(result, status_code=503, headers={"Retry-After": str(settings.UPLOAD_RETRY_AFTER)})
+    if result["status"] == "error":
+        return FastJSONResponse(result, status_code=400)
+    return FastJSONResponse(result)
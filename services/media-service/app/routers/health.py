@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from ..core.startup import readiness
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz():
+    """Процесс жив и принимает соединения."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """Воркер прогрет и может получать трафик."""
+    body = {
+        "status": "ready" if readiness.ready else "starting",
+        "startup_seconds": readiness.startup_seconds,
+        "checks": readiness.checks,
+    }
+    return JSONResponse(body, status_code=200 if readiness.ready else 503)
@@ -6,9 +6,27 @@ import shutil
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
+from ..core.admission import UPLOADS_REJECTED, Rejected
+from ..core.archive import READ_BLOCK
 from ..core.auth import verify_token
+from ..core.chunk_cache import chunk_cache
+from ..core.compression import compression
 from ..core.config import settings
+from ..core.responses import (
+    FastJSONResponse,
+    base64_field_body,
+    base64_field_stream,
+    loads,
+    parse_range,
+    raw_json_response,
+)
+from ..core.storage import atomic_write, file_lock
+from ..core.tracing import span
+from ..core.usage import usage_ledger
+from ..core.volumes import volume_set
 from ..db import get_cursor
 
 # Настройка логгера
@@ -25,12 +43,89 @@ async def options_handler(path: str):
 
 
 def get_video_dir(chat_id: int, file_id: int) -> str:
-    base_dir = os.path.join(settings.STORAGE_ROOT, "chats", f"chat_{chat_id}", f"{file_id}")
+    """Каталог файла на его домашнем томе: там лежат metadata.json и metadata.lock."""
+    base_dir = volume_set.home(chat_id, file_id).file_dir(chat_id, file_id)
     os.makedirs(base_dir, exist_ok=True)
     logger.info(f"Created/accessed video directory: {base_dir}")
     return base_dir
 
 
+def store_chunk(chat_id: int, file_id: int, chunk_index: int, chunk_bytes: bytes, nonce: str, user_id: int = 0) -> None:
+    """
+    Записывает чанк на его том и nonce в metadata.json на домашнем томе файла.
+    Выполняется в пуле потоков: при STORAGE_DURABILITY=strict обе записи
+    сбрасываются fsync до возврата. Прирост места учитывается на user_id.
+    """
+    video_dir = get_video_dir(chat_id, file_id)
+    chunk_path = volume_set.chunk_write_path(chat_id, file_id, chunk_index)
+    meta_path = os.path.join(video_dir, "metadata.json")
+
+    # Chunks are cached as immutable, so readers must never see a partially written file
+    with span("file.write", bytes=len(chunk_bytes)):
+        atomic_write(chunk_path, chunk_bytes)
+    logger.info(f"Successfully wrote chunk to: {chunk_path}")
+
+    # Read-modify-write of metadata.json is serialized across worker processes
+    with span("metadata.lock"), file_lock(os.path.join(video_dir, "metadata.lock")):
+        meta: dict = {}
+        old_size = 0
+        # After a volume was added metadata.json may still sit on its old volume
+        source = meta_path if os.path.exists(meta_path) else volume_set.find_metadata(chat_id, file_id)
+        if source is not None:
+            with span("file.read"), open(source, "rb") as f:
+                raw_meta = f.read()
+            old_size = len(raw_meta)
+            try:
+                with span("json.decode"):
+                    meta = loads(raw_meta)
+                logger.debug(f"Loaded existing metadata: {len(meta)} keys")
+            except Exception as e:
+                logger.warning(f"Failed to load metadata, using empty dict: {e}")
+                meta = {}
+
+        if "nonces" not in meta:
+            meta["nonces"] = []
+
+        while len(meta["nonces"]) <= chunk_index:
+            meta["nonces"].append("")
+
+        meta["nonces"][chunk_index] = nonce
+
+        with span("json.encode"):
+            raw_meta = json.dumps(meta).encode("utf-8")
+        with span("file.write", bytes=len(raw_meta)):
+            atomic_write(meta_path, raw_meta)
+        if source is not None and source != meta_path:
+            os.remove(source)
+    usage_ledger.record(
+        chat_id, file_id, user_id,
+        bytes=len(chunk_bytes) + len(raw_meta) - old_size, chunks=1, files=0 if source is not None else 1,
+    )
+
+
+def store_metadata(chat_id: int, file_id: int, raw_meta: bytes, user_id: int = 0) -> None:
+    video_dir = get_video_dir(chat_id, file_id)
+    with span("file.write", bytes=len(raw_meta)), file_lock(os.path.join(video_dir, "metadata.lock")):
+        source = volume_set.find_metadata(chat_id, file_id)
+        try:
+            old_size = os.path.getsize(source) if source is not None else 0
+        except FileNotFoundError:
+            source, old_size = None, 0
+        atomic_write(os.path.join(video_dir, "metadata.json"), raw_meta)
+    usage_ledger.record(chat_id, file_id, user_id, bytes=len(raw_meta) - old_size, files=0 if source is not None else 1)
+
+
+async def enforce_quota(chat_id: int, user_id: int, size: int) -> None:
+    """507, если загрузка превысит квоту пользователя или чата (USAGE_QUOTA_*)."""
+    if not usage_ledger.quotas_enabled:
+        return
+    try:
+        await run_in_threadpool(usage_ledger.check_quota, chat_id, user_id, size)
+    except Rejected as e:
+        UPLOADS_REJECTED.labels(reason=e.reason).inc()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
 @router.post("/upload_chunk/{chat_id}/{message_id}/{file_id}/{chunk_index}")
 async def upload_video_chunk(
     request: Request,
@@ -50,45 +145,24 @@ async def upload_video_chunk(
     logger.info(f"Request headers - Origin: {origin}, User-Agent: {user_agent[:100]}..., Content-Type: {content_type}")
     logger.info(f"Chunk data keys: {list(chunk_data.keys()) if isinstance(chunk_data, dict) else 'Not a dict'}")
     
-    video_dir = get_video_dir(chat_id, file_id)
-    chunk_path = os.path.join(video_dir, f"{chunk_index}.chenc")
-    meta_path = os.path.join(video_dir, "metadata.json")
-    
     try:
-        if os.path.exists(chunk_path):
+        chunk_path = volume_set.find_chunk(chat_id, file_id, chunk_index)
+        if chunk_path is not None:
             logger.info(f"Chunk already exists: {chunk_path}")
             return {"status": "exists"}
         
-        chunk_bytes = base64.b64decode(chunk_data["chunk"]) if isinstance(chunk_data.get("chunk"), str) else b""
+        encoded = chunk_data.get("chunk")
+        await enforce_quota(chat_id, user_id, len(encoded) * 3 // 4 if isinstance(encoded, str) else 0)
+        with span("base64.decode"):
+            chunk_bytes = base64.b64decode(chunk_data["chunk"]) if isinstance(chunk_data.get("chunk"), str) else b""
         logger.debug(f"Decoded chunk size: {len(chunk_bytes)} bytes")
         
-        with open(chunk_path, "wb") as f:
-            f.write(chunk_bytes)
-        logger.info(f"Successfully wrote chunk to: {chunk_path}")
-        
-        meta: dict = {}
-        if os.path.exists(meta_path):
-            with open(meta_path, "r", encoding="utf-8") as f:
-                try:
-                    meta = json.load(f)
-                    logger.debug(f"Loaded existing metadata: {len(meta)} keys")
-                except Exception as e:
-                    logger.warning(f"Failed to load metadata, using empty dict: {e}")
-                    meta = {}
-        
-        if "nonces" not in meta:
-            meta["nonces"] = []
-            
-        while len(meta["nonces"]) <= chunk_index:
-            meta["nonces"].append("")
-            
-        meta["nonces"][chunk_index] = chunk_data.get("nonce", "")
-        
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f)
+        await run_in_threadpool(store_chunk, chat_id, file_id, chunk_index, chunk_bytes, chunk_data.get("nonce", ""), user_id)
         logger.info(f"Updated metadata with nonce for chunk {chunk_index}")
         
         return {"status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading chunk {chunk_index} for file {file_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ошибка при сохранении чанка: {e}")
@@ -105,9 +179,6 @@ async def upload_video_metadata(
     logger.info(f"Uploading metadata - chat_id: {chat_id}, message_id: {message_id}, file_id: {file_id}, user_id: {user_id}")
     logger.debug(f"Metadata keys: {list(metadata.keys())}")
     
-    video_dir = get_video_dir(chat_id, file_id)
-    meta_path = os.path.join(video_dir, "metadata.json")
-    
     try:
         allowed_keys = {"filename", "mimetype", "size", "chunk_count", "chunk_size", "nonces", "duration"}
         clean_metadata = {k: v for k, v in metadata.items() if k in allowed_keys}
@@ -116,17 +187,21 @@ async def upload_video_metadata(
         if filtered_keys:
             logger.warning(f"Filtered out metadata keys: {filtered_keys}")
         
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(clean_metadata, f)
-        logger.info(f"Successfully saved metadata to: {meta_path}")
+        with span("json.encode"):
+            raw_meta = json.dumps(clean_metadata).encode("utf-8")
+        await enforce_quota(chat_id, user_id, len(raw_meta))
+        await run_in_threadpool(store_metadata, chat_id, file_id, raw_meta, user_id)
+        logger.info(f"Successfully saved metadata for file {file_id}")
         
         return {"status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error saving metadata for file {file_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ошибка при сохранении metadata: {e}")
 
 
-@router.get("/file_metadata/{chat_id}/{message_id}/{file_id}")
+@router.get("/file_metadata/{chat_id}/{message_id}/{file_id}", response_class=FastJSONResponse)
 async def get_video_metadata(
     chat_id: int,
     message_id: int,
@@ -135,24 +210,24 @@ async def get_video_metadata(
 ):
     logger.info(f"Getting metadata - chat_id: {chat_id}, message_id: {message_id}, file_id: {file_id}, user_id: {user_id}")
     
-    video_dir = get_video_dir(chat_id, file_id)
-    meta_path = os.path.join(video_dir, "metadata.json")
-    
-    if not os.path.exists(meta_path):
-        logger.warning(f"Metadata not found: {meta_path}")
-        raise HTTPException(status_code=404, detail="Metadata not found")
-    
     try:
-        with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-        logger.info(f"Successfully retrieved metadata with {len(meta)} keys")
-        return meta
+        with span("metadata.read"):
+            cached_meta = chunk_cache.get_metadata(chat_id, file_id)
     except Exception as e:
-        logger.error(f"Error reading metadata from {meta_path}: {e}", exc_info=True)
+        logger.error(f"Error reading metadata for file {file_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка при чтении metadata")
+    if cached_meta is None:
+        logger.warning(f"Metadata not found for file {file_id}")
+        raise HTTPException(status_code=404, detail="Metadata not found")
+    
+    # metadata.json is written by upload_metadata already as JSON — send it without re-encoding
+    body = cached_meta[0]
+    logger.info(f"Successfully retrieved metadata, {len(body)} bytes")
+    return raw_json_response(body)
 
 
-@router.get("/file_chunk/{chat_id}/{message_id}/{file_id}/{chunk_index}")
+@router.get("/file_chunk/{chat_id}/{message_id}/{file_id}/{chunk_index}", response_class=FastJSONResponse)
+@compression(enabled=False)  # base64 of ciphertext: only the 6-bit alphabet would be saved
 async def get_video_chunk(
     chat_id: int,
     message_id: int,
@@ -162,91 +237,153 @@ async def get_video_chunk(
 ):
     logger.info(f"Getting chunk - chat_id: {chat_id}, message_id: {message_id}, file_id: {file_id}, chunk_index: {chunk_index}, user_id: {user_id}")
     
-    video_dir = get_video_dir(chat_id, file_id)
-    chunk_path = os.path.join(video_dir, f"{chunk_index}.chenc")
-    meta_path = os.path.join(video_dir, "metadata.json")
-    
-    if not os.path.exists(chunk_path):
-        logger.warning(f"Chunk not found: {chunk_path}")
-        raise HTTPException(status_code=404, detail="Chunk not found")
-    
-    if not os.path.exists(meta_path):
-        logger.warning(f"Metadata not found: {meta_path}")
-        raise HTTPException(status_code=404, detail="Metadata not found")
-    
     try:
-        with open(chunk_path, "rb") as f:
-            chunk_bytes = f.read()
-        logger.debug(f"Read chunk size: {len(chunk_bytes)} bytes")
-        
-        with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
+        # Metadata is checked first: its stat also tells us the file was not deleted by another worker
+        with span("metadata.read"):
+            cached_meta = chunk_cache.get_metadata(chat_id, file_id)
+        if cached_meta is None:
+            logger.warning(f"Metadata not found for file {file_id}")
+            raise HTTPException(status_code=404, detail="Metadata not found")
+        meta = cached_meta[1]
+        nonces = meta.get("nonces") or []
+        nonce = nonces[chunk_index] if len(nonces) > chunk_index else ""
         
-        nonce = meta.get("nonces", [""])[chunk_index] if "nonces" in meta and len(meta["nonces"]) > chunk_index else ""
+        with span("chunk.read"):
+            chunk_bytes = chunk_cache.get_chunk(chat_id, file_id, chunk_index, cacheable=bool(nonce))
+        if chunk_bytes is None:
+            logger.warning(f"Chunk {chunk_index} not found for file {file_id}")
+            raise HTTPException(status_code=404, detail="Chunk not found")
+        logger.debug(f"Read chunk size: {len(chunk_bytes)} bytes")
+        chunk_cache.read_ahead(chat_id, file_id, chunk_index, nonces)
         
         logger.info(f"Successfully retrieved chunk {chunk_index}")
-        return {"chunk": base64.b64encode(chunk_bytes).decode("utf-8"), "nonce": nonce, "index": chunk_index}
+        with span("json.encode"):
+            body = base64_field_body("chunk", chunk_bytes, {"nonce": nonce, "index": chunk_index})
+        return raw_json_response(body)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error reading chunk {chunk_index}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка при чтении чанка")
 
 
-@router.get("/file/{file_path:path}")
+@router.get("/file/{file_path:path}", response_class=FastJSONResponse)
+@compression(enabled=False)
 async def get_file_content(
+    request: Request,
     file_path: str,
+    raw: bool = False,
     user_id: int = Depends(verify_token),
 ):
-    logger.info(f"Getting file content - file_path: {file_path}, user_id: {user_id}")
-    
+    """
+    Файл хранилища по пути. По умолчанию — прежний JSON {encrypted_data, file_path},
+    но base64 кодируется блоками по мере отправки: память на запрос не зависит
+    от размера файла. С raw=true — сами байты (application/octet-stream) с
+    поддержкой Range и If-Range.
+    """
+    logger.info(f"Getting file content - file_path: {file_path}, raw: {raw}, user_id: {user_id}")
+
     try:
-        # Normalize and prevent path traversal
-        requested = os.path.normpath(file_path).lstrip("/\\")
-        requested = requested.replace("..", "")
-        logger.debug(f"Normalized requested path: {requested}")
-
-        # If path already starts with STORAGE_ROOT (e.g., "storage/...") use as-is
-        storage_root_norm = os.path.normpath(settings.STORAGE_ROOT)
-        if os.path.isabs(requested) or requested.startswith(storage_root_norm):
-            path = requested
-        else:
-            path = os.path.join(storage_root_norm, requested)
-
-        # Ensure final path stays under storage root when absolute
-        if os.path.isabs(path):
-            # no-op
-            pass
-        else:
-            # Convert to absolute based on CWD if needed
-            path = os.path.normpath(path)
-        
-        logger.debug(f"Final resolved path: {path}")
-        
-        if not os.path.exists(path):
-            logger.warning(f"File not found: {path}")
-            raise HTTPException(status_code=404, detail="Файл не найден в хранилище")
-        
-        with open(path, "rb") as f:
-            file_data = f.read()
-        
-        logger.info(f"Successfully read file: {path}, size: {len(file_data)} bytes")
-        
-        encoded_data = base64.b64encode(file_data).decode("utf-8")
-        return {"encrypted_data": encoded_data, "file_path": file_path}
-    except FileNotFoundError as e:
-        logger.warning(f"File not found: {file_path} - {e}")
+        path = await run_in_threadpool(volume_set.resolve, file_path)
+    except ValueError as e:
+        logger.warning(f"Rejected file path {file_path!r}: {e}")
+        raise HTTPException(status_code=400, detail="Недопустимый путь к файлу")
+    if path is None:
+        logger.warning(f"File not found: {file_path}")
+        raise HTTPException(status_code=404, detail="Файл не найден в хранилище")
+
+    try:
+        # Дескриптор открыт до ответа: размер и содержимое относятся к одному и тому же файлу
+        f = await run_in_threadpool(open, path, "rb")
+    except FileNotFoundError:
+        logger.warning(f"File not found: {path}")
         raise HTTPException(status_code=404, detail="Файл не найден")
-    except Exception as e:
-        logger.error(f"Error getting file content for {file_path}: {e}", exc_info=True)
+    except OSError as e:
+        logger.error(f"Error opening file {path}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка при получении файла")
+    st = os.fstat(f.fileno())
+    size = st.st_size
+
+    if not raw:
+        volume_set.record_io(path, "read", size)
+        length, body = base64_field_stream("encrypted_data", f, size, {"file_path": file_path})
+        logger.info(f"Streaming file {path} as JSON, size: {size} bytes")
+        return StreamingResponse(body, headers={"Content-Length": str(length)}, media_type="application/json")
+
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{st.st_size:x}-{st.st_mtime_ns:x}"'}
+    if_range = request.headers.get("if-range")
+    try:
+        requested = parse_range(request.headers.get("range"), size) if if_range in (None, headers["ETag"]) else None
+    except HTTPException:
+        f.close()
+        raise
+    if requested is None:
+        offset, length, status_code = 0, size, 200
+    else:
+        offset, length = requested
+        status_code = 206
+        headers["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{size}"
+    headers["Content-Length"] = str(length)
+    volume_set.record_io(path, "read", length)
+    logger.info(f"Streaming file {path} raw, bytes {offset}+{length} of {size}")
+    return StreamingResponse(
+        iter_file_range(f, offset, length),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/octet-stream",
+    )
+
+
+def iter_file_range(f, offset: int, length: int):
+    """Байты [offset, offset + length) файла блоками READ_BLOCK; закрывает файл."""
+    try:
+        f.seek(offset)
+        while length:
+            data = f.read(min(READ_BLOCK, length))
+            if not data:
+                raise OSError(f"{f.name} was truncated while streaming")
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
 
 
-@router.get("/messages/{chat_id}/{message_id}/files")
+def inline_small_files(chat_id: int, files: list[dict]) -> None:
+    """
+    Добавляет "inline": {metadata, chunk, nonce} одночанковым файлам не больше
+    INLINE_MAX_FILE_BYTES: голосовые, стикеры и превью показываются без запросов
+    file_metadata и file_chunk. Встроенные байты ответа не превышают
+    INLINE_MAX_RESPONSE_BYTES, остальные файлы клиент загружает как обычно.
+    """
+    budget = settings.INLINE_MAX_RESPONSE_BYTES
+    for file in files:
+        limit = min(settings.INLINE_MAX_FILE_BYTES, budget)
+        if limit <= 0:
+            break
+        size = file.get("size")
+        # The size column rules out large files without reading metadata.json
+        if isinstance(size, int) and size > limit:
+            continue
+        try:
+            small = chunk_cache.small_file(chat_id, int(file["file_id"]), limit)
+        except Exception as e:
+            logger.warning(f"Failed to inline file {file.get('file_id')}: {e}")
+            continue
+        if small is None:
+            continue
+        meta, data, nonce = small
+        budget -= len(data)
+        file["inline"] = {"metadata": meta, "chunk": base64.b64encode(data).decode("ascii"), "nonce": nonce}
+
+
+@router.get("/messages/{chat_id}/{message_id}/files", response_class=FastJSONResponse)
 async def get_message_files(
     chat_id: int,
     message_id: int,
+    inline: bool = False,
     user_id: int = Depends(verify_token),
 ):
-    logger.info(f"Getting message files - chat_id: {chat_id}, message_id: {message_id}, user_id: {user_id}")
+    logger.info(f"Getting message files - chat_id: {chat_id}, message_id: {message_id}, inline: {inline}, user_id: {user_id}")
     
     files_table = f"chat_{chat_id}_files"
     chat_table = f"chat_{chat_id}"
@@ -299,8 +436,14 @@ async def get_message_files(
             for row in rows
         ]
         
+        if inline:
+            with span("inline.read"):
+                await run_in_threadpool(inline_small_files, chat_id, files)
+        
         logger.info(f"Successfully retrieved {len(files)} files for message {message_id}")
-        return files
+        with span("json.encode"):
+            response = FastJSONResponse(files)
+        return response
     except Exception as e:
         logger.error(f"Error getting files for message {message_id} in chat {chat_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка при получении файлов")
@@ -312,30 +455,42 @@ async def delete_message_file(
     user_id: int = Depends(verify_token),
 ):
     logger.info(f"Deleting message file - chat_id: {chat_id}, file_id: {file_id}, user_id: {user_id}")
-    # Build the expected directory path WITHOUT creating it
-    storage_root = os.path.realpath(settings.STORAGE_ROOT)
-    file_dir = os.path.join(storage_root, "chats", f"chat_{chat_id}", f"{file_id}")
-    file_dir_real = os.path.realpath(file_dir)
+    # Build the expected directory paths WITHOUT creating them: chunks may sit on every volume
+    file_dirs = []
+    for volume in volume_set.ranked(f"{chat_id}/{file_id}"):
+        storage_root = os.path.realpath(volume.path)
+        file_dir_real = os.path.realpath(volume.file_dir(chat_id, file_id))
 
-    # Safety: ensure we're deleting only inside STORAGE_ROOT
-    if not file_dir_real.startswith(storage_root):
-        logger.warning(f"Refusing to delete outside storage root: {file_dir_real}")
-        raise HTTPException(status_code=400, detail="Некорректный путь файла")
+        # Safety: ensure we're deleting only inside the volume root
+        if not file_dir_real.startswith(storage_root):
+            logger.warning(f"Refusing to delete outside storage root: {file_dir_real}")
+            raise HTTPException(status_code=400, detail="Некорректный путь файла")
+        file_dirs.append(file_dir_real)
 
+    chunk_cache.drop_file(chat_id, file_id)
     try:
-        if not os.path.exists(file_dir_real):
-            logger.warning(f"File or directory to delete not found: {file_dir_real}")
+        existing = [path for path in file_dirs if os.path.exists(path)]
+        if not existing:
+            logger.warning(f"File or directory to delete not found: {file_dirs[0]}")
             raise HTTPException(status_code=404, detail="Файл не найден")
 
-        if os.path.isdir(file_dir_real):
-            shutil.rmtree(file_dir_real)
-            logger.info(f"Successfully deleted directory with chunks: {file_dir_real}")
-        elif os.path.isfile(file_dir_real):
-            os.remove(file_dir_real)
-            logger.info(f"Successfully deleted file: {file_dir_real}")
-        else:
-            logger.warning(f"Path exists but is neither file nor directory: {file_dir_real}")
-            raise HTTPException(status_code=404, detail="Файл не найден")
+        # The home volume goes first: without metadata.json readers already get 404
+        for file_dir_real in existing:
+            if os.path.isdir(file_dir_real):
+                shutil.rmtree(file_dir_real)
+                logger.info(f"Successfully deleted directory with chunks: {file_dir_real}")
+            elif os.path.isfile(file_dir_real):
+                os.remove(file_dir_real)
+                logger.info(f"Successfully deleted file: {file_dir_real}")
+            else:
+                logger.warning(f"Path exists but is neither file nor directory: {file_dir_real}")
+                raise HTTPException(status_code=404, detail="Файл не найден")
+
+        try:
+            await run_in_threadpool(usage_ledger.forget_file, chat_id, file_id)
+        except Exception as e:
+            # Files are already gone; the reconcile job removes the stale usage rows
+            logger.warning(f"Failed to update usage after deleting file {file_id}: {e}")
 
         return {"message": "Файл успешно удален"}
     except HTTPException:
@@ -0,0 +1,107 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from ..core.auth import verify_token
+from ..core.config import settings
+from ..core.profiling import cpu_profiler, loop_monitor, memory_profiler
+
+
+async def require_admin(user_id: int = Depends(verify_token)) -> int:
+    if user_id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return user_id
+
+
+# Профилировщики живут в процессе: при нескольких воркерах запрос попадает в один
+# случайный воркер (SO_REUSEPORT), и профилируется только он. Ответы несут pid
+# воркера; повторные запросы состояния могут попасть в другой воркер
+router = APIRouter(prefix="/admin/profiling", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/cpu")
+async def start_cpu_profile(
+    seconds: Optional[float] = Query(None, gt=0),
+    requests: Optional[int] = Query(None, ge=1),
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+    include_idle: bool = False,
+):
+    """
+    Сэмплирует стеки следующие seconds секунд или следующие requests запросов
+    (но не дольше PROFILING_MAX_SECONDS) в одном воркере — том, что принял запрос.
+    Результат — collapsed stacks для speedscope.
+    """
+    try:
+        path = cpu_profiler.start(seconds, requests, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"file": os.path.basename(path), "pid": os.getpid()}
+
+
+@router.get("/cpu")
+async def cpu_profile_status():
+    return {"pid": os.getpid(), "active": cpu_profiler.active, "requests_left": cpu_profiler.requests_left, "last": cpu_profiler.last_result}
+
+
+@router.delete("/cpu")
+async def stop_cpu_profile():
+    cpu_profiler.stop()
+    return {"active": False}
+
+
+@router.post("/memory/start")
+async def start_memory_tracing(frames: int = Query(10, ge=1, le=100)):
+    memory_profiler.start(frames)
+    return {"tracing": True}
+
+
+@router.post("/memory/snapshot")
+def take_memory_snapshot(compare_to: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """Снимок tracemalloc; с compare_to — разница с ранее сохранённым снимком."""
+    try:
+        return memory_profiler.snapshot(compare_to, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Снимок не найден")
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing():
+    memory_profiler.stop()
+    return {"tracing": False}
+
+
+@router.post("/loop")
+async def start_loop_monitor(
+    seconds: float = Query(60.0, gt=0),
+    threshold_ms: float = Query(100.0, ge=10.0),
+):
+    """Следит за задержками цикла событий и снимает стек при каждой остановке дольше порога."""
+    try:
+        path = loop_monitor.start(seconds, threshold_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"file": os.path.basename(path), "pid": os.getpid()}
+
+
+@router.get("/loop")
+async def loop_monitor_status():
+    return loop_monitor.status()
+
+
+@router.get("/files")
+async def list_profiles():
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    return sorted(os.listdir(settings.PROFILING_DIR))
+
+
+@router.get("/files/{name}")
+async def download_profile(name: str):
+    path = os.path.join(settings.PROFILING_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Файл не найден")
+    return FileResponse(path, filename=os.path.basename(path))
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+
+from fastapi import APIRouter, HTTPException, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+
+from ..core.admission import UPLOADS_REJECTED, Rejected, admission, disk_watermark, token_key
+from ..core.auth import verify_bearer
+from ..core.chunk_cache import chunk_cache
+from ..core.config import settings
+from ..core.responses import dumps, loads
+from ..core.tracing import span
+from ..core.transfer import (
+    CLOSE_POLICY,
+    CLOSE_PROTOCOL,
+    CLOSE_TOO_BIG,
+    CLOSE_UNAUTHORIZED,
+    OP_DATA,
+    OP_NAMES,
+    OP_PUT,
+    WS_CONNECTIONS,
+    WS_FRAMES,
+    Frame,
+    FrameError,
+    decode_frame,
+    encode_frame,
+)
+from ..core.usage import usage_ledger
+from ..core.volumes import volume_set
+from .media import store_chunk
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class ChannelClosed(Exception):
+    def __init__(self, code: int, reason: str):
+        self.code = code
+        self.reason = reason
+
+
+class TransferSession:
+    """
+    Одно WebSocket-соединение передачи чанков. Токен проверяется один раз при
+    подключении (и повторно раз в WS_AUTH_TTL), дальше кадры PUT/GET для любых
+    файлов обрабатываются параллельно. Каждый кадр расходует один кредит,
+    каждый ответ (ack или DATA) его возвращает: у клиента не больше WS_CREDITS
+    кадров в обработке, поэтому память соединения ограничена.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.token = ""
+        self.user_id = 0
+        self.key = ""
+        self.verified_at = 0.0
+        self.outstanding = 0
+        self._send_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    # ---------- Авторизация ----------
+
+    async def _verify(self, token: str) -> None:
+        try:
+            user_id = await verify_bearer(token)
+        except HTTPException as e:
+            if e.status_code == status.HTTP_401_UNAUTHORIZED:
+                raise ChannelClosed(CLOSE_UNAUTHORIZED, "Unauthorized")
+            raise ChannelClosed(status.WS_1013_TRY_AGAIN_LATER, "Auth service error")
+        except Exception as e:
+            logger.warning(f"Token verification failed: {e}")
+            raise ChannelClosed(status.WS_1013_TRY_AGAIN_LATER, "Auth service error")
+        if self.user_id and user_id != self.user_id:
+            raise ChannelClosed(CLOSE_UNAUTHORIZED, "Token belongs to another user")
+        self.token = token
+        self.user_id = user_id
+        self.key = token_key(f"Bearer {token}")
+        self.verified_at = time.monotonic()
+
+    async def authenticate(self) -> None:
+        """Токен из заголовка Authorization или первым сообщением {"type": "auth", "token": ...}."""
+        authorization = self.websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            await self._verify(authorization[7:].strip())
+            return
+        try:
+            text = await asyncio.wait_for(self.websocket.receive_text(), settings.WS_AUTH_TIMEOUT)
+            message = loads(text)
+        except asyncio.TimeoutError:
+            raise ChannelClosed(CLOSE_UNAUTHORIZED, "Auth timeout")
+        except (KeyError, ValueError):
+            raise ChannelClosed(CLOSE_PROTOCOL, "Expected auth message")
+        if not isinstance(message, dict) or message.get("type") != "auth" or not message.get("token"):
+            raise ChannelClosed(CLOSE_PROTOCOL, "Expected auth message")
+        await self._verify(str(message["token"]))
+
+    # ---------- Отправка ----------
+
+    async def send_json(self, message: dict) -> None:
+        async with self._send_lock:
+            await self.websocket.send_text(dumps(message).decode("utf-8"))
+
+    async def send_bytes(self, data: bytes) -> None:
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    async def _ack(self, frame: Frame, result: str, **extra) -> None:
+        WS_FRAMES.labels(op=OP_NAMES[frame.op], status=result).inc()
+        # Кредит возвращается до отправки: следующий кадр клиента может прийти сразу за ответом
+        self.outstanding -= 1
+        await self.send_json({"type": "ack", **frame.ref(), "status": result, "credits": 1, **extra})
+
+    # ---------- Кадры ----------
+
+    async def _put(self, frame: Frame) -> None:
+        size = len(frame.payload)
+        try:
+            if disk_watermark.low():
+                raise Rejected(503, "disk_low", "Недостаточно места в хранилище")
+            if usage_ledger.quotas_enabled:
+                await run_in_threadpool(usage_ledger.check_quota, frame.chat_id, self.user_id, size)
+            await admission.acquire(self.key, size)
+        except Rejected as e:
+            UPLOADS_REJECTED.labels(reason=e.reason).inc()
+            # Превышение квоты повтором не лечится — без retry_after
+            retry = {"retry_after": settings.UPLOAD_RETRY_AFTER} if e.status_code != 507 else {}
+            await self._ack(frame, "rejected", detail=e.detail, **retry)
+            return
+
+        try:
+            if volume_set.find_chunk(frame.chat_id, frame.file_id, frame.chunk_index) is not None:
+                result = "exists"
+            else:
+                await run_in_threadpool(
+                    store_chunk, frame.chat_id, frame.file_id, frame.chunk_index, frame.payload, frame.nonce, self.user_id
+                )
+                result = "ok"
+        except Exception as e:
+            logger.error(f"Error uploading chunk {frame.chunk_index} for file {frame.file_id} over websocket: {e}", exc_info=True)
+            await self._ack(frame, "error", detail="Ошибка при сохранении чанка")
+            return
+        finally:
+            admission.release(self.key, size)
+        # "ok" отправляется после записи чанка и nonce: подтверждённый чанк виден в resume
+        await self._ack(frame, result)
+
+    async def _get(self, frame: Frame) -> None:
+        try:
+            with span("metadata.read"):
+                cached_meta = chunk_cache.get_metadata(frame.chat_id, frame.file_id)
+            if cached_meta is None:
+                await self._ack(frame, "not_found", detail="Metadata not found")
+                return
+            nonces = cached_meta[1].get("nonces") or []
+            nonce = nonces[frame.chunk_index] if len(nonces) > frame.chunk_index else ""
+            with span("chunk.read"):
+                chunk_bytes = chunk_cache.get_chunk(frame.chat_id, frame.file_id, frame.chunk_index, cacheable=bool(nonce))
+            if chunk_bytes is None:
+                await self._ack(frame, "not_found", detail="Chunk not found")
+                return
+            chunk_cache.read_ahead(frame.chat_id, frame.file_id, frame.chunk_index, nonces)
+        except Exception as e:
+            logger.error(f"Error reading chunk {frame.chunk_index} over websocket: {e}", exc_info=True)
+            await self._ack(frame, "error", detail="Ошибка при чтении чанка")
+            return
+
+        WS_FRAMES.labels(op="get", status="ok").inc()
+        self.outstanding -= 1
+        await self.send_bytes(encode_frame(
+            OP_DATA, frame.seq, frame.chat_id, frame.message_id, frame.file_id, frame.chunk_index, nonce, chunk_bytes
+        ))
+
+    async def _process(self, frame: Frame) -> None:
+        try:
+            with span(f"ws.{OP_NAMES[frame.op]}", file_id=frame.file_id, chunk_index=frame.chunk_index):
+                if frame.op == OP_PUT:
+                    await self._put(frame)
+                else:
+                    await self._get(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            # Клиент отключился, пока кадр обрабатывался
+            pass
+
+    async def _on_frame(self, data: bytes) -> None:
+        if len(data) > settings.WS_MAX_FRAME_BYTES:
+            raise ChannelClosed(CLOSE_TOO_BIG, "Frame too large")
+        try:
+            frame = decode_frame(data)
+        except FrameError as e:
+            raise ChannelClosed(CLOSE_PROTOCOL, str(e))
+        if self.outstanding >= settings.WS_CREDITS:
+            raise ChannelClosed(CLOSE_POLICY, "Credit exceeded")
+        if time.monotonic() - self.verified_at > settings.WS_AUTH_TTL:
+            await self._verify(self.token)
+        self.outstanding += 1
+        task = asyncio.create_task(self._process(frame))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ---------- Управляющие сообщения ----------
+
+    async def _resume(self, message: dict) -> None:
+        """Какие чанки файла уже сохранены: клиент после переподключения досылает остальные."""
+        chat_id, file_id = int(message["chat_id"]), int(message["file_id"])
+        cached_meta = chunk_cache.get_metadata(chat_id, file_id)
+        meta = cached_meta[1] if cached_meta is not None else {}
+        await self.send_json({
+            "type": "state",
+            "seq": message.get("seq"),
+            "chat_id": chat_id,
+            "file_id": file_id,
+            "chunk_count": meta.get("chunk_count"),
+            # nonce пишется после чанка, поэтому чанк с nonce сохранён полностью
+            "chunks": [index for index, nonce in enumerate(meta.get("nonces") or []) if nonce],
+        })
+
+    async def _on_text(self, text: str) -> None:
+        try:
+            message = loads(text)
+            kind = message.get("type")
+            if kind == "resume":
+                await self._resume(message)
+            elif kind == "auth":
+                # Клиент обновил токен — продлеваем сессию без переподключения
+                await self._verify(str(message["token"]))
+                await self.send_json({"type": "auth", "status": "ok"})
+            else:
+                await self.send_json({"type": "error", "detail": f"Unknown message type: {kind}"})
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ChannelClosed(CLOSE_PROTOCOL, "Malformed control message")
+
+    # ---------- Цикл соединения ----------
+
+    async def run(self) -> None:
+        try:
+            await self.authenticate()
+            await self.send_json({
+                "type": "ready",
+                "user_id": self.user_id,
+                "credits": settings.WS_CREDITS,
+                "max_frame_bytes": settings.WS_MAX_FRAME_BYTES,
+            })
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    await self._on_frame(message["bytes"])
+                elif message.get("text") is not None:
+                    await self._on_text(message["text"])
+        except ChannelClosed as e:
+            logger.info(f"Closing transfer channel for user {self.user_id}: {e.reason}")
+            try:
+                await self.websocket.close(code=e.code, reason=e.reason)
+            except RuntimeError:
+                pass
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+
+
+@router.websocket("/ws/transfer")
+async def transfer_channel(websocket: WebSocket):
+    await websocket.accept()
+    WS_CONNECTIONS.inc()
+    try:
+        await TransferSession(websocket).run()
+    finally:
+        WS_CONNECTIONS.dec()
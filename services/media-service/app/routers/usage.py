@@ -0,0 +1,64 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..core.auth import verify_token
+from ..core.config import settings
+from ..core.responses import FastJSONResponse
+from ..core.usage import usage_ledger
+from .archive import check_chat_member
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+
+async def usage_response(scope: str, id: int, quota: int) -> FastJSONResponse:
+    """Итоги из media_usage — одна строка по первичному ключу; изменения видны с задержкой до USAGE_FLUSH_INTERVAL."""
+    try:
+        row = await run_in_threadpool(usage_ledger.totals, scope, id)
+    except Exception as e:
+        logger.error(f"Error reading usage for {scope} {id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Ошибка при чтении учёта места")
+    row = row or {}
+    return FastJSONResponse({
+        "scope": scope,
+        "id": id,
+        "bytes": row.get("bytes", 0),
+        "chunks": row.get("chunks", 0),
+        "files": row.get("files", 0),
+        "quota_bytes": quota or None,
+        "updated_at": row["updated_at"].isoformat() if row.get("updated_at") else None,
+        "reconciled_at": row["reconciled_at"].isoformat() if row.get("reconciled_at") else None,
+    })
+
+
+@router.get("/me")
+async def get_my_usage(user_id: int = Depends(verify_token)):
+    return await usage_response("user", user_id, settings.USAGE_QUOTA_USER_BYTES)
+
+
+@router.get("/users/{target_id}")
+async def get_user_usage(target_id: int, user_id: int = Depends(verify_token)):
+    if target_id != user_id and user_id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    return await usage_response("user", target_id, settings.USAGE_QUOTA_USER_BYTES)
+
+
+@router.get("/chats/{chat_id}")
+async def get_chat_usage(chat_id: int, user_id: int = Depends(verify_token)):
+    if user_id not in settings.ADMIN_USER_IDS:
+        await run_in_threadpool(check_chat_member, chat_id, user_id)
+    return await usage_response("chat", chat_id, settings.USAGE_QUOTA_CHAT_BYTES)
+
+
+@router.post("/reconcile")
+async def reconcile_usage(chat_id: int | None = None, user_id: int = Depends(verify_token)):
+    """Внеочередная сверка учёта с диском (всех чатов или одного) — только администраторам."""
+    if user_id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    stats = await run_in_threadpool(usage_ledger.reconcile, [chat_id] if chat_id is not None else None)
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Сверка уже выполняется")
+    return stats
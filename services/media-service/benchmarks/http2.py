@@ -0,0 +1,184 @@
+"""
+HTTP/1.1 vs HTTP/2 (h2c) benchmark for file_chunk traffic.
+
+Fetches every chunk of a file concurrently, the way the player does, and reports
+wall time, throughput and per-request latency for:
+
+    http1 / uvicorn   — current path: uvicorn worker, HTTP/1.1 pool of --connections
+    http1 / hypercorn — h2c worker answering HTTP/1.1 (isolates the server change)
+    h2c   / hypercorn — h2c worker, one connection, all requests as streams
+
+Without --url the benchmark is self-contained: it seeds a temporary STORAGE_ROOT,
+starts a stub auth-service and launches `python -m app.serve` for each worker type.
+Run from the service directory:
+
+    python -m benchmarks.http2 [--chunks 300] [--chunk-size 262144] [--concurrency 64]
+
+Against a running service (HTTP_PROTOCOL=h2c serves both protocols):
+
+    python -m benchmarks.http2 --url http://media-service:8003 --token <jwt> --chat 1 --message 1 --file 1 --chunks 300
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubAuth(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"user_id": 1}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def seed_storage(root: str, chunks: int, chunk_size: int) -> None:
+    file_dir = os.path.join(root, "chats", "chat_1", "1")
+    os.makedirs(file_dir)
+    for index in range(chunks):
+        with open(os.path.join(file_dir, f"{index}.chenc"), "wb") as f:
+            f.write(os.urandom(chunk_size))
+    nonces = [base64.b64encode(os.urandom(12)).decode() for _ in range(chunks)]
+    with open(os.path.join(file_dir, "metadata.json"), "w") as f:
+        json.dump({"chunk_count": chunks, "chunk_size": chunk_size, "nonces": nonces}, f)
+
+
+def start_service(protocol: str, env: dict, workers: int) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {**env, "HTTP_PROTOCOL": protocol, "APP_PORT": str(port), "WORKERS": str(workers)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{protocol} server did not start")
+
+
+async def fetch_all(client: httpx.AsyncClient, paths: list[str], concurrency: int) -> tuple[float, list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    received = 0
+
+    async def fetch(path: str) -> None:
+        nonlocal received
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            received += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(path) for path in paths))
+    return time.perf_counter() - started, latencies, received
+
+
+async def run_case(name: str, url: str, http2: bool, args, paths: list[str]) -> None:
+    limits = httpx.Limits(max_connections=1 if http2 else args.connections)
+    async with httpx.AsyncClient(
+        base_url=url, http1=not http2, http2=http2, limits=limits, timeout=60.0,
+        headers={"Authorization": f"Bearer {args.token}"},
+    ) as client:
+        await fetch_all(client, paths[: min(len(paths), args.concurrency)], args.concurrency)  # warm up connections
+        walls, latencies, received = [], [], 0
+        for _ in range(args.rounds):
+            wall, round_latencies, received = await fetch_all(client, paths, args.concurrency)
+            walls.append(wall)
+            latencies.extend(round_latencies)
+    wall = statistics.median(walls)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<20} {wall * 1000:>10.1f} {len(paths) / wall:>10.0f} {received / wall / 2 ** 20:>10.1f}"
+        f" {statistics.median(latencies) * 1000:>9.1f} {p99 * 1000:>9.1f}"
+    )
+
+
+async def main_async(args, cases: list[tuple[str, str, bool]]) -> None:
+    paths = [f"/file_chunk/{args.chat}/{args.message}/{args.file}/{i}" for i in range(args.chunks)]
+    print(f"{args.chunks} chunks, concurrency {args.concurrency}, HTTP/1.1 pool {args.connections}, {args.rounds} rounds")
+    print(f"{'case':<20} {'wall, ms':>10} {'req/s':>10} {'MiB/s':>10} {'p50, ms':>9} {'p99, ms':>9}")
+    for name, url, http2 in cases:
+        await run_case(name, url, http2, args, paths)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="running media-service (without root path); self-contained run if omitted")
+    parser.add_argument("--token", default="benchmark")
+    parser.add_argument("--chat", type=int, default=1)
+    parser.add_argument("--message", type=int, default=1)
+    parser.add_argument("--file", type=int, default=1)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024, help="self-contained run only")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight")
+    parser.add_argument("--connections", type=int, default=6, help="HTTP/1.1 pool size (browsers use 6 per host)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="self-contained run only")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(main_async(args, [("http1", args.url, False), ("h2c", args.url, True)]))
+        return
+
+    args.chat = args.message = args.file = 1
+    auth = ThreadingHTTPServer(("127.0.0.1", 0), StubAuth)
+    threading.Thread(target=auth.serve_forever, daemon=True).start()
+    processes = []
+    with tempfile.TemporaryDirectory() as root:
+        seed_storage(os.path.join(root, "storage"), args.chunks, args.chunk_size)
+        env = {
+            **os.environ,
+            "STORAGE_ROOT": os.path.join(root, "storage"),
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(root, "metrics"),
+            "AUTH_HOST": f"http://127.0.0.1:{auth.server_address[1]}",
+            "TRACE_EXPORTER": "none",
+        }
+        try:
+            process, http1_url = start_service("http1", env, args.workers)
+            processes.append(process)
+            process, h2c_url = start_service("h2c", env, args.workers)
+            processes.append(process)
+            asyncio.run(main_async(args, [
+                ("http1 / uvicorn", http1_url, False),
+                ("http1 / hypercorn", h2c_url, False),
+                ("h2c / hypercorn", h2c_url, True),
+            ]))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=30)
+            auth.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Serialization micro-benchmark for media-service endpoints.
+
+Compares FastAPI's default path (jsonable_encoder + JSONResponse with stdlib json)
+with the fast paths used by the routers. Run from the service directory:
+
+    python -m benchmarks.serialization [--repeat 200]
+"""
+import argparse
+import base64
+import datetime
+import json
+import os
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.responses import FastJSONResponse, base64_field_body, orjson
+
+
+def default_path(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def bench(name: str, baseline, fast, repeat: int) -> None:
+    assert json.loads(baseline()) == json.loads(fast()), name
+    base_time = min(timeit.repeat(baseline, number=1, repeat=repeat))
+    fast_time = min(timeit.repeat(fast, number=1, repeat=repeat))
+    print(f"{name:<28} {base_time * 1e6:>12.1f} {fast_time * 1e6:>12.1f} {base_time / fast_time:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=1024 * 1024)
+    parser.add_argument("--chunks", type=int, default=4096, help="length of the nonces array")
+    parser.add_argument("--files", type=int, default=50, help="files per message")
+    args = parser.parse_args()
+
+    chunk = os.urandom(args.chunk_size)
+    nonce = base64.b64encode(os.urandom(12)).decode()
+    meta = {
+        "filename": "video.mp4", "mimetype": "video/mp4", "size": args.chunk_size * args.chunks,
+        "chunk_count": args.chunks, "chunk_size": args.chunk_size,
+        "nonces": [base64.b64encode(os.urandom(12)).decode() for _ in range(args.chunks)],
+    }
+    meta_body = json.dumps(meta).encode()
+    created = datetime.datetime(2024, 1, 1, 12, 0)
+    files = [
+        {
+            "id": i, "message_id": 1, "file_id": i, "file_path": f"storage/chats/chat_1/{i}",
+            "filename": f"file_{i}.bin", "mimetype": "application/octet-stream", "size": 123456,
+            "nonce": nonce, "created_at": created.isoformat(), "metadata": {"width": 1920, "height": 1080},
+        }
+        for i in range(args.files)
+    ]
+
+    print(f"JSON backend: {'orjson' if orjson is not None else 'stdlib json'}")
+    print(f"{'endpoint':<28} {'default, us':>12} {'fast, us':>12} {'speedup':>9}")
+    bench(
+        "get_video_chunk",
+        lambda: default_path({"chunk": base64.b64encode(chunk).decode("utf-8"), "nonce": nonce, "index": 7}),
+        lambda: base64_field_body("chunk", chunk, {"nonce": nonce, "index": 7}),
+        args.repeat,
+    )
+    bench(
+        "get_file_content",
+        lambda: default_path({"encrypted_data": base64.b64encode(chunk).decode("utf-8"), "file_path": "a/b"}),
+        lambda: base64_field_body("encrypted_data", chunk, {"file_path": "a/b"}),
+        args.repeat,
+    )
+    bench(
+        "get_video_metadata",
+        lambda: default_path(json.loads(meta_body)),
+        # The router sends metadata.json as is, only the file read remains
+        lambda: bytes(meta_body),
+        args.repeat,
+    )
+    bench(
+        "get_message_files",
+        lambda: default_path(files),
+        lambda: FastJSONResponse(files).body,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
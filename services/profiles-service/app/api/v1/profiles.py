@@ -1,34 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import FileResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.db import models
 from app.db.base import get_db
-from app.schemas.user import User
+from app.db.routing import get_read_db, session_router
+from app.schemas.user import ProfileSyncRequest, ProfileSyncResponse, User, UserBatchRequest
 from app.core.auth import get_current_user
+from app.core.config import settings
+from app.core.metrics import AVATAR_NOT_MODIFIED
+from app.core.responses import model_response
+from app.services import search_service, sync_service, user_service
+from app.services.profile_cache import profile_cache
 
 router = APIRouter(prefix="/profiles", tags=["profiles"])
 
+# Списки профилей сериализуются напрямую через pydantic-core, response_model остаётся для схемы OpenAPI
+_users_adapter = TypeAdapter(list[User])
+_sync_adapter = TypeAdapter(ProfileSyncResponse)
+
 @router.get("", response_model=User)
 async def read_current_user(current_user: models.User = Depends(get_current_user)):
     return current_user
 
-@router.get("/search", response_model=list[User])
-async def search_users(
-    username: str,
+@router.post("/batch", response_model=list[User])
+def get_profiles_batch(
+    batch: UserBatchRequest,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    users = db.query(models.User).filter(
-        models.User.userName.contains(username),
-        models.User.id != current_user.id,
-    ).all()
-    return users
+    """
+    Публичные профили нескольких пользователей (по id и/или логинам) за один запрос.
+    Промахи кэша читаются из основного сервера: ключ read-your-writes у запроса —
+    логин запрашивающего, а не владельцев профилей, и строка с отстающей реплики
+    вернулась бы в общий кэш уже после инвалидации.
+    """
+    if len(batch.ids) + len(batch.logins) > settings.PROFILE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Не больше {settings.PROFILE_BATCH_MAX} пользователей за запрос")
+    return model_response(_users_adapter, profile_cache.get_profiles(batch.ids, batch.logins, db))
+
+@router.post("/sync", response_model=ProfileSyncResponse)
+def sync_profiles(
+    batch: ProfileSyncRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Дельта-синхронизация кэша профилей клиента: только профили из ids,
+    изменённые после курсора since. Курсор для следующего запроса — в ответе.
+    """
+    if len(batch.ids) > settings.PROFILE_SYNC_MAX:
+        raise HTTPException(status_code=400, detail=f"Не больше {settings.PROFILE_SYNC_MAX} пользователей за запрос")
+    try:
+        users, cursor = sync_service.sync_profiles(batch.ids, batch.since, db)
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return model_response(_sync_adapter, {"users": users, "cursor": cursor})
+
+@router.get("/search", response_model=list[User])
+def search_users(
+    username: str = Query(..., min_length=settings.SEARCH_MIN_QUERY_LENGTH, max_length=100),
+    limit: int = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Ранжированный поиск по имени и логину. Курсор следующей страницы
+    возвращается в заголовке X-Next-Cursor.
+    """
+    # min_length в Query считает и пробелы по краям — длина проверяется после strip
+    username = username.strip()
+    if len(username) < settings.SEARCH_MIN_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Запрос короче {settings.SEARCH_MIN_QUERY_LENGTH} символов",
+        )
+    try:
+        users, next_cursor = search_service.search_users(username, limit, cursor, current_user.id, db)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return model_response(_users_adapter, users, headers)
+
+async def _avatar_name(username: str) -> str | None:
+    # Ключ read-your-writes — владелец аватара: после смены его видят все сразу.
+    # Выбор реплики читает отметку записи из Redis — тоже в пуле потоков
+    db = await run_in_threadpool(session_router.read_session, username)
+    try:
+        return await run_in_threadpool(user_service.get_avatar_name, username, db)
+    finally:
+        db.close()
 
 @router.get("/avatar/{username}")
-async def get_avatar(username: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.login == username).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    avatar_path = "storage/avatars/" + user.avatar
-    return FileResponse(avatar_path)
\ No newline at end of file
+async def get_avatar(
+    username: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, le=1024),
+    v: Optional[str] = None,
+):
+    """
+    Отдаёт аватар. С параметром size — готовое превью ближайшего большего
+    размера (WebP, если клиент его принимает, иначе JPEG).
+    Ответ несёт ETag по содержимому и поддерживает If-None-Match; запрос с
+    актуальной версией ?v= кэшируется клиентом без ревалидации.
+    """
+    accept = request.headers.get("accept", "")
+    avatar = await _avatar_name(username)
+    if avatar is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    avatar_path = user_service.pick_variant(username, avatar, size, accept)
+    try:
+        etag = await user_service.file_etag(avatar_path)
+    except FileNotFoundError:
+        # Имя из кэша процесса устарело: аватар сменили через другую реплику,
+        # и старый файл уже удалён. Имя перечитывается из БД один раз
+        user_service.invalidate_avatar(username)
+        avatar = await _avatar_name(username)
+        if avatar is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        avatar_path = user_service.pick_variant(username, avatar, size, accept)
+        try:
+            etag = await user_service.file_etag(avatar_path)
+        except FileNotFoundError:
+            user_service.invalidate_avatar(username)
+            raise HTTPException(status_code=404, detail="Файл аватара не найден")
+
+    if v is not None and v == await user_service.avatar_version(avatar):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=60, must-revalidate"
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        AVATAR_NOT_MODIFIED.inc()
+        return Response(status_code=304, headers=headers)
+    return FileResponse(avatar_path, headers=headers)
@@ -1,33 +1,54 @@
-from fastapi import APIRouter, Depends, File, UploadFile, Body
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Body
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.db import models
 from app.db.base import get_db
 from app.schemas.user import User
-from app.core.auth import get_current_user
+from app.core.auth import get_current_user_for_update
+from app.db.routing import session_router
 
-from app.services.user_service import save_avatar
+from app.services.profile_cache import profile_cache
+from app.services.user_service import AvatarTooLarge, remove_avatar_file, save_avatar
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 @router.post("/update/avatar", response_model=User)
 async def update_avatar(
     avatar: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user),
+    current_user: models.User = Depends(get_current_user_for_update),
     db: Session = Depends(get_db),
 ):
-    current_user.avatar = save_avatar(avatar, current_user.login)
+    previous = current_user.avatar
+    try:
+        current_user.avatar = await save_avatar(avatar, current_user.login)
+    except AvatarTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Время самого UPDATE, а не начала транзакции (обработка аватара идёт внутри неё):
+    # иначе запись могла бы оказаться раньше уже выданного курсора /profiles/sync
+    current_user.updated_at = func.clock_timestamp()
     db.commit()
+    # Отметка записи и сброс кэша ходят в БД и Redis — не в цикле событий
+    await run_in_threadpool(session_router.mark_written, current_user.login)
     db.refresh(current_user)
+    await run_in_threadpool(profile_cache.invalidate, current_user.id, current_user.login)
+    if previous != current_user.avatar:
+        remove_avatar_file(previous)
     return current_user
 
 @router.post("/update/name", response_model=User)
 async def update_user_name(
     userName: str = Body(..., embed=True),
-    current_user: models.User = Depends(get_current_user),
+    current_user: models.User = Depends(get_current_user_for_update),
     db: Session = Depends(get_db),
 ):
     current_user.userName = userName
+    current_user.updated_at = func.clock_timestamp()
     db.commit()
+    await run_in_threadpool(session_router.mark_written, current_user.login)
     db.refresh(current_user)
+    await run_in_threadpool(profile_cache.invalidate, current_user.id, current_user.login)
     return current_user
\ No newline at end of file
@@ -1,16 +1,23 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.api.v1.profiles import router as profiles_router
 from app.api.v1.user import router as user_router
+from app.api.v1.health import router as health_router
 
-from app.db import models
 from app.db.base import engine
+from app.db.routing import session_router
 
-from app.core.config import settings
+from app.core.metrics import metrics_response
+from app.core.revocation import revocation_store
+from app.core.startup import warm_up
+from app.services.profile_cache import profile_cache
+from app.services.user_service import HASHED_NAME_RE, shutdown_executor
 
 # Logging setup
 logger = logging.getLogger(__name__)
@@ -28,12 +35,20 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 logger.setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO))
 
-# Create tables
-try:
-    models.Base.metadata.create_all(bind=engine)
-    logger.info("База данных успешно инициализирована")
-except Exception as e:
-    logger.error(f"Ошибка подключения к базе данных: {e}")
+# Схема БД создаётся отдельным шагом: python -m app.db.migrate
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев идёт в фоне: /healthz отвечает сразу, /readyz — после прогрева
+    warm_task = asyncio.create_task(warm_up())
+    # Подписка на инвалидацию профилей не блокирует готовность: без Redis кэш работает локально
+    profile_cache.start()
+    yield
+    warm_task.cancel()
+    shutdown_executor()
+    revocation_store.stop()
+    profile_cache.stop()
+    session_router.stop()
+    engine.dispose()
 
 
 app = FastAPI(
@@ -43,6 +58,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url=None,
     root_path="/profiles-service",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -54,20 +70,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-app.mount("/storage/avatars", StaticFiles(directory="storage/avatars"), name="avatar storage")
+class AvatarStaticFiles(StaticFiles):
+    """Файлы с хешем содержимого в имени неизменяемы — кэшируем их без ревалидации."""
 
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME_RE.search(str(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+app.mount("/storage/avatars", AvatarStaticFiles(directory="storage/avatars"), name="avatar storage")
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+app.include_router(health_router)
 app.include_router(profiles_router)
 app.include_router(user_router)
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "app:app",
-        host=settings.APP_HOST,
-        port=settings.APP_PORT,
-        reload=settings.RELOAD,
-        log_level=settings.UVICORN_LOG_LEVEL,
-    )
\ No newline at end of file
+    # Один процесс uvicorn или воркеры gunicorn — см. app/serve.py
+    from app.serve import main
+    main()
\ No newline at end of file
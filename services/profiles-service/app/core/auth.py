@@ -6,7 +6,9 @@ import logging
 
 from app.db.models import User
 from app.db.base import get_db
+from app.db.routing import get_read_db
 from app.core.config import settings
+from app.core.revocation import revocation_store
 
 
 logger = logging.getLogger(__name__)
@@ -14,13 +16,7 @@ logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
-    """
-    Возвращает текущего пользователя по JWT токену из заголовка Authorization.
-    """
+def _load_user(token: str, db: Session) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
@@ -41,9 +37,32 @@ def get_current_user(
         logger.error(f"Ошибка декодирования JWT: {e}")
         raise credentials_exception
 
+    if revocation_store.is_revoked(payload):
+        logger.warning(f"Отозванный токен пользователя {username}")
+        raise credentials_exception
+
     user = db.query(User).filter(User.login == username).first()
     if user is None:
         logger.warning(f"Пользователь {username} не найден по токену")
         raise credentials_exception
 
-    return user
\ No newline at end of file
+    return user
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db),
+) -> User:
+    """
+    Возвращает текущего пользователя по JWT токену из заголовка Authorization.
+    Пользователь читается из реплики — для изменений нужен get_current_user_for_update.
+    """
+    return _load_user(token, db)
+
+
+def get_current_user_for_update(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> User:
+    """Текущий пользователь из сессии основного сервера — его можно изменить и сохранить через get_db."""
+    return _load_user(token, db)
@@ -26,4 +26,66 @@ class Settings(BaseSettings):
     ALGORITHM: str = Field(...)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(...)
 
+    # Аватары: лимит загрузки и размеры превью
+    AVATAR_MAX_BYTES: int = Field(default=5 * 1024 * 1024)
+    AVATAR_MAX_PIXELS: int = Field(default=40_000_000)
+    AVATAR_SIZES: list[int] = Field(default=[48, 128, 512])
+    AVATAR_WORKERS: int = Field(default=2)
+    AVATAR_CACHE_TTL: float = Field(default=300.0)
+
+    # Кэш публичных профилей и пакетный запрос
+    PROFILE_CACHE_SIZE: int = Field(default=50_000)
+    PROFILE_CACHE_TTL: float = Field(default=300.0)
+    PROFILE_BATCH_MAX: int = Field(default=100)
+    # Общий кэш профилей в Redis и инвалидация между репликами
+    PROFILE_REDIS_TTL: int = Field(default=3600)
+    PROFILE_REDIS_RETRY: float = Field(default=5.0)
+    PROFILE_CACHE_FALLBACK_TTL: float = Field(default=5.0)
+    PROFILE_CACHE_CHANNEL: str = Field(default="profiles:invalidate")
+    # Дельта-синхронизация: максимум id за запрос и окно, на которое курсор отстаёт
+    # от текущего времени (должно перекрывать DB_REPLICA_MAX_LAG и длину транзакций записи)
+    PROFILE_SYNC_MAX: int = Field(default=1000)
+    PROFILE_SYNC_WINDOW: float = Field(default=30.0)
+
+    # Поиск пользователей
+    SEARCH_MIN_QUERY_LENGTH: int = Field(default=2)
+    SEARCH_TRIGRAM_MIN_LENGTH: int = Field(default=3)
+    SEARCH_DEFAULT_LIMIT: int = Field(default=20)
+    SEARCH_MAX_LIMIT: int = Field(default=50)
+    SEARCH_CACHE_TTL: float = Field(default=5.0)
+
+    # Реплики для чтения: URL SQLAlchemy (JSON-список), допустимое отставание,
+    # период проверки и окно read-your-writes после записи
+    DB_REPLICA_URLS: list[str] = Field(default=[])
+    DB_REPLICA_MAX_LAG: float = Field(default=5.0)
+    DB_REPLICA_CHECK_INTERVAL: float = Field(default=2.0)
+    DB_STICKY_SECONDS: float = Field(default=10.0)
+
+    # Прогрев воркера при старте
+    DB_WARM_CONNECTIONS: int = Field(default=5)
+    STARTUP_TIMEOUT: float = Field(default=10.0)
+
+    # Redis для получения отозванных токенов от auth-service
+    REDIS_URL: Optional[str] = Field(default=None)
+    REVOCATION_CHANNEL: str = Field(default="auth:revocation")
+    REVOCATION_BLOOM_CAPACITY: int = Field(default=100_000)
+    REVOCATION_BLOOM_ERROR_RATE: float = Field(default=0.001)
+
+    APP_HOST: str = Field(default="0.0.0.0")
+    APP_PORT: int = Field(default=8002)
+    RELOAD: bool = Field(default=False)
+    UVICORN_LOG_LEVEL: str = Field(default="info")
+
+    # Воркеры gunicorn: число ("auto" — по CPU), перезапуск по запросам и памяти
+    WORKERS: str = Field(default="auto")
+    WORKERS_MAX: int = Field(default=8)
+    WORKER_MAX_REQUESTS: int = Field(default=10_000)
+    WORKER_MAX_REQUESTS_JITTER: int = Field(default=1_000)
+    WORKER_MAX_RSS_MB: int = Field(default=512)
+    WORKER_RSS_CHECK_INTERVAL: float = Field(default=10.0)
+    WORKER_TIMEOUT: int = Field(default=60)
+    WORKER_GRACEFUL_TIMEOUT: int = Field(default=30)
+    # Каталог метрик prometheus_client для сбора значений со всех воркеров
+    PROMETHEUS_MULTIPROC_DIR: str = Field(default="/tmp/profiles-service-metrics")
+
 settings = Settings() 
\ No newline at end of file
@@ -0,0 +1,24 @@
+import os
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, generate_latest, multiprocess
+
+# Запросы аватаров: warm — путь найден в кэше, cold — потребовался запрос в БД
+AVATAR_REQUESTS = Counter(
+    "profiles_avatar_requests_total",
+    "Запросы аватаров по состоянию кэша путей",
+    ["cache"],
+)
+AVATAR_NOT_MODIFIED = Counter(
+    "profiles_avatar_not_modified_total",
+    "Ответы 304 на условные запросы аватаров",
+)
+
+
+def metrics_response() -> Response:
+    # С несколькими воркерами значения собираются из файлов всех процессов
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
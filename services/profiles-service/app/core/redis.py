@@ -0,0 +1,189 @@
+import logging
+import queue
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis():
+    """
+    Возвращает общий клиент Redis или None, если REDIS_URL не задан
+    либо пакет redis не установлен. Сервис продолжает работать без Redis.
+    """
+    global _client
+    if not settings.REDIS_URL:
+        return None
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None and settings.REDIS_URL.startswith("memory://"):
+            # Redis в памяти процесса — для локального запуска и проверок без сервера
+            _client = InMemoryRedis()
+        if _client is None:
+            try:
+                import redis
+            except ImportError:
+                logger.warning("Пакет redis не установлен, работа без Redis")
+                return None
+            _client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_timeout=2.0,
+                socket_connect_timeout=2.0,
+                health_check_interval=30,
+            )
+    return _client
+
+
+class InMemoryRedis:
+    """
+    Минимальная замена клиента Redis в памяти процесса (REDIS_URL=memory://).
+    Поддерживает только команды, которые используют сервисы: строки с TTL,
+    sorted set, hash, pipeline и pub/sub.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: dict[str, object] = {}
+        self._expires: dict[str, float] = {}
+        self._channels: dict[str, list[queue.Queue]] = {}
+
+    def _get(self, key: str):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    # ---------- Строки ----------
+
+    def get(self, key: str):
+        with self._lock:
+            return self._get(key)
+
+    def mget(self, keys: list[str]) -> list:
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key: str, value, ex: float | None = None) -> bool:
+        with self._lock:
+            self._data[key] = str(value)
+            if ex is None:
+                self._expires.pop(key, None)
+            else:
+                self._expires[key] = time.monotonic() + ex
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = sum(self._data.pop(key, None) is not None for key in keys)
+            for key in keys:
+                self._expires.pop(key, None)
+        return removed
+
+    # ---------- Sorted set и hash ----------
+
+    def zadd(self, key: str, mapping: dict) -> int:
+        with self._lock:
+            zset = self._data.setdefault(key, {})
+            added = sum(member not in zset for member in mapping)
+            zset.update({member: float(score) for member, score in mapping.items()})
+        return added
+
+    def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        low, high = float(min_score), float(max_score)
+        with self._lock:
+            zset = self._data.get(key, {})
+            removed = [m for m, score in zset.items() if low <= score <= high]
+            for member in removed:
+                del zset[member]
+        return len(removed)
+
+    def zrangebyscore(self, key: str, min_score, max_score, withscores: bool = False) -> list:
+        low, high = float(min_score), float(max_score)
+        with self._lock:
+            items = sorted((score, m) for m, score in self._data.get(key, {}).items() if low <= score <= high)
+        return [(m, score) for score, m in items] if withscores else [m for _, m in items]
+
+    def hset(self, key: str, field: str, value) -> int:
+        with self._lock:
+            h = self._data.setdefault(key, {})
+            added = field not in h
+            h[field] = str(value)
+        return int(added)
+
+    def hgetall(self, key: str) -> dict:
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    # ---------- Pub/sub ----------
+
+    def publish(self, channel: str, message) -> int:
+        with self._lock:
+            subscribers = list(self._channels.get(channel, []))
+        for q in subscribers:
+            q.put({"type": "message", "channel": channel, "data": str(message)})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "InMemoryPubSub":
+        return InMemoryPubSub(self)
+
+    def pipeline(self) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    def ping(self) -> bool:
+        return True
+
+
+class InMemoryPubSub:
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._queue: queue.Queue = queue.Queue()
+        self._channels: list[str] = []
+
+    def subscribe(self, *channels: str) -> None:
+        with self._client._lock:
+            for channel in channels:
+                self._client._channels.setdefault(channel, []).append(self._queue)
+                self._channels.append(channel)
+
+    def get_message(self, timeout: float = 0.0):
+        try:
+            return self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        with self._client._lock:
+            for channel in self._channels:
+                subscribers = self._client._channels.get(channel, [])
+                if self._queue in subscribers:
+                    subscribers.remove(self._queue)
+        self._channels = []
+
+
+class InMemoryPipeline:
+    """Копит команды и выполняет их по execute(), как pipeline redis-py."""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands: list = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def queue_command(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue_command
+
+    def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
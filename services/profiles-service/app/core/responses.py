@@ -0,0 +1,13 @@
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def model_response(adapter: TypeAdapter, content: Any, headers: dict | None = None) -> Response:
+    """
+    Проверяет содержимое схемой один раз и сериализует его в pydantic-core
+    сразу в байты — вместо проверки response_model, jsonable_encoder и json.dumps.
+    """
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+    return Response(content=body, headers=headers, media_type="application/json")
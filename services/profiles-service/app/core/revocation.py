@@ -0,0 +1,248 @@
+import json
+import logging
+import math
+import threading
+import time
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Ключи Redis (sorted set): отозванные jti и сессии sid (score = срок действия записи)
+# и "not-before" по пользователю (score = nbf)
+JTI_KEY = "revocation:jti"
+SID_KEY = "revocation:sid"
+NBF_KEY = "revocation:user"
+# Прежний hash "not-before" без очистки: удаляется при следующем отзыве пользователя
+LEGACY_NBF_KEY = "revocation:nbf"
+
+
+class BloomFilter:
+    """
+    Компактный фильтр Блума поверх bytearray.
+    Используется как быстрый отрицательный ответ: если хотя бы один бит
+    не выставлен, токен точно не отозван и точное множество не трогаем.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, key: str) -> None:
+        h = hash(key)
+        h1, h2, size = h & 0xFFFFFFFF, (h >> 32) | 1, self.size
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        # Двойное хеширование поверх встроенного hash(): без аллокаций,
+        # обычно выход на первом же нулевом бите
+        h = hash(key)
+        h1, h2, size, bits = h & 0xFFFFFFFF, (h >> 32) | 1, self.size, self.bits
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class RevocationStore:
+    """
+    Локальная копия списка отзыва: фильтр Блума + точное множество jti,
+    завершённые сессии (sid) и словарь "not-before" по логину. Наполняется снимком из Redis и
+    инкрементально обновляется через pub/sub. Проверка на пути запроса
+    выполняется только в памяти.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jti_exp: dict[str, float] = {}
+        self._sid_exp: dict[str, float] = {}
+        self._not_before: dict[str, float] = {}
+        self._bloom = self._new_bloom()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._loaded = threading.Event()
+
+    @staticmethod
+    def _new_bloom() -> BloomFilter:
+        return BloomFilter(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+
+    # ---------- Проверка ----------
+
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get("jti")
+        if jti and jti in self._bloom and jti in self._jti_exp:
+            return True
+        sid = payload.get("sid")
+        if sid and sid in self._sid_exp:
+            return True
+        nbf = self._not_before.get(payload.get("sub"))
+        if nbf is not None:
+            iat = payload.get("iat")
+            # Токены без iat выпущены до появления отзыва — считаем их отозванными
+            return iat is None or iat < nbf
+        return False
+
+    # ---------- Локальное применение ----------
+
+    def _apply_jti(self, jti: str, exp: float) -> None:
+        if exp <= time.time():
+            return
+        with self._lock:
+            self._jti_exp[jti] = exp
+            self._bloom.add(jti)
+
+    def _apply_sid(self, sid: str, exp: float) -> None:
+        if exp <= time.time():
+            return
+        with self._lock:
+            self._sid_exp[sid] = max(exp, self._sid_exp.get(sid, 0))
+
+    def _apply_not_before(self, sub: str, nbf: float) -> None:
+        with self._lock:
+            if nbf > self._not_before.get(sub, 0):
+                self._not_before[sub] = nbf
+
+    def _apply_message(self, raw: str) -> None:
+        try:
+            event = json.loads(raw)
+            if event["type"] == "jti":
+                self._apply_jti(event["jti"], float(event["exp"]))
+            elif event["type"] == "sid":
+                self._apply_sid(event["sid"], float(event["exp"]))
+            elif event["type"] == "user":
+                self._apply_not_before(event["sub"], float(event["nbf"]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Некорректное событие отзыва: {e}")
+
+    @staticmethod
+    def _nbf_horizon() -> float:
+        # После времени жизни токена "not-before" уже ничего не отсекает
+        return time.time() - settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    def prune(self) -> None:
+        """Удаляет истёкшие записи и перестраивает фильтр Блума."""
+        now = time.time()
+        horizon = self._nbf_horizon()
+        with self._lock:
+            self._jti_exp = {j: e for j, e in self._jti_exp.items() if e > now}
+            self._sid_exp = {s: e for s, e in self._sid_exp.items() if e > now}
+            self._not_before = {s: n for s, n in self._not_before.items() if n > horizon}
+            bloom = self._new_bloom()
+            for jti in self._jti_exp:
+                bloom.add(jti)
+            self._bloom = bloom
+
+    # ---------- Публикация (auth-service) ----------
+
+    def revoke_token(self, jti: str, exp: float) -> None:
+        self._apply_jti(jti, exp)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.zadd(JTI_KEY, {jti: exp})
+            pipe.zremrangebyscore(JTI_KEY, "-inf", time.time())
+            pipe.publish(settings.REVOCATION_CHANNEL, json.dumps({"type": "jti", "jti": jti, "exp": exp}))
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать отзыв токена: {e}")
+
+    def revoke_session(self, sid: str) -> None:
+        """
+        Отзывает access-токены сессии устройства. Запись живёт ACCESS_TOKEN_EXPIRE_MINUTES:
+        позже все токены, выпущенные до завершения сессии, истекают сами.
+        """
+        exp = time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        self._apply_sid(sid, exp)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.zadd(SID_KEY, {sid: exp})
+            pipe.zremrangebyscore(SID_KEY, "-inf", time.time())
+            pipe.publish(settings.REVOCATION_CHANNEL, json.dumps({"type": "sid", "sid": sid, "exp": exp}))
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать отзыв сессии {sid}: {e}")
+
+    def revoke_user(self, sub: str, nbf: float | None = None) -> None:
+        """Отзывает все токены пользователя, выпущенные раньше nbf."""
+        nbf = nbf if nbf is not None else time.time()
+        self._apply_not_before(sub, nbf)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.zadd(NBF_KEY, {sub: nbf})
+            pipe.zremrangebyscore(NBF_KEY, "-inf", self._nbf_horizon())
+            pipe.delete(LEGACY_NBF_KEY)
+            pipe.publish(settings.REVOCATION_CHANNEL, json.dumps({"type": "user", "sub": sub, "nbf": nbf}))
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать отзыв пользователя {sub}: {e}")
+
+    # ---------- Синхронизация с Redis ----------
+
+    def _load_snapshot(self, client) -> None:
+        for jti, exp in client.zrangebyscore(JTI_KEY, time.time(), "+inf", withscores=True):
+            self._apply_jti(jti, exp)
+        for sid, exp in client.zrangebyscore(SID_KEY, time.time(), "+inf", withscores=True):
+            self._apply_sid(sid, exp)
+        for sub, nbf in client.zrangebyscore(NBF_KEY, self._nbf_horizon(), "+inf", withscores=True):
+            self._apply_not_before(sub, nbf)
+        self._loaded.set()
+        logger.info(f"Загружен список отзыва: {len(self._jti_exp)} jti, {len(self._sid_exp)} сессий, {len(self._not_before)} пользователей")
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        last_prune = time.monotonic()
+        while not self._stop.is_set():
+            client = get_redis()
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                # Сначала подписка, затем снимок — чтобы не потерять события между ними
+                pubsub.subscribe(settings.REVOCATION_CHANNEL)
+                self._load_snapshot(client)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._apply_message(message["data"])
+                    if time.monotonic() - last_prune > 60:
+                        self.prune()
+                        last_prune = time.monotonic()
+                pubsub.close()
+            except Exception as e:
+                logger.error(f"Ошибка подписки на канал отзыва: {e}, повтор через {backoff:.0f}с")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if get_redis() is None:
+            logger.warning("REDIS_URL не задан: отзыв токенов действует только в этом процессе")
+            self._loaded.set()
+            return
+        self._thread = threading.Thread(target=self._listen, name="revocation-listener", daemon=True)
+        self._thread.start()
+
+    def wait_loaded(self, timeout: float) -> None:
+        """Ждёт первый снимок списка отзыва из Redis."""
+        if not self._loaded.wait(timeout):
+            raise TimeoutError("список отзыва не загружен из Redis")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+revocation_store = RevocationStore()
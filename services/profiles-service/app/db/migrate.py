@@ -0,0 +1,85 @@
+"""
+Явный шаг миграции схемы БД.
+
+Запускается отдельно от воркеров (`python -m app.db.migrate`), чтобы старт
+и перезагрузка приложения не ждали DDL. Миграции применяются по порядку и
+отмечаются в таблице schema_migrations; параллельный запуск из нескольких
+сервисов сериализуется advisory-локом.
+"""
+import logging
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.db import models
+from app.db.base import engine
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех сервисов ключ advisory-лока миграций
+MIGRATIONS_LOCK_ID = 72_001
+
+
+def _initial(conn) -> None:
+    models.Base.metadata.create_all(bind=conn)
+
+
+# Триграммные индексы для поиска по подстроке и text_pattern_ops для префиксного
+SEARCH_INDEXES = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (lower("userName") gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_users_login_trgm ON users USING gin (lower(login) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_users_username_prefix ON users (lower("userName") text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_users_login_prefix ON users (lower(login) text_pattern_ops);
+"""
+
+
+# Версия профиля для дельта-синхронизации. DEFAULT now() не переписывает таблицу;
+# существующие строки получают время миграции, и клиенты один раз получат их заново
+USERS_UPDATED_AT = """
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at);
+"""
+
+
+# Порядок важен: новые миграции добавляются только в конец
+MIGRATIONS = [
+    ("profiles_0001_initial", _initial),
+    ("profiles_0002_search_indexes", SEARCH_INDEXES),
+    ("profiles_0003_users_updated_at", USERS_UPDATED_AT),
+]
+
+
+def run_migrations() -> list[str]:
+    applied: list[str] = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " name VARCHAR(255) PRIMARY KEY,"
+            " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        done = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+        for name, migration in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info(f"Применяется миграция {name}")
+            if isinstance(migration, str):
+                conn.execute(text(migration))
+            else:
+                migration(conn)
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+            applied.append(name)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    started = time.perf_counter()
+    try:
+        applied = run_migrations()
+    except Exception as e:
+        logger.error(f"Ошибка миграции базы данных: {e}")
+        sys.exit(1)
+    logger.info(f"Миграции применены: {applied or 'нет новых'} за {time.perf_counter() - started:.2f}с")
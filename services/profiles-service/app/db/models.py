@@ -1,5 +1,5 @@
 from .base import Base
-from sqlalchemy import Column, Integer, String, Date, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, func
 
 class User(Base):
     __tablename__ = "users"
@@ -13,6 +13,9 @@ class User(Base):
     salt = Column(String(255), nullable=True)  # Соль для деривации ключа
     avatar = Column(String(255), nullable=True)
     created_at = Column(Date, nullable=False)
+    # Версия публичного профиля: при регистрации — значение по умолчанию, дальше
+    # обновляется при смене имени и аватара (по нему клиенты синхронизируют кэши)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     
     def __repr__(self):
         return f"<User(login='{self.login}', userName='{self.userName}', publicKey='{self.publicKey})>" 
\ No newline at end of file
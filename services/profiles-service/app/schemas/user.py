@@ -12,8 +12,20 @@ class UserCreate(UserBase):
 class UserLogin(UserBase):
     password: str
 
+class UserBatchRequest(BaseModel):
+    ids: List[int] = []
+    logins: List[str] = []
+
 class User(UserBase):
     id: int
     avatar: Optional[str]
     createdAt: date = Field(..., alias='created_at')
-    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+class ProfileSyncRequest(BaseModel):
+    ids: List[int] = []
+    since: Optional[str] = None
+
+class ProfileSyncResponse(BaseModel):
+    users: List[User]
+    cursor: str
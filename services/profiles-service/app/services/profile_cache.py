@@ -0,0 +1,213 @@
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import String, Integer, any_, bindparam, or_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.db.base import engine
+from app.db.models import User
+from app.services.user_service import invalidate_avatar
+
+logger = logging.getLogger(__name__)
+
+# Публичные поля профиля (схема User), без ключей и хеша пароля
+PUBLIC_COLUMNS = (User.id, User.login, User.userName, User.avatar, User.created_at)
+
+# Ключи Redis: сериализованный профиль по id и id по логину
+PROFILE_KEY = "profile:{}"
+LOGIN_KEY = "profile:login:{}"
+
+
+class ProfileCache:
+    """
+    Двухуровневый read-through кэш публичных профилей.
+    L1 — словарь в памяти процесса, L2 — общий Redis для всех реплик.
+    При изменении профиля запись удаляется из Redis, а событие в pub/sub
+    сбрасывает L1 во всех процессах. Без Redis кэш работает только в L1,
+    а при потере подписки L1 живёт коротко, чтобы не отдавать устаревшие данные.
+    """
+
+    def __init__(self):
+        # id -> словарь публичного профиля
+        self._profiles = TTLCache(maxsize=settings.PROFILE_CACHE_SIZE, ttl=settings.PROFILE_CACHE_TTL)
+        # login -> id, чтобы запросы по логину тоже попадали в кэш
+        self._login_ids = TTLCache(maxsize=settings.PROFILE_CACHE_SIZE, ttl=settings.PROFILE_CACHE_TTL)
+        self._redis_down_until = 0.0
+        self._subscribed = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ---------- Redis ----------
+
+    def _redis(self):
+        if time.monotonic() < self._redis_down_until:
+            return None
+        return get_redis()
+
+    def _redis_failed(self, e: Exception) -> None:
+        # Не дёргаем недоступный Redis на каждом запросе — работаем с БД до повтора
+        logger.warning(f"Redis недоступен для кэша профилей: {e}, работа без L2 {settings.PROFILE_REDIS_RETRY:.0f}с")
+        self._redis_down_until = time.monotonic() + settings.PROFILE_REDIS_RETRY
+
+    def _local_ttl(self) -> float:
+        # Без подписки о чужих изменениях не узнать — храним в L1 недолго
+        if get_redis() is not None and not self._subscribed.is_set():
+            return settings.PROFILE_CACHE_FALLBACK_TTL
+        return settings.PROFILE_CACHE_TTL
+
+    def _remember(self, profiles: list[dict]) -> None:
+        ttl = self._local_ttl()
+        for profile in profiles:
+            self._profiles.set(profile["id"], profile, ttl)
+            self._login_ids.set(profile["login"], profile["id"], ttl)
+
+    def _read_l2(self, ids: list[int], logins: list[str]) -> list[dict]:
+        client = self._redis()
+        if client is None or not (ids or logins):
+            return []
+        try:
+            if logins:
+                login_ids = client.mget([LOGIN_KEY.format(login) for login in logins])
+                ids = ids + [int(user_id) for user_id in login_ids if user_id is not None]
+            raw = client.mget([PROFILE_KEY.format(user_id) for user_id in ids]) if ids else []
+        except Exception as e:
+            self._redis_failed(e)
+            return []
+        return [json.loads(item) for item in raw if item is not None]
+
+    def _write_l2(self, profiles: list[dict]) -> None:
+        client = self._redis()
+        if client is None or not profiles:
+            return
+        try:
+            pipe = client.pipeline()
+            for profile in profiles:
+                pipe.set(PROFILE_KEY.format(profile["id"]), json.dumps(profile, default=str), ex=settings.PROFILE_REDIS_TTL)
+                pipe.set(LOGIN_KEY.format(profile["login"]), profile["id"], ex=settings.PROFILE_REDIS_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    # ---------- Чтение ----------
+
+    def get_profiles(self, ids: list[int], logins: list[str], db: Session) -> list[dict]:
+        """
+        Публичные профили по списку id и/или логинов в порядке запроса.
+        Порядок поиска: L1, затем Redis, промахи добираются одним запросом
+        WHERE id = ANY(...) OR login = ANY(...). В L1 и Redis попадают только
+        строки основного сервера: реплика может отдать профиль до изменения.
+        """
+        found: dict[int, dict] = {}
+        missing_ids: list[int] = []
+        missing_logins: list[str] = []
+
+        for user_id in ids:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                missing_ids.append(user_id)
+            else:
+                found[user_id] = profile
+        for login in logins:
+            user_id = self._login_ids.get(login)
+            profile = self._profiles.get(user_id) if user_id is not None else None
+            if profile is None:
+                missing_logins.append(login)
+            else:
+                found[user_id] = profile
+
+        if missing_ids or missing_logins:
+            from_l2 = self._read_l2(missing_ids, missing_logins)
+            self._remember(from_l2)
+            found.update((profile["id"], profile) for profile in from_l2)
+            by_login = {profile["login"] for profile in from_l2}
+            missing_ids = [user_id for user_id in missing_ids if user_id not in found]
+            missing_logins = [login for login in missing_logins if login not in by_login]
+
+        if missing_ids or missing_logins:
+            rows = db.query(*PUBLIC_COLUMNS).filter(or_(
+                User.id == any_(bindparam("ids", missing_ids, type_=ARRAY(Integer))),
+                User.login == any_(bindparam("logins", missing_logins, type_=ARRAY(String))),
+            )).all()
+            from_db = [row._asdict() for row in rows]
+            if db.get_bind() is engine:
+                self._remember(from_db)
+                self._write_l2(from_db)
+            found.update((profile["id"], profile) for profile in from_db)
+
+        by_login = {profile["login"]: profile for profile in found.values()}
+        result: list[dict] = []
+        seen: set[int] = set()
+        for profile in [found.get(i) for i in ids] + [by_login.get(l) for l in logins]:
+            if profile is not None and profile["id"] not in seen:
+                seen.add(profile["id"])
+                result.append(profile)
+        return result
+
+    # ---------- Инвалидация ----------
+
+    def _drop_local(self, user_id: int, login: str | None) -> None:
+        self._profiles.pop(user_id)
+        if login is not None:
+            invalidate_avatar(login)
+
+    def invalidate(self, user_id: int, login: str | None = None) -> None:
+        """Сбрасывает профиль в этом процессе, в Redis и в L1 остальных реплик."""
+        self._drop_local(user_id, login)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.delete(PROFILE_KEY.format(user_id))
+            pipe.publish(settings.PROFILE_CACHE_CHANNEL, json.dumps({"id": user_id, "login": login}))
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    def _apply_message(self, raw: str) -> None:
+        try:
+            event = json.loads(raw)
+            self._drop_local(int(event["id"]), event.get("login"))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Некорректное событие инвалидации профиля: {e}")
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            client = get_redis()
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.PROFILE_CACHE_CHANNEL)
+                # Пока подписки не было, события могли потеряться — начинаем с чистого L1
+                self._profiles.clear()
+                self._login_ids.clear()
+                self._subscribed.set()
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._apply_message(message["data"])
+                pubsub.close()
+            except Exception as e:
+                self._subscribed.clear()
+                logger.error(f"Ошибка подписки на канал профилей: {e}, повтор через {backoff:.0f}с")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def start(self) -> None:
+        if self._thread is not None or get_redis() is None:
+            return
+        self._thread = threading.Thread(target=self._listen, name="profile-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+profile_cache = ProfileCache()
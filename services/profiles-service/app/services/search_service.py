@@ -0,0 +1,123 @@
+import base64
+import json
+import logging
+
+from sqlalchemy import case, func, or_, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import User
+
+logger = logging.getLogger(__name__)
+
+# Ключ: (запрос, курсор, размер страницы) -> строки страницы с запасом
+_page_cache = TTLCache(maxsize=2048, ttl=settings.SEARCH_CACHE_TTL)
+# Полные (не обрезанные лимитом) выдачи первой страницы: из них фильтруются
+# более длинные запросы с тем же префиксом, пока пользователь печатает
+_complete_cache = TTLCache(maxsize=1024, ttl=settings.SEARCH_CACHE_TTL)
+
+_name_key = func.lower(User.userName)
+_login_key = func.lower(User.login)
+# Побайтовая сортировка (COLLATE "C") совпадает с порядком строк в Python,
+# поэтому курсор из отфильтрованной в памяти выдачи корректен и для SQL
+_sort_key = func.lower(func.coalesce(User.userName, User.login)).collate("C")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _substring_mode(query: str) -> bool:
+    # Для коротких запросов триграммы бесполезны — ищем только по префиксу
+    return len(query) >= settings.SEARCH_TRIGRAM_MIN_LENGTH
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["rank"], row["sort_key"], row["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    rank, sort_key, user_id = json.loads(base64.urlsafe_b64decode(padded))
+    return int(rank), str(sort_key), int(user_id)
+
+
+def _rank(query: str, login: str, name: str) -> int:
+    """Python-версия ранжирования из SQL: точное совпадение, префикс, подстрока."""
+    if login == query or name == query:
+        return 0
+    if login.startswith(query) or name.startswith(query):
+        return 1
+    return 2
+
+
+def _matches(query: str, login: str, name: str) -> bool:
+    if _substring_mode(query):
+        return query in login or query in name
+    return login.startswith(query) or name.startswith(query)
+
+
+def _fetch(query: str, after: tuple[int, str, int] | None, fetch: int, db: Session) -> list[dict]:
+    prefix = _escape_like(query) + "%"
+    pattern = "%" + prefix if _substring_mode(query) else prefix
+    rank = case(
+        (or_(_login_key == query, _name_key == query), 0),
+        (or_(_login_key.like(prefix, escape="\\"), _name_key.like(prefix, escape="\\")), 1),
+        else_=2,
+    )
+    q = db.query(
+        User.id, User.login, User.userName, User.avatar, User.created_at,
+        rank.label("rank"), _sort_key.label("sort_key"),
+    ).filter(or_(_login_key.like(pattern, escape="\\"), _name_key.like(pattern, escape="\\")))
+    if after is not None:
+        q = q.filter(tuple_(rank, _sort_key, User.id) > tuple_(*after))
+    rows = q.order_by(rank, _sort_key, User.id).limit(fetch).all()
+    return [row._asdict() for row in rows]
+
+
+def _from_complete_prefix(query: str) -> list[dict] | None:
+    for length in range(len(query) - 1, settings.SEARCH_MIN_QUERY_LENGTH - 1, -1):
+        prefix = query[:length]
+        if _substring_mode(prefix) != _substring_mode(query):
+            break
+        rows = _complete_cache.get(prefix)
+        if rows is None:
+            continue
+        result = []
+        for row in rows:
+            login, name = row["login"].lower(), (row["userName"] or "").lower()
+            if _matches(query, login, name):
+                result.append({**row, "rank": _rank(query, login, name)})
+        result.sort(key=lambda r: (r["rank"], r["sort_key"], r["id"]))
+        return result
+    return None
+
+
+def search_users(query: str, limit: int, cursor: str | None, exclude_id: int, db: Session) -> tuple[list[dict], str | None]:
+    """
+    Ранжированный поиск пользователей по userName/login с keyset-пагинацией.
+    Возвращает страницу и курсор следующей страницы (или None).
+    """
+    query = query.strip().lower()
+    after = decode_cursor(cursor) if cursor else None
+    # +1 на случай, если в выдачу попал сам пользователь, +1 для признака продолжения
+    fetch = limit + 2
+
+    key = (query, cursor, limit)
+    rows = _page_cache.get(key)
+    if rows is None and after is None:
+        rows = _from_complete_prefix(query)
+        if rows is not None:
+            rows = rows[:fetch]
+    if rows is None:
+        rows = _fetch(query, after, fetch, db)
+        if after is None and len(rows) < fetch:
+            _complete_cache.set(query, rows)
+    _page_cache.set(key, rows)
+
+    visible = [row for row in rows if row["id"] != exclude_id]
+    page = visible[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(visible) > limit else None
+    return page, next_cursor
@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Integer, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import User
+from app.services.profile_cache import PUBLIC_COLUMNS
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(value: datetime) -> str:
+    raw = str((value - EPOCH) // MICROSECOND)
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> datetime:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return EPOCH + int(base64.urlsafe_b64decode(padded)) * MICROSECOND
+
+
+def sync_profiles(ids: list[int], since: str | None, db: Session) -> tuple[list[dict], str]:
+    """
+    Профили из ids, изменённые после курсора since (без курсора — все), и курсор
+    для следующего вызова. Курсор не продвигается дальше now() - PROFILE_SYNC_WINDOW:
+    запись, закоммиченная позже своего updated_at или ещё не дошедшая до реплики,
+    придёт в следующей синхронизации, а не потеряется. Последние изменения внутри
+    окна могут прийти повторно — клиент просто перезапишет их в кэше.
+    """
+    after = decode_cursor(since) if since else None
+    horizon = db.execute(select(func.now())).scalar() - timedelta(seconds=settings.PROFILE_SYNC_WINDOW)
+
+    q = db.query(*PUBLIC_COLUMNS, User.updated_at).filter(
+        User.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    )
+    if after is not None:
+        q = q.filter(User.updated_at > after)
+    rows = [row._asdict() for row in q.order_by(User.updated_at, User.id).all()]
+
+    latest = max([row["updated_at"] for row in rows] + ([after] if after is not None else []), default=horizon)
+    return rows, encode_cursor(min(latest, horizon))
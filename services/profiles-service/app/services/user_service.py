@@ -1,19 +1,202 @@
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import hashlib
+import logging
 import os
+import re
+import shutil
+import tempfile
 
-def save_avatar(avatar: UploadFile, login: str) -> str:
-    if avatar.filename.split(".")[-1] not in ["jpg", "jpeg", "png", "gif", "svg", "webp", "bmp", "ico"]: # noqa: E501
-        raise ValueError("Недопустимое расширение файла")
-    
-    file_name = login + "." + avatar.filename.split(".")[-1]
-    file_path = f"storage/avatars/{file_name}"
-    # Ensure target directory exists (works with mounted volume at /app/storage)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    # Удаляем предыдущий аватар, если он существует
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    
-    with open(file_path, "wb") as f:
-        f.write(avatar.file.read())
-    return file_name
\ No newline at end of file
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import AVATAR_REQUESTS
+from app.db.models import User
+
+logger = logging.getLogger(__name__)
+
+AVATARS_DIR = "storage/avatars"
+VARIANTS_DIR = os.path.join(AVATARS_DIR, "variants")
+UPLOADS_DIR = os.path.join(AVATARS_DIR, ".uploads")
+ALLOWED_EXTENSIONS = ["jpg", "jpeg", "png", "gif", "svg", "webp", "bmp", "ico"]
+# Форматы, которые Pillow не растеризует — для них отдаётся оригинал
+NO_VARIANT_EXTENSIONS = {"svg"}
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+READ_CHUNK_SIZE = 64 * 1024
+# Имя файла аватара с хешем содержимого: <login>.<digest>.<ext>
+HASHED_NAME_RE = re.compile(r"\.([0-9a-f]{16})\.[a-z]+$")
+
+_executor: ProcessPoolExecutor | None = None
+# login -> имя файла аватара; сбрасывается при загрузке нового аватара
+_avatar_names = TTLCache(maxsize=10_000, ttl=settings.AVATAR_CACHE_TTL)
+# (путь, mtime, размер) -> ETag по содержимому файла
+_etags = TTLCache(maxsize=50_000, ttl=24 * 3600)
+
+
+class AvatarTooLarge(ValueError):
+    pass
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.AVATAR_WORKERS)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def variant_path(login: str, size: int, fmt: str) -> str:
+    return os.path.join(VARIANTS_DIR, login, f"{size}.{fmt}")
+
+
+def render_variants(source_path: str, login: str, sizes: list[int], max_pixels: int) -> None:
+    """
+    Строит квадратные превью аватара фиксированных размеров в WebP и JPEG.
+    Выполняется в отдельном процессе, файлы подменяются атомарно.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    target_dir = os.path.join(VARIANTS_DIR, login)
+    os.makedirs(target_dir, exist_ok=True)
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA") if image.mode in ("P", "LA") else image
+        for size in sizes:
+            thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for ext, fmt in VARIANT_FORMATS.items():
+                out = thumb.convert("RGB") if fmt == "JPEG" else thumb
+                tmp_path = variant_path(login, size, ext) + ".tmp"
+                out.save(tmp_path, fmt, quality=85, optimize=True)
+                os.replace(tmp_path, variant_path(login, size, ext))
+
+
+async def _stream_to_tempfile(avatar: UploadFile) -> tuple[str, str]:
+    """
+    Копирует загрузку во временный файл по частям, не превышая AVATAR_MAX_BYTES.
+    Возвращает путь и sha256 содержимого.
+    """
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOADS_DIR)
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await avatar.read(READ_CHUNK_SIZE):
+                written += len(chunk)
+                if written > settings.AVATAR_MAX_BYTES:
+                    raise AvatarTooLarge("Файл аватара слишком большой")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
+
+
+async def save_avatar(avatar: UploadFile, login: str) -> str:
+    extension = avatar.filename.split(".")[-1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise ValueError("Недопустимое расширение файла")
+
+    tmp_path, digest = await _stream_to_tempfile(avatar)
+    # Хеш в имени делает URL версионированным: по старому имени всегда старое содержимое
+    file_name = f"{login}.{digest[:16]}.{extension}"
+    file_path = os.path.join(AVATARS_DIR, file_name)
+
+    if extension in NO_VARIANT_EXTENSIONS:
+        # Превью от предыдущего аватара больше не соответствуют оригиналу
+        await run_in_threadpool(shutil.rmtree, os.path.join(VARIANTS_DIR, login), True)
+    else:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                _get_executor(), render_variants,
+                tmp_path, login, settings.AVATAR_SIZES, settings.AVATAR_MAX_PIXELS,
+            )
+        except Exception as e:
+            os.remove(tmp_path)
+            logger.warning(f"Не удалось обработать аватар {login}: {e}")
+            raise ValueError("Не удалось обработать изображение")
+
+    # Заменяем предыдущий аватар атомарно
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, file_path)
+    return file_name
+
+
+def remove_avatar_file(file_name: str | None) -> None:
+    if file_name:
+        try:
+            os.remove(os.path.join(AVATARS_DIR, file_name))
+        except FileNotFoundError:
+            pass
+
+
+def get_avatar_name(login: str, db: Session) -> str | None:
+    """Имя файла аватара по логину: из кэша процесса или одним запросом в БД."""
+    name = _avatar_names.get(login)
+    if name is not None:
+        AVATAR_REQUESTS.labels(cache="warm").inc()
+        return name
+    AVATAR_REQUESTS.labels(cache="cold").inc()
+    row = db.query(User.avatar).filter(User.login == login).first()
+    if row is None or not row.avatar:
+        return None
+    _avatar_names.set(login, row.avatar)
+    return row.avatar
+
+
+def invalidate_avatar(login: str) -> None:
+    _avatar_names.pop(login)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def file_etag(path: str) -> str:
+    """ETag по содержимому файла; хеш пересчитывается только при изменении файла."""
+    st = await run_in_threadpool(os.stat, path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    etag = _etags.get(key)
+    if etag is None:
+        etag = '"' + (await run_in_threadpool(_hash_file, path))[:32] + '"'
+        _etags.set(key, etag)
+    return etag
+
+
+async def avatar_version(avatar: str) -> str:
+    """Версия аватара для ?v=: хеш из имени файла или хеш содержимого оригинала."""
+    match = HASHED_NAME_RE.search(avatar)
+    if match:
+        return match.group(1)
+    return (await file_etag(os.path.join(AVATARS_DIR, avatar))).strip('"')[:16]
+
+
+def pick_variant(login: str, avatar: str, size: int | None, accept: str) -> str:
+    """
+    Возвращает путь к превью, ближайшему сверху к запрошенному размеру,
+    или к оригиналу, если размер не указан либо превью нет.
+    """
+    original = os.path.join(AVATARS_DIR, avatar)
+    if size is None:
+        return original
+    sizes = sorted(settings.AVATAR_SIZES)
+    chosen = next((s for s in sizes if s >= size), sizes[-1])
+    fmt = "webp" if "image/webp" in accept else "jpg"
+    path = variant_path(login, chosen, fmt)
+    return path if os.path.exists(path) else original
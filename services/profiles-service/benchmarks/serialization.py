@@ -0,0 +1,59 @@
+"""
+Микробенчмарк сериализации ответов profiles-service.
+
+Сравнивает путь FastAPI по умолчанию (проверка response_model, сериализация
+в python-объекты и json.dumps) с model_response. Запуск из каталога сервиса:
+
+    python -m benchmarks.serialization [--repeat 500]
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core.responses import model_response
+from app.schemas.user import User
+
+adapter = TypeAdapter(list[User])
+
+
+def default_path(rows) -> bytes:
+    value = adapter.validate_python(rows, from_attributes=True)
+    return JSONResponse(adapter.dump_python(value, mode="json", by_alias=True)).body
+
+
+def bench(name: str, rows, repeat: int) -> None:
+    baseline = lambda: default_path(rows)
+    fast = lambda: model_response(adapter, rows).body
+    assert json.loads(baseline()) == json.loads(fast()), name
+    base_time = min(timeit.repeat(baseline, number=1, repeat=repeat))
+    fast_time = min(timeit.repeat(fast, number=1, repeat=repeat))
+    print(f"{name:<28} {base_time * 1e6:>12.1f} {fast_time * 1e6:>12.1f} {base_time / fast_time:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    def rows(count: int) -> list[dict]:
+        return [
+            {
+                "id": i, "login": f"user{i}", "userName": f"Пользователь {i}",
+                "avatar": f"user{i}.0123456789abcdef.webp", "created_at": datetime.date(2024, 1, 1),
+                "rank": 1, "sort_key": f"пользователь {i}",
+            }
+            for i in range(count)
+        ]
+
+    print(f"{'endpoint':<28} {'default, us':>12} {'fast, us':>12} {'speedup':>9}")
+    bench("search_users (20)", rows(20), args.repeat)
+    bench("search_users (50)", rows(50), args.repeat)
+    bench("profiles/batch (100)", rows(100), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pytest
+
+# Настройки читаются при импорте app.core.config: обязательные поля и Redis в памяти процесса
+for name, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "REDIS_URL": "memory://",
+}.items():
+    os.environ.setdefault(name, value)
+
+from app.core import redis as redis_module  # noqa: E402
+from app.core.redis import InMemoryRedis  # noqa: E402
+from app.db.base import engine  # noqa: E402
+
+Row = namedtuple("Row", "id login userName avatar created_at")
+
+
+class FakeSession:
+    """
+    Сессия БД для кэша профилей: query(...).filter(...).all() отдаёт всех
+    пользователей, queries считает обращения к БД. По умолчанию привязана
+    к основному серверу; replica() — отстающая копия с текущими строками.
+    """
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self.users: dict[int, Row] = {}
+        self.queries = 0
+
+    def get_bind(self):
+        return self.bind
+
+    def replica(self) -> "FakeSession":
+        session = FakeSession(bind=object())
+        session.users = dict(self.users)
+        return session
+
+    def add_user(self, user_id: int, login: str, user_name: str) -> None:
+        created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.users[user_id] = Row(user_id, login, user_name, None, created_at)
+
+    def rename(self, user_id: int, user_name: str) -> None:
+        self.users[user_id] = self.users[user_id]._replace(userName=user_name)
+
+    def query(self, *columns):
+        self.queries += 1
+        return self
+
+    def filter(self, *conditions):
+        return self
+
+    def all(self) -> list[Row]:
+        return list(self.users.values())
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """Свежий Redis в памяти процесса — общий для всех кэшей теста, как один сервер для реплик."""
+    client = InMemoryRedis()
+    monkeypatch.setattr(redis_module, "_client", client)
+    return client
+
+
+@pytest.fixture
+def db():
+    session = FakeSession()
+    session.add_user(1, "alice", "Alice")
+    session.add_user(2, "bob", "Bob")
+    return session
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from app.core.redis import InMemoryRedis
+from app.services.profile_cache import PROFILE_KEY, ProfileCache
+
+
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def replicas(redis_client):
+    """Две реплики с подпиской на канал инвалидации, как два процесса сервиса."""
+    caches = [ProfileCache(), ProfileCache()]
+    for cache in caches:
+        cache.start()
+    assert all(cache._subscribed.wait(3.0) for cache in caches)
+    yield caches
+    for cache in caches:
+        cache.stop()
+
+
+def names(profiles: list[dict]) -> list[str]:
+    return [profile["userName"] for profile in profiles]
+
+
+def test_l1_hit_skips_redis_and_db(redis_client, db):
+    cache = ProfileCache()
+    assert names(cache.get_profiles([1], [], db)) == ["Alice"]
+    assert db.queries == 1
+
+    redis_client.delete(PROFILE_KEY.format(1))
+    assert names(cache.get_profiles([1], [], db)) == ["Alice"]
+    assert names(cache.get_profiles([], ["alice"], db)) == ["Alice"]
+    assert db.queries == 1
+
+
+def test_l2_hit_from_other_replica(redis_client, db):
+    first, second = ProfileCache(), ProfileCache()
+    first.get_profiles([1], [], db)
+    assert redis_client.get(PROFILE_KEY.format(1)) is not None
+
+    assert names(second.get_profiles([1], ["bob"], db)) == ["Alice", "Bob"]
+    assert db.queries == 1
+
+
+def test_invalidation_reaches_other_replica(replicas, db):
+    first, second = replicas
+    first.get_profiles([1], [], db)
+    second.get_profiles([1], [], db)
+    assert db.queries == 1
+
+    db.rename(1, "Alice Smith")
+    first.invalidate(1, "alice")
+
+    assert wait_for(lambda: second._profiles.get(1) is None)
+    assert names(second.get_profiles([1], [], db)) == ["Alice Smith"]
+    assert names(first.get_profiles([1], [], db)) == ["Alice Smith"]
+    assert db.queries == 2
+
+
+def test_lagging_replica_read_is_not_cached(replicas, db):
+    first, second = replicas
+    first.get_profiles([1], [], db)
+    lagging = db.replica()
+
+    db.rename(1, "Alice Smith")
+    first.invalidate(1, "alice")
+    assert wait_for(lambda: second._profiles.get(1) is None)
+
+    # Реплика ещё не применила запись: ответ старый, но в L1 и Redis он не остаётся
+    assert names(second.get_profiles([1], [], lagging)) == ["Alice"]
+    assert second._profiles.get(1) is None
+    assert names(first.get_profiles([1], [], db)) == ["Alice Smith"]
+    assert names(second.get_profiles([1], [], db)) == ["Alice Smith"]
+
+
+class BrokenRedis(InMemoryRedis):
+    """Redis, до которого не достучаться: каждая команда падает."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def mget(self, keys):
+        self.calls += 1
+        raise ConnectionError("redis is down")
+
+    def pipeline(self):
+        self.calls += 1
+        raise ConnectionError("redis is down")
+
+
+def test_redis_down_falls_back_to_db(monkeypatch, db):
+    from app.core import redis as redis_module
+
+    client = BrokenRedis()
+    monkeypatch.setattr(redis_module, "_client", client)
+    cache = ProfileCache()
+
+    assert names(cache.get_profiles([1, 2], [], db)) == ["Alice", "Bob"]
+    assert db.queries == 1
+    calls = client.calls
+
+    # Пока не истёк PROFILE_REDIS_RETRY, Redis не трогается: промахи идут в БД, попадания — в L1
+    assert names(cache.get_profiles([1], [], db)) == ["Alice"]
+    cache.invalidate(1, "alice")
+    assert names(cache.get_profiles([1], [], db)) == ["Alice"]
+    assert client.calls == calls
+    assert db.queries == 2
+
+
+def test_without_redis_cache_is_local(monkeypatch, db):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "REDIS_URL", None)
+    cache = ProfileCache()
+    cache.start()
+    assert cache._thread is None
+
+    cache.get_profiles([1], [], db)
+    cache.get_profiles([1], [], db)
+    assert db.queries == 1
+    db.rename(1, "Alice Smith")
+    cache.invalidate(1, "alice")
+    assert names(cache.get_profiles([1], [], db)) == ["Alice Smith"]
@@ -0,0 +1,41 @@
+import time
+
+from app.core.config import settings
+from app.core.revocation import LEGACY_NBF_KEY, NBF_KEY, RevocationStore
+
+
+def test_user_revocation_rejects_older_tokens(redis_client):
+    store = RevocationStore()
+    store.revoke_user("alice")
+
+    assert store.is_revoked({"sub": "alice", "iat": time.time() - 60})
+    assert not store.is_revoked({"sub": "alice", "iat": time.time() + 60})
+    assert not store.is_revoked({"sub": "bob", "iat": time.time() - 60})
+
+
+def test_expired_not_before_entries_are_trimmed(redis_client):
+    lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    redis_client.hset(LEGACY_NBF_KEY, "old", time.time() - 2 * lifetime)
+    store = RevocationStore()
+    store.revoke_user("old", time.time() - 2 * lifetime)
+    store.revoke_user("alice")
+
+    # Старше времени жизни токена запись ничего не отсекает и в Redis не хранится
+    assert [sub for sub, _ in redis_client.zrangebyscore(NBF_KEY, "-inf", "+inf", withscores=True)] == ["alice"]
+    assert redis_client.hgetall(LEGACY_NBF_KEY) == {}
+
+    store.prune()
+    assert "old" not in store._not_before
+    assert "alice" in store._not_before
+
+
+def test_snapshot_skips_expired_not_before(redis_client):
+    lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    redis_client.zadd(NBF_KEY, {"old": time.time() - 2 * lifetime, "alice": time.time()})
+
+    store = RevocationStore()
+    store.start()
+    store.wait_loaded(3.0)
+    store.stop()
+
+    assert set(store._not_before) == {"alice"}